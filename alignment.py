@@ -0,0 +1,182 @@
+"""
+对齐引擎：把 GPT 清理后的文本对齐回时间戳字符序列，找出保留/删除的字符区间
+采用 "唯一锚点 + 最长递增子序列 + 区间递归" 的做法，整体接近线性时间：
+1. 在两段序列中找出都只出现一次的 k 字片段作为锚点
+2. 对锚点按原文位置求最长递增子序列，得到一条不交叉的锚点链
+3. 锚点之间的空隙再递归对齐，空隙足够小时交给 difflib 精确匹配
+"""
+import bisect
+from difflib import SequenceMatcher
+
+ANCHOR_LEN = 8  # 锚点长度（字符）
+DIRECT_LIMIT = 250_000  # 两段长度乘积小于该值时直接用 difflib
+
+
+def _unique_grams(seq, lo, hi, k):
+    """返回区间内只出现一次的 k 字片段 → 起始位置"""
+    seen = {}
+    for pos in range(lo, hi - k + 1):
+        gram = tuple(seq[pos:pos + k])
+        seen[gram] = -1 if gram in seen else pos
+    return {gram: pos for gram, pos in seen.items() if pos >= 0}
+
+
+def _longest_increasing_chain(pairs):
+    """pairs 已按第一维升序，求第二维严格递增的最长子序列（耐心排序，O(n log n)）"""
+    tails = []  # tails[l] = 长度为 l+1 的链的末尾在 pairs 中的下标
+    tail_values = []
+    prev = [-1] * len(pairs)
+    for idx, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tail_values, j)
+        if pos > 0:
+            prev[idx] = tails[pos - 1]
+        if pos == len(tails):
+            tails.append(idx)
+            tail_values.append(j)
+        else:
+            tails[pos] = idx
+            tail_values[pos] = j
+    chain = []
+    idx = tails[-1] if tails else -1
+    while idx >= 0:
+        chain.append(pairs[idx])
+        idx = prev[idx]
+    return chain[::-1]
+
+
+def _direct_match(a, b, alo, ahi, blo, bhi, out):
+    """
+    小区间用 difflib 精确匹配
+    两段都倒序后再匹配：长度相同的候选中优先选原文里靠后的位置，
+    对应 "保留最后一次重讲" 的剪辑规则
+    """
+    ra = a[alo:ahi][::-1]
+    rb = b[blo:bhi][::-1]
+    matcher = SequenceMatcher(None, ra, rb, autojunk=False)
+    for i, j, size in matcher.get_matching_blocks():
+        if size:
+            out.append((ahi - i - size, bhi - j - size, size))
+
+
+def _align_range(a, b, alo, ahi, blo, bhi, k, out):
+    """对齐 a[alo:ahi] 与 b[blo:bhi]，匹配块 (a 起点, b 起点, 长度) 追加到 out"""
+    if alo >= ahi or blo >= bhi:
+        return
+    if (ahi - alo) * (bhi - blo) <= DIRECT_LIMIT or k < 2:
+        _direct_match(a, b, alo, ahi, blo, bhi, out)
+        return
+
+    grams_a = _unique_grams(a, alo, ahi, k)
+    grams_b = _unique_grams(b, blo, bhi, k)
+    pairs = sorted((i, grams_b[gram]) for gram, i in grams_a.items() if gram in grams_b)
+    chain = _longest_increasing_chain(pairs)
+    if not chain:
+        # 找不到锚点时缩短锚点长度重试
+        _align_range(a, b, alo, ahi, blo, bhi, k // 2, out)
+        return
+
+    # 把首尾相接的锚点合并为连续块
+    blocks = []
+    for i, j in chain:
+        if blocks:
+            bi, bj, size = blocks[-1]
+            if i - bi == j - bj and i <= bi + size:
+                blocks[-1] = (bi, bj, i + k - bi)
+                continue
+            if i < bi + size or j < bj + size:
+                continue
+        blocks.append((i, j, k))
+
+    a_cursor, b_cursor = alo, blo
+    for i, j, size in blocks:
+        # 与上一块重叠的部分先裁掉
+        overlap = max(a_cursor - i, b_cursor - j, 0)
+        i, j, size = i + overlap, j + overlap, size - overlap
+        if size <= 0:
+            continue
+        # 向前延伸
+        while i > a_cursor and j > b_cursor and a[i - 1] == b[j - 1]:
+            i -= 1
+            j -= 1
+            size += 1
+        _align_range(a, b, a_cursor, i, b_cursor, j, k, out)
+        # 只向前延伸、不向后贪心延伸：重讲时后一遍才是保留内容，
+        # 向后贪心会把清理文本错误地对到前一遍上，剩余部分交给空隙递归处理
+        out.append((i, j, size))
+        a_cursor, b_cursor = i + size, j + size
+    _align_range(a, b, a_cursor, ahi, b_cursor, bhi, k, out)
+
+
+def _spans(indices):
+    """有序下标列表 → 连续区间 [(开始, 结束), ...]，结束不含"""
+    spans = []
+    for idx in indices:
+        if spans and spans[-1][1] == idx:
+            spans[-1][1] = idx + 1
+        else:
+            spans.append([idx, idx + 1])
+    return [tuple(s) for s in spans]
+
+
+def _slide_deletions(kept_flags, seq):
+    """
+    删除区间左移规整：若删除区间前一个保留字符与区间最后一个字符相同，
+    两者互换不影响对齐结果，左移后保留的是靠后的一遍（重讲内容）
+    只处理后面还有保留内容的删除区间；末尾的删除区间左移会把保留内容拆成两段
+    """
+    n = len(seq)
+    d0 = 0
+    while d0 < n:
+        if kept_flags[d0]:
+            d0 += 1
+            continue
+        d1 = d0
+        while d1 < n and not kept_flags[d1]:
+            d1 += 1
+        while d1 < n and d0 > 0 and kept_flags[d0 - 1] and seq[d0 - 1] == seq[d1 - 1]:
+            kept_flags[d0 - 1] = False
+            kept_flags[d1 - 1] = True
+            d0 -= 1
+            d1 -= 1
+        d0 = d1
+
+
+def align_chars(cleaned_chars, timestamps_chars, anchor_len=ANCHOR_LEN):
+    """
+    对齐清理后的字符与时间戳字符
+    返回 dict：
+    - kept_indices: 保留的 timestamps 字符下标（升序）
+    - kept_spans / deleted_spans: 保留 / 删除的字符区间 [(开始, 结束), ...]
+    - matched / unmatched: 清理文本中对齐上 / 对不上的字符数
+    - confidence: 对齐置信度，等于对齐上的字符占清理文本的比例
+    """
+    out = []
+    _align_range(cleaned_chars, timestamps_chars, 0, len(cleaned_chars),
+                 0, len(timestamps_chars), anchor_len, out)
+    out.sort()
+
+    kept_flags = [False] * len(timestamps_chars)
+    for _, j, size in out:
+        kept_flags[j:j + size] = [True] * size
+    _slide_deletions(kept_flags, timestamps_chars)
+    kept = [idx for idx, flag in enumerate(kept_flags) if flag]
+    matched = len(kept)
+    kept_spans = _spans(kept)
+
+    deleted_spans = []
+    cursor = 0
+    for start, end in kept_spans:
+        if start > cursor:
+            deleted_spans.append((cursor, start))
+        cursor = end
+    if cursor < len(timestamps_chars):
+        deleted_spans.append((cursor, len(timestamps_chars)))
+
+    return {
+        'kept_indices': kept,
+        'kept_spans': kept_spans,
+        'deleted_spans': deleted_spans,
+        'matched': matched,
+        'unmatched': len(cleaned_chars) - matched,
+        'confidence': matched / len(cleaned_chars) if cleaned_chars else 1.0,
+    }
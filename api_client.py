@@ -0,0 +1,279 @@
+"""
+OpenAI 兼容接口的共享客户端：转写（extract_audio_timestamps）和清理（phase1_cut）的所有请求都经过这里
+- 进程内只有一个 AsyncOpenAI 客户端，运行在一个后台事件循环线程中，HTTP 连接池复用连接
+- 令牌桶限速：每分钟请求数（API_RPM）和每分钟 token 数（API_TPM）
+- 连接失败、超时、429、5xx 按指数退避 + 随机抖动重试；服务端给出 Retry-After 时按其等待
+- 同样的请求正在进行时，重复调用共享同一个结果；最近完成的结果短暂缓存
+- 记录每次调用的延迟，stats() 返回各类请求的次数、重试、错误和延迟分位数
+线程池中的同步代码调用 transcribe() / chat()，请求在后台事件循环中并发执行；协程中可直接 await 客户端的异步方法。
+API key 和接口地址只从环境变量读取：OPENAI_API_KEY、OPENAI_BASE_URL
+（测试时可指向 benchmarks/mock_openai_server.py，它会注入延迟和错误）。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+BASE_URL = os.environ.get("OPENAI_BASE_URL")  # None 表示官方地址
+REQUESTS_PER_MINUTE = int(os.environ.get("API_RPM", "500"))
+TOKENS_PER_MINUTE = int(os.environ.get("API_TPM", "200000"))
+MAX_IN_FLIGHT = 32  # 同时在途的请求数
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # 第一次重试前最长等待秒数，之后每次翻倍（在 0 到上限之间随机取值）
+BACKOFF_MAX = 30.0
+REQUEST_TIMEOUT = 600.0  # 单次请求超时秒数（长音频转写较慢）
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+DEDUP_CACHE_SIZE = 64  # 缓存最近完成的结果个数
+LATENCY_SAMPLES = 1000  # 每类请求保留的延迟样本数
+OUTPUT_TOKEN_RATIO = 1.0  # 清理输出长度与输入相近，按输入 token 数的该倍数预估输出
+
+
+class TokenBucket:
+    """每分钟补充 per_minute 个令牌，容量同为 per_minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount):
+        """取走 amount 个令牌，不足时等待；持锁等待，先到先得"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+    def adjust(self, amount):
+        """按实际用量修正预估（可为负，欠下的令牌由之后的请求等待补足）"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def estimate_tokens(messages):
+    """粗略估算 token 数：中文约一字一个 token，再加上预估的输出"""
+    prompt = sum(len(m.get("content") or "") for m in messages)
+    return int(prompt * (1 + OUTPUT_TOKEN_RATIO))
+
+
+def _retryable(error):
+    import openai
+    if isinstance(error, openai.APIConnectionError):  # 包括超时
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return min(float(headers.get("retry-after")), BACKOFF_MAX) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _describe(error):
+    status = getattr(error, "status_code", None)
+    return f"HTTP {status}" if status else type(error).__name__
+
+
+def _audio_bytes(audio_file):
+    """(文件名, 字节) 或已打开的文件 → (文件名, 字节)；重试时需要重新发送同样的内容"""
+    if isinstance(audio_file, tuple):
+        return audio_file[0], bytes(audio_file[1])
+    return os.path.basename(getattr(audio_file, "name", "audio.mp3")), audio_file.read()
+
+
+class APIClient:
+    """
+    用法：
+        client = get_client()
+        words = client.run(client.transcribe_async(("audio.mp3", data), model="whisper-1"))
+    同步代码直接使用模块级的 transcribe() / chat()
+    """
+
+    def __init__(self, base_url=None, api_key=None, rpm=None, tpm=None, max_in_flight=None, max_retries=None):
+        self.base_url = base_url or BASE_URL
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.rpm = rpm or REQUESTS_PER_MINUTE
+        self.tpm = tpm or TOKENS_PER_MINUTE
+        self.max_in_flight = max_in_flight or MAX_IN_FLIGHT
+        self.max_retries = MAX_RETRIES if max_retries is None else max_retries
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._client = None
+        self._inflight = {}
+        self._cache = OrderedDict()
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    # ---------- 事件循环 ----------
+    def _ensure_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="api-client", daemon=True).start()
+            return self._loop
+
+    def run(self, coro):
+        """在后台事件循环中执行协程并等待结果，供线程中的同步代码调用"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def _openai(self):
+        """首次请求时创建客户端（在事件循环线程中），没有配置 key 的流程（规则引擎、本地识别）不受影响"""
+        if self._client is None:
+            if not self.api_key:
+                raise RuntimeError("未设置环境变量 OPENAI_API_KEY")
+            from openai import AsyncOpenAI
+            # SDK 自带 keep-alive 连接池，整个进程共用这一个客户端；重试由本模块负责，关闭 SDK 自带的重试
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0,
+                                       timeout=REQUEST_TIMEOUT)
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._requests = TokenBucket(self.rpm)
+            self._tokens = TokenBucket(self.tpm)
+        return self._client
+
+    # ---------- 请求 ----------
+    async def _call(self, kind, key, tokens, send):
+        """去重 → 限速 → 发送（失败重试）"""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._record(kind, deduped=True)
+            return self._cache[key]
+        if key in self._inflight:
+            self._record(kind, deduped=True)
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._send(kind, tokens, send)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # 没有重复调用在等待时，避免 "exception was never retrieved" 警告
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        future.set_result(response)
+        self._cache[key] = response
+        while len(self._cache) > DEDUP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return response
+
+    async def _send(self, kind, tokens, send):
+        client = self._openai()
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire(1)
+            if tokens:
+                await self._tokens.acquire(tokens)
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    response = await send(client)
+            except Exception as e:
+                latency = time.perf_counter() - start
+                if attempt >= self.max_retries or not _retryable(e):
+                    self._record(kind, latency, error=True)
+                    raise
+                self._record(kind, latency, retry=True)
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                print(f"接口请求失败（{_describe(e)}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+                continue
+            self._record(kind, time.perf_counter() - start)
+            usage = getattr(response, "usage", None)
+            if tokens and getattr(usage, "total_tokens", None):
+                self._tokens.adjust(usage.total_tokens - tokens)
+            return response
+
+    async def transcribe_async(self, audio_file, model, timestamp_granularity="word"):
+        """转写音频，返回词列表"""
+        name, data = _audio_bytes(audio_file)
+        key = ("transcribe", model, timestamp_granularity, hashlib.sha256(data).hexdigest())
+        response = await self._call("transcribe", key, 0, lambda client: client.audio.transcriptions.create(
+            file=(name, data),
+            model=model,
+            response_format="verbose_json",
+            timestamp_granularities=[timestamp_granularity],
+        ))
+        return response.words or []
+
+    async def chat_async(self, messages, model, temperature=0):
+        """对话补全，返回回复文本"""
+        payload = json.dumps([model, temperature, messages], ensure_ascii=False, sort_keys=True)
+        key = ("chat", hashlib.sha256(payload.encode("utf-8")).hexdigest())
+        response = await self._call("chat", key, estimate_tokens(messages), lambda client: client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages,
+        ))
+        return response.choices[0].message.content.strip()
+
+    # ---------- 统计 ----------
+    def _record(self, kind, latency=None, retry=False, error=False, deduped=False):
+        with self._metrics_lock:
+            m = self._metrics.setdefault(kind, {"calls": 0, "retries": 0, "errors": 0, "deduped": 0,
+                                                "latencies": deque(maxlen=LATENCY_SAMPLES)})
+            if deduped:
+                m["deduped"] += 1
+                return
+            m["calls"] += 1
+            m["retries"] += retry
+            m["errors"] += error
+            m["latencies"].append(latency)
+
+    def stats(self):
+        result = {}
+        with self._metrics_lock:
+            for kind, m in self._metrics.items():
+                latencies = sorted(m["latencies"])
+                pick = (lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)) \
+                    if latencies else (lambda q: None)
+                result[kind] = {
+                    "calls": m["calls"], "retries": m["retries"], "errors": m["errors"], "deduped": m["deduped"],
+                    "latency_mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    "latency_p50": pick(0.5), "latency_p95": pick(0.95), "latency_max": pick(1.0),
+                }
+        return result
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共享的客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = APIClient()
+        return _client
+
+
+def transcribe(audio_file, model, timestamp_granularity="word"):
+    client = get_client()
+    return client.run(client.transcribe_async(audio_file, model, timestamp_granularity))
+
+
+def chat(messages, model, temperature=0):
+    client = get_client()
+    return client.run(client.chat_async(messages, model, temperature))
+
+
+def stats():
+    """还没有发出过请求时返回空字典"""
+    return _client.stats() if _client is not None else {}
@@ -1,43 +1,78 @@
 """
 极简版 - 只用 pymysql + minio
+python app.py                 交互模式，上传后在当前进程内处理
+python app.py --queue         交互模式，只提交任务，由 worker.py 处理
+python app.py --submit a.mp4  直接提交任务后退出
+数据库 / MinIO 连接参数可用环境变量覆盖（MYSQL_HOST、MINIO_ENDPOINT 等）
 """
+import argparse
 import pymysql
 from minio import Minio
+import os
 import uuid
 import json
+import threading
 from datetime import datetime
-from io import BytesIO
+
+from db_pool import ConnectionPool, ProgressCoalescer
+from pipeline import Pipeline
 
 # ============== 配置 ==============
 MYSQL_CONFIG = {
-    "host": "127.0.0.1",
-    "port": 3306,
-    "user": "root",
-    "password": "root123",
-    "database": "video_processing",
+    "host": os.environ.get("MYSQL_HOST", "127.0.0.1"),
+    "port": int(os.environ.get("MYSQL_PORT", "3306")),
+    "user": os.environ.get("MYSQL_USER", "root"),
+    "password": os.environ.get("MYSQL_PASSWORD", "root123"),
+    "database": os.environ.get("MYSQL_DATABASE", "video_processing"),
     "charset": "utf8mb4"
 }
 
+# 连接池配置
+DB_POOL_SIZE = 8
+DB_ACQUIRE_TIMEOUT = 10
+
 MINIO_CONFIG = {
-    "endpoint": "localhost:9000",
-    "access_key": "admin",
-    "secret_key": "admin123",
+    "endpoint": os.environ.get("MINIO_ENDPOINT", "localhost:9000"),
+    "access_key": os.environ.get("MINIO_ACCESS_KEY", "admin"),
+    "secret_key": os.environ.get("MINIO_SECRET_KEY", "admin123"),
     "secure": False
 }
 
-BUCKET_NAME = "videos"
+BUCKET_NAME = os.environ.get("MINIO_BUCKET", "videos")
+
+# 分片上传配置：每次只在内存中缓冲一个分片，多个分片并行上传
+# MinIO / S3 要求分片不小于 5MB，单个对象最多 10000 个分片
+UPLOAD_PART_SIZE = 16 * 1024 * 1024
+UPLOAD_PARALLEL = 4
+
+# 处理结果输出目录
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs")
 
 
 # ============== MySQL 操作 ==============
+# 所有线程共享一个连接池，连接在首次使用时才建立
+db_pool = ConnectionPool(MYSQL_CONFIG, size=DB_POOL_SIZE, acquire_timeout=DB_ACQUIRE_TIMEOUT)
+_progress_writer = None
+_progress_writer_lock = threading.Lock()
+
+
 def get_conn():
-    """获取数据库连接"""
-    return pymysql.connect(**MYSQL_CONFIG)
+    """从连接池获取数据库连接（上下文管理器，用完自动归还）"""
+    return db_pool.connection()
+
+
+def progress_writer():
+    """进度合并写入器，首次使用时启动后台线程"""
+    global _progress_writer
+    with _progress_writer_lock:
+        if _progress_writer is None:
+            _progress_writer = ProgressCoalescer(db_pool)
+        return _progress_writer
 
 
 def init_db():
     """初始化数据库表"""
-    conn = get_conn()
-    try:
+    with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS video_tasks (
@@ -55,57 +90,76 @@ def init_db():
                 )
             """)
         conn.commit()
-    finally:
-        conn.close()
+    migrate_db()
 
 
-def save_task(task_id: str, input_bucket: str, input_key: str):
-    """保存任务"""
-    conn = get_conn()
-    try:
+# 任务队列需要的列（旧表自动补齐）
+QUEUE_COLUMNS = {
+    "attempts": "INT DEFAULT 0",
+    "worker_id": "VARCHAR(100)",
+    "lease_expires_at": "DATETIME",
+    "heartbeat_at": "DATETIME",
+}
+
+
+def migrate_db():
+    """为已存在的 video_tasks 表补齐队列相关的列和索引"""
+    with get_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'video_tasks'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            for column, definition in QUEUE_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE video_tasks ADD COLUMN {column} {definition}")
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'video_tasks' AND INDEX_NAME = 'idx_status_created'"
+            )
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("CREATE INDEX idx_status_created ON video_tasks (status, created_at)")
+        conn.commit()
+
+
+def save_task(task_id: str, input_bucket: str, input_key: str, status: str = "pending"):
+    """保存任务；status 为 pending 时会被 worker 领取"""
+    with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute(
                 "INSERT INTO video_tasks (id, status, input_bucket, input_key, current_step, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (task_id, "pending", input_bucket, input_key, "等待处理", datetime.now(), datetime.now())
+                (task_id, status, input_bucket, input_key, "等待处理", datetime.now(), datetime.now())
             )
         conn.commit()
-    finally:
-        conn.close()
 
 
 def get_task(task_id: str):
     """查询任务"""
-    conn = get_conn()
-    try:
+    with get_conn() as conn:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             cursor.execute("SELECT * FROM video_tasks WHERE id = %s", (task_id,))
             return cursor.fetchone()
-    finally:
-        conn.close()
 
 
 def list_tasks():
     """列出所有任务"""
-    conn = get_conn()
-    try:
+    with get_conn() as conn:
         with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             cursor.execute("SELECT id, status, progress, current_step, created_at FROM video_tasks ORDER BY created_at DESC")
             return cursor.fetchall()
-    finally:
-        conn.close()
 
 
 def update_task(task_id: str, **kwargs):
-    """更新任务"""
-    conn = get_conn()
-    try:
-        with conn.cursor() as cursor:
-            fields = ", ".join([f"{k} = %s" for k in kwargs])
-            values = list(kwargs.values()) + [task_id]
-            cursor.execute(f"UPDATE video_tasks SET {fields}, updated_at = %s WHERE id = %s", values + [datetime.now()])
-        conn.commit()
-    finally:
-        conn.close()
+    """立即更新任务；与该任务尚未写入的进度合并，保证不会被滞后的进度覆盖"""
+    writer = progress_writer()
+    writer.update(task_id, **kwargs)
+    writer.flush(task_id)
+
+
+def report_progress(task_id: str, progress: int, current_step: str):
+    """高频进度更新，由后台线程按间隔合并后批量写入"""
+    progress_writer().update(task_id, progress=progress, current_step=current_step)
 
 
 # ============== MinIO 操作 ==============
@@ -118,29 +172,67 @@ def ensure_bucket():
         minio_client.make_bucket(BUCKET_NAME)
 
 
-def upload_video(task_id: str, filename: str, file_data: bytes, content_type: str = "video/mp4"):
-    """上传视频到 MinIO"""
+def upload_file(object_name: str, file_path: str, content_type: str = "video/mp4"):
+    """
+    从磁盘流式上传文件到 MinIO（分片上传）
+    内存占用约为 分片大小 × 并行数，与文件大小无关
+    """
     ensure_bucket()
-    object_name = f"raw/{task_id}/{filename}"
-    minio_client.put_object(BUCKET_NAME, object_name, BytesIO(file_data), len(file_data), content_type=content_type)
+    minio_client.fput_object(BUCKET_NAME, object_name, file_path, content_type=content_type,
+                             part_size=UPLOAD_PART_SIZE, num_parallel_uploads=UPLOAD_PARALLEL)
     return BUCKET_NAME, object_name
 
 
+def upload_video(task_id: str, filename: str, file_path: str, content_type: str = "video/mp4"):
+    """上传原始视频到 MinIO"""
+    return upload_file(f"raw/{task_id}/{filename}", file_path, content_type)
+
+
+def submit_video(filepath: str, status: str = "pending"):
+    """上传视频并创建任务，pending 任务由 worker.py 领取处理，返回 (任务ID, bucket, key)"""
+    task_id = str(uuid.uuid4())
+    filename = filepath.split("\\")[-1]
+    # 存 MinIO（直接从磁盘分片上传，不把整个视频读入内存）
+    bucket, key = upload_video(task_id, filename, filepath)
+    # 存 MySQL
+    save_task(task_id, bucket, key, status)
+    return task_id, bucket, key
+
+
+def download_video(bucket: str, key: str, file_path: str):
+    """从 MinIO 流式下载到本地文件（本地没有原始文件时使用）"""
+    minio_client.fget_object(bucket, key, file_path)
+    return file_path
+
+
 def get_video_url(bucket: str, key: str) -> str:
     """获取视频访问URL"""
     return f"http://localhost:9000/{bucket}/{key}"
 
 
-import subprocess
-import tempfile
-import os
-
 # ============== 主程序 ==============
+def parse_args():
+    parser = argparse.ArgumentParser(description="视频任务提交 / 交互处理")
+    parser.add_argument("--queue", action="store_true", help="只提交任务，不在当前进程内处理（由 worker.py 处理）")
+    parser.add_argument("--submit", nargs="+", metavar="VIDEO", help="直接提交若干视频后退出")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     # 初始化
     init_db()
     ensure_bucket()
 
+    if args.submit:
+        for path in args.submit:
+            task_id, bucket, key = submit_video(path)
+            print(f"已提交: {task_id}  {get_video_url(bucket, key)}")
+        if _progress_writer is not None:
+            _progress_writer.close()
+        db_pool.close()
+        raise SystemExit(0)
+
     print("=" * 50)
     print("1. 上传视频")
     # print("2. 查询任务")
@@ -158,60 +250,38 @@ if __name__ == "__main__":
             if not filepath:
                 continue
 
-            with open(filepath, "rb") as f:
-                data = f.read()
-
-            task_id = str(uuid.uuid4())
-            filename = filepath.split("\\")[-1]
-
-            # 存 MinIO
-            bucket, key = upload_video(task_id, filename, data)
-
-            # 存 MySQL
-            save_task(task_id, bucket, key)
+            # 当前进程内处理的任务直接记为 processing，避免被 worker 重复领取
+            task_id, bucket, key = submit_video(filepath, "pending" if args.queue else "processing")
 
             print(f"\n任务已创建!")
             print(f"  任务ID: {task_id}")
             print(f"  视频URL: {get_video_url(bucket, key)}")
 
-            # 从 MinIO 下载到临时文件
-            print("\n正在下载视频...")
-            tmp_path = f"temp_{task_id}.mp4"
-            with open(tmp_path, "wb") as f:
-                f.write(data)
-
-            print(f"临时文件: {tmp_path}")
+            if args.queue:
+                print("已加入队列，等待 worker 处理")
+                continue
 
-            # 自动执行根目录的 main.py
-            print("\n开始执行处理脚本...")
+            # 原始文件就在本地，直接处理，不再另写一份临时副本
+            # 在当前进程内执行处理流水线，每个任务使用独立的工作目录
+            print("\n开始处理...")
+            output_path = os.path.join(OUTPUT_DIR, f"{task_id}.mp4")
+            # 进度回调已节流，再经合并写入器批量写入 progress / current_step
+            # 每次提交都是新的任务ID，无法续跑，这里不保存检查点（断点续跑见 worker.py 的重试）
+            pipeline = Pipeline(filepath, output_path,
+                                on_progress=lambda percent, step: report_progress(task_id, percent, step))
             try:
-                # 获取 .venv 的 Python 路径
-                project_root = os.path.dirname(os.path.abspath(__file__))
-                venv_python = os.path.join(project_root, "..", ".venv", "Scripts", "python.exe")
-                if not os.path.exists(venv_python):
-                    venv_python = os.path.join(project_root, "..", ".venv", "bin", "python")
-
-                # 调用根目录 main.py，传入临时视频路径，实时显示输出
-                result = subprocess.run(
-                    [venv_python, "main.py", tmp_path],
-                    cwd=os.path.join(project_root, ".."),
-                    encoding="utf-8",
-                    errors="ignore"
-                )
+                update_task(task_id, status="processing", current_step="处理中")
+                result = pipeline.run()
 
-                if result.returncode == 0:
-                    print("\n处理完成!")
-                    update_task(task_id, status="completed", current_step="处理完成")
-                else:
-                    print(f"\n处理失败!")
-                    update_task(task_id, status="failed", current_step="处理失败")
+                print("\n处理完成!")
+                pipeline.profiler.print_report()
+                update_task(task_id, status="completed", progress=100, current_step="处理完成",
+                            output_url=output_path, result_json=json.dumps(result, ensure_ascii=False))
             except Exception as e:
-                print(f"执行失败: {e}")
-                update_task(task_id, status="failed", current_step=str(e)[:100])
-            finally:
-                # 清理临时文件
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
+                print(f"处理失败: {e}")
+                # 失败时也保留已完成阶段的耗时，便于定位慢在哪一步
+                update_task(task_id, status="failed", current_step="处理失败", error_message=str(e),
+                            result_json=json.dumps({"profile": pipeline.profiler.to_dict()}, ensure_ascii=False))
 
         elif cmd == "2":
             # 查询任务
@@ -241,3 +311,8 @@ if __name__ == "__main__":
 
         elif cmd == "q":
             break
+
+    # 退出前写入剩余的进度并关闭连接
+    if _progress_writer is not None:
+        _progress_writer.close()
+    db_pool.close()
@@ -0,0 +1,193 @@
+"""
+可插拔的语音识别后端，统一返回带 start / end / word 属性的词列表
+- openai：OpenAI 兼容的 HTTP 接口（原有流程，受上传大小限制，长音频分块并发）
+- local：本机 CPU 运行 faster-whisper，模型只加载一次，同一进程（如 worker）内后续任务直接复用
+- fake：确定性的假后端，不联网、不加载模型，按音频时长生成固定文本，供测试和性能基准使用
+后端名可在 Pipeline 配置 asr_backend、main.py --asr 或环境变量 ASR_BACKEND 中指定。
+"""
+import hashlib
+import os
+import threading
+import time
+from io import BytesIO
+from types import SimpleNamespace
+
+DEFAULT_BACKEND = os.environ.get("ASR_BACKEND", "openai")
+
+# --- 本地 faster-whisper 配置 ---
+LOCAL_MODEL = "small"  # tiny / base / small / medium / large-v3，或本地模型目录
+LOCAL_DEVICE = "cpu"
+LOCAL_COMPUTE_TYPE = "int8"  # CPU 上 int8 量化速度最快
+LOCAL_CPU_THREADS = 0  # 0 表示由 CTranslate2 自动决定
+LOCAL_LANGUAGE = "zh"
+LOCAL_BEAM_SIZE = 1  # 贪心解码，速度优先
+
+# --- 假后端配置 ---
+FAKE_TEXT = "今天我们来讲一下视频剪辑的流程，首先提取音频，然后识别文字，最后根据时间戳剪辑视频。"
+FAKE_CHARS_PER_SECOND = 4.0
+
+
+class ASRBackend:
+    """
+    后端基类：子类实现 _transcribe(audio)，audio 为音频文件路径或内存中的音频字节
+    max_upload_bytes / max_chunk_seconds 为 None 时整段音频一次识别，否则由调用方分块
+    """
+    name = "base"
+    max_upload_bytes = None
+    max_chunk_seconds = None
+    concurrency = 1
+
+    def __init__(self):
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def cache_id(self):
+        """参与转写缓存键的模型标识，模型不同的结果不能互相复用"""
+        return self.name
+
+    def _transcribe(self, audio):
+        raise NotImplementedError
+
+    def transcribe(self, audio, duration=None):
+        """识别一段音频，并累计吞吐统计；duration 为音频时长（秒），用于计算吞吐"""
+        start = time.perf_counter()
+        words = self._transcribe(audio)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.wall_seconds += elapsed
+            self.audio_seconds += duration or 0.0
+        return words
+
+    def snapshot(self):
+        """当前的累计计数，传给 stats(since=...) 得到之后这段时间的增量"""
+        with self._lock:
+            return self.calls, self.audio_seconds, self.wall_seconds
+
+    def stats(self, since=None):
+        """
+        吞吐：音频秒数 / 墙钟秒数（分块并发时按各块耗时累加，反映单请求速度）
+        默认为进程启动以来的累计值；传入 snapshot() 的返回值时只统计之后的调用（单个任务的吞吐）
+        """
+        calls, audio_seconds, wall_seconds = self.snapshot()
+        if since is not None:
+            calls, audio_seconds, wall_seconds = calls - since[0], audio_seconds - since[1], wall_seconds - since[2]
+        return {
+            "backend": self.name,
+            "model": self.cache_id(),
+            "calls": calls,
+            "audio_seconds": round(audio_seconds, 3),
+            "wall_seconds": round(wall_seconds, 3),
+            "throughput": round(audio_seconds / wall_seconds, 2) if wall_seconds > 0 else None,
+        }
+
+
+class OpenAIBackend(ASRBackend):
+    """OpenAI 兼容的 HTTP 接口（经 api_client 限速、重试）"""
+    name = "openai"
+
+    def __init__(self):
+        super().__init__()
+        import extract_audio_timestamps
+        self._module = extract_audio_timestamps
+        self.max_upload_bytes = extract_audio_timestamps.MAX_UPLOAD_BYTES
+        self.max_chunk_seconds = extract_audio_timestamps.MAX_CHUNK_SECONDS
+        self.concurrency = extract_audio_timestamps.TRANSCRIBE_CONCURRENCY
+
+    def cache_id(self):
+        # 与引入后端之前的缓存键保持一致
+        return self._module.WHISPER_MODEL
+
+    def _transcribe(self, audio):
+        if isinstance(audio, (bytes, bytearray)):
+            return self._module.transcribe(("audio.mp3", bytes(audio)))
+        with open(audio, "rb") as audio_file:
+            return self._module.transcribe(audio_file)
+
+
+class LocalWhisperBackend(ASRBackend):
+    """本机 CPU 上的 faster-whisper，首次使用时加载模型，之后常驻内存"""
+    name = "local"
+
+    def __init__(self, model=None, device=None, compute_type=None, cpu_threads=None, language=None):
+        super().__init__()
+        self.model_name = model or LOCAL_MODEL
+        self.device = device or LOCAL_DEVICE
+        self.compute_type = compute_type or LOCAL_COMPUTE_TYPE
+        self.cpu_threads = LOCAL_CPU_THREADS if cpu_threads is None else cpu_threads
+        self.language = language or LOCAL_LANGUAGE
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def cache_id(self):
+        return f"local:{self.model_name}:{self.compute_type}"
+
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                from faster_whisper import WhisperModel
+                print(f"正在加载本地模型 {self.model_name} ({self.device}, {self.compute_type})...")
+                start = time.perf_counter()
+                self._model = WhisperModel(self.model_name, device=self.device,
+                                           compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+                print(f"模型加载完成 ({time.perf_counter() - start:.1f}s)")
+            return self._model
+
+    def _transcribe(self, audio):
+        source = BytesIO(audio) if isinstance(audio, (bytes, bytearray)) else audio
+        segments, _ = self.model().transcribe(source, language=self.language, beam_size=LOCAL_BEAM_SIZE,
+                                              word_timestamps=True)
+        # segments 是生成器，迭代时才真正解码
+        return [SimpleNamespace(start=w.start, end=w.end, word=w.word)
+                for segment in segments for w in (segment.words or [])]
+
+
+class FakeBackend(ASRBackend):
+    """按音频时长均匀铺排固定文本，同样的音频总是得到同样的结果"""
+    name = "fake"
+
+    def __init__(self, text=None, chars_per_second=None):
+        super().__init__()
+        self.text = text or FAKE_TEXT
+        self.chars_per_second = chars_per_second or FAKE_CHARS_PER_SECOND
+
+    def cache_id(self):
+        digest = hashlib.sha1(self.text.encode("utf-8")).hexdigest()[:8]
+        return f"fake:{digest}:{self.chars_per_second:g}"
+
+    def _transcribe(self, audio):
+        import extract_audio_timestamps
+        duration = extract_audio_timestamps.probe_duration(audio)
+        step = 1.0 / self.chars_per_second
+        count = int(duration * self.chars_per_second)
+        return [SimpleNamespace(start=round(i * step, 3), end=round(i * step + step * 0.8, 3),
+                                word=self.text[i % len(self.text)])
+                for i in range(count)]
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "local": LocalWhisperBackend,
+    "fake": FakeBackend,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name, cls):
+    """注册自定义后端"""
+    BACKENDS[name] = cls
+
+
+def get_backend(name=None):
+    """按名称取后端实例；同一进程内复用同一个实例（本地模型保持预热）"""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"未知的识别后端: {name}（可选: {', '.join(BACKENDS)}）")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
@@ -0,0 +1,287 @@
+"""
+多视频批处理：不同视频的阶段交错执行
+- 提取音频、VAD、片段规划和渲染是 CPU 密集阶段，在 CPU 线程池中运行（--cpu-jobs；提取音频另用一个同样大小的池）
+- 转写和清理主要在等待识别 / GPT 接口，在网络线程池中运行（--network-jobs）
+视频 A 渲染时视频 B 在转写，CPU 和网络都不闲置。
+同时处于 "提取 / 转写 / 清理" 中的视频数不超过网络并发数，避免一次性提取全部音频占满内存。
+每个视频的阶段仍由 Pipeline 的阶段方法完成，输出与 main.py 一致；最后写出批处理摘要 JSON。
+
+用法:
+    python batch.py 视频目录/ -o 输出目录/
+    python batch.py 清单.txt -o 输出目录/ --network-jobs 6 --cpu-jobs 2
+清单为每行一个视频路径的文本文件，或 JSON 列表（元素为路径或 {"input": ..., "output": ...}），
+相对路径相对于清单所在目录。
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import asr_backends
+import extract_audio_timestamps
+from checkpoint import Checkpoint
+from pipeline import Pipeline
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.mkv', '.flv', '.ts', '.avi', '.m4v')
+NETWORK_CONCURRENCY = 4  # 同时转写 / 清理的视频数
+CPU_CONCURRENCY = 1  # 同时渲染的视频数；单个渲染内部已按 edit_video1.MAX_WORKERS 并行
+OUTPUT_SUFFIX = "_加速"
+SKIPPED = "输出已存在，跳过"
+
+
+def load_jobs(source, output_dir):
+    """目录或清单 → [(输入路径, 输出路径), ...]"""
+    if os.path.isdir(source):
+        inputs = [os.path.join(source, name) for name in sorted(os.listdir(source))
+                  if name.lower().endswith(VIDEO_EXTENSIONS)]
+        entries = [{"input": path} for path in inputs]
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as f:
+            if source.lower().endswith(".json"):
+                entries = [e if isinstance(e, dict) else {"input": e} for e in json.load(f)]
+            else:
+                entries = [{"input": line.strip()} for line in f
+                           if line.strip() and not line.lstrip().startswith("#")]
+        for entry in entries:
+            entry["input"] = os.path.join(base, entry["input"])
+            if entry.get("output"):
+                entry["output"] = os.path.join(base, entry["output"])
+
+    jobs = []
+    for entry in entries:
+        stem = os.path.splitext(os.path.basename(entry["input"]))[0]
+        jobs.append((entry["input"], entry.get("output") or os.path.join(output_dir, f"{stem}{OUTPUT_SUFFIX}.mp4")))
+    return jobs
+
+
+class BatchJob:
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.pipeline = None
+        self.source_seconds = None
+        self.started = None
+        self.finished = None
+        self.stage_seconds = {}
+        self.result = None
+        self.error = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.input_path)
+
+    @property
+    def checkpoint_id(self):
+        """按输入路径生成的稳定ID，重跑同一批次时能找到上次的检查点"""
+        return hashlib.sha1(os.path.abspath(self.input_path).encode("utf-8")).hexdigest()[:16]
+
+    def timed(self, stage, func):
+        """在线程池中执行的阶段函数：记录排队之后的实际执行时长"""
+        def run():
+            start = time.perf_counter()
+            try:
+                return func()
+            finally:
+                self.stage_seconds[stage] = round(time.perf_counter() - start, 3)
+        return run
+
+    @property
+    def status(self):
+        if self.error is None:
+            return "completed"
+        return "skipped" if self.error == SKIPPED else "failed"
+
+    def to_dict(self):
+        return {
+            "input": self.input_path,
+            "output": self.output_path if self.error is None else None,
+            "status": self.status,
+            "error": self.error,
+            "source_seconds": self.source_seconds,
+            "wall_seconds": round(self.finished - self.started, 3) if self.started and self.finished else None,
+            "stage_seconds": self.stage_seconds,
+            "result": self.result,
+        }
+
+
+class BatchRunner:
+    """
+    用法：
+        runner = BatchRunner(load_jobs("视频目录", "输出目录"), config={"asr_backend": "local"})
+        summary = runner.run()
+    """
+
+    def __init__(self, jobs, config=None, network_concurrency=None, cpu_concurrency=None, resume=False,
+                 skip_existing=False):
+        self.config = config or {}
+        self.network_concurrency = network_concurrency or NETWORK_CONCURRENCY
+        self.cpu_concurrency = cpu_concurrency or CPU_CONCURRENCY
+        self.resume = resume
+        self.skip_existing = skip_existing
+        self.jobs = [BatchJob(input_path, output_path) for input_path, output_path in jobs]
+
+    def _front(self, job):
+        """网络阶段：转写 + 清理"""
+        job.pipeline.transcribe()
+        if job.source_seconds is None and len(job.pipeline.store):
+            job.source_seconds = round(job.pipeline.store.ends[-1], 3)
+        job.pipeline.clean()
+
+    def _extract(self, job):
+        """CPU 阶段：提取音频（断点续跑时由转写阶段按需提取）"""
+        if not self.resume:
+            audio = job.pipeline.extract()
+            job.source_seconds = round(extract_audio_timestamps.probe_duration(audio), 3)
+
+    def _render(self, job):
+        """CPU 阶段：VAD + 片段规划 + 渲染"""
+        if job.pipeline.config["vad"]:
+            job.pipeline.tighten()
+        if job.pipeline.config["plan"]:
+            job.pipeline.plan()
+        job.pipeline.render()
+        if job.pipeline.checkpoint and not job.pipeline.config["keep_checkpoint"]:
+            job.pipeline.checkpoint.clear()
+        job.result = job.pipeline.summary()
+
+    def _start(self, job):
+        os.makedirs(os.path.dirname(os.path.abspath(job.output_path)), exist_ok=True)
+        # 每个输入单独一个任务ID：一个视频完成后清理检查点，不会影响批次中其他视频
+        checkpoint = Checkpoint.for_file(f"batch/{job.checkpoint_id}", job.input_path) if self.resume else None
+        job.pipeline = Pipeline(job.input_path, job.output_path, config=self.config, checkpoint=checkpoint)
+        job.started = time.perf_counter()
+
+    def _finish(self, job, error=None):
+        job.finished = time.perf_counter()
+        job.error = error
+        if job.pipeline:
+            job.pipeline.cleanup()
+            job.pipeline = None  # 释放词列表和片段，批量很大时内存不随视频数增长
+        status = "完成" if error is None else f"失败: {error}"
+        print(f"\n[批处理] {job.name} {status}")
+
+    def run(self):
+        wall_start = time.perf_counter()
+        queue = deque()
+        for job in self.jobs:
+            if self.skip_existing and os.path.exists(job.output_path):
+                print(f"[批处理] 跳过已有输出: {job.output_path}")
+                job.error = SKIPPED
+                continue
+            queue.append(job)
+        print(f"[批处理] 共 {len(queue)} 个视频，网络并发 {self.network_concurrency}，CPU 并发 {self.cpu_concurrency}")
+
+        pending = {}
+        front_jobs = 0  # 处于提取 / 转写 / 清理阶段的视频数
+        # 提取音频用单独的线程池：不排在耗时很长的渲染后面，网络阶段不会因等待音频而空闲
+        with ThreadPoolExecutor(max_workers=self.cpu_concurrency) as cpu_pool, \
+                ThreadPoolExecutor(max_workers=self.cpu_concurrency) as extract_pool, \
+                ThreadPoolExecutor(max_workers=self.network_concurrency) as network_pool:
+            def admit():
+                nonlocal front_jobs
+                while queue and front_jobs < self.network_concurrency:
+                    job = queue.popleft()
+                    try:
+                        self._start(job)
+                    except Exception as e:
+                        self._finish(job, str(e))
+                        continue
+                    front_jobs += 1
+                    pending[extract_pool.submit(job.timed("extract", lambda j=job: self._extract(j)))] = (job, "extract")
+
+            admit()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, stage = pending.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if stage != "render":
+                            front_jobs -= 1
+                        self._finish(job, f"{stage}: {e}")
+                        continue
+                    if stage == "extract":
+                        pending[network_pool.submit(job.timed("transcribe", lambda j=job: self._front(j)))] = \
+                            (job, "transcribe")
+                    elif stage == "transcribe":
+                        front_jobs -= 1
+                        pending[cpu_pool.submit(job.timed("render", lambda j=job: self._render(j)))] = (job, "render")
+                    else:
+                        self._finish(job)
+                admit()
+
+        return self.summary(time.perf_counter() - wall_start)
+
+    def summary(self, wall):
+        jobs = [job.to_dict() for job in self.jobs]
+        completed = [job for job in jobs if job["status"] == "completed"]
+        source_seconds = sum(job["source_seconds"] or 0 for job in completed)
+        busy = {stage: round(sum(job.stage_seconds.get(stage, 0) for job in self.jobs), 3)
+                for stage in ("extract", "transcribe", "render")}
+        return {
+            "videos": len(jobs),
+            "completed": len(completed),
+            "failed": sum(1 for job in jobs if job["status"] == "failed"),
+            "skipped": sum(1 for job in jobs if job["status"] == "skipped"),
+            "wall_seconds": round(wall, 3),
+            "source_seconds": round(source_seconds, 3),
+            "throughput": round(source_seconds / wall, 2) if wall > 0 else None,  # 每墙钟秒处理的源视频秒数
+            "videos_per_hour": round(len(completed) * 3600 / wall, 2) if wall > 0 else None,
+            # 各阶段实际执行时长之和；与墙钟时长的比值反映阶段之间的重叠程度
+            "stage_busy_seconds": busy,
+            "overlap": round(sum(busy.values()) / wall, 2) if wall > 0 else None,
+            "network_concurrency": self.network_concurrency,
+            "cpu_concurrency": self.cpu_concurrency,
+            "config": self.config,
+            "jobs": jobs,
+        }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="多视频批处理")
+    parser.add_argument("source", help="视频目录，或清单文件（.txt 每行一个路径 / .json 列表）")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="输出目录")
+    parser.add_argument("--summary", default=None, help="批处理摘要 JSON 路径（默认 输出目录/batch_summary.json）")
+    parser.add_argument("--network-jobs", type=int, default=None, help="转写 / 清理阶段的并发视频数")
+    parser.add_argument("--cpu-jobs", type=int, default=None, help="提取 / 渲染阶段的并发视频数")
+    parser.add_argument("--asr", choices=sorted(asr_backends.BACKENDS), default=None, help="语音识别后端")
+    parser.add_argument("--engine", choices=["llm", "rules", "hybrid"], default=None, help="重讲清理引擎")
+    parser.add_argument("--vad", action="store_true", help="用语音活动检测收紧保留片段（需要 numpy）")
+    parser.add_argument("--no-plan", action="store_true", help="不做片段规划")
+    parser.add_argument("--resume", action="store_true", help="保存检查点，重跑时跳过已完成的阶段")
+    parser.add_argument("--skip-existing", action="store_true", help="输出文件已存在的视频直接跳过")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    jobs = load_jobs(args.source, args.output_dir)
+    if not jobs:
+        print(f"没有找到视频: {args.source}")
+        return
+    config = {"asr_backend": args.asr, "clean_engine": args.engine, "vad": args.vad, "plan": not args.no_plan}
+    runner = BatchRunner(jobs, config=config, network_concurrency=args.network_jobs,
+                         cpu_concurrency=args.cpu_jobs, resume=args.resume, skip_existing=args.skip_existing)
+    summary = runner.run()
+
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 60)
+    print(f"批处理完成: {summary['completed']}/{summary['videos']} 个视频成功，失败 {summary['failed']} 个，"
+          f"跳过 {summary['skipped']} 个")
+    print(f"总耗时 {summary['wall_seconds']:.1f}s，源视频 {summary['source_seconds']:.1f}s，"
+          f"吞吐 {summary['throughput']}x 实时，阶段重叠度 {summary['overlap']}")
+    print(f"摘要已写入: {summary_path}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
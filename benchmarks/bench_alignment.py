@@ -0,0 +1,52 @@
+"""
+对齐性能对比：phase1_cut.sliding_window_match vs alignment.align_chars
+在不同长度的合成转写稿上计时，并以注入的重讲位置为标准答案计算准确率
+
+用法: python benchmarks/bench_alignment.py [最大长度，默认 50000] [旧算法最大长度，默认 20000]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import phase1_cut
+from alignment import align_chars
+from synthetic import make_transcript
+
+SIZES = [1000, 5000, 10000, 20000, 50000, 100000]
+
+
+def accuracy(kept_indices, keep):
+    """保留下标与标准答案一致的比例"""
+    truth = {i for i, k in enumerate(keep) if k}
+    kept = set(kept_indices)
+    return 1 - len(truth ^ kept) / len(keep)
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    max_legacy = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    print(f"{'长度':>8}{'旧算法(s)':>12}{'旧准确率':>10}{'新算法(s)':>12}{'新准确率':>10}{'置信度':>8}")
+    for size in [s for s in SIZES if s <= max_size]:
+        original, cleaned, keep = make_transcript(size, seed=size)
+
+        legacy_time, legacy_acc = float('nan'), float('nan')
+        if size <= max_legacy:
+            start = time.perf_counter()
+            legacy = phase1_cut.sliding_window_match(cleaned, original)
+            legacy_time = time.perf_counter() - start
+            legacy_acc = accuracy(legacy, keep)
+
+        start = time.perf_counter()
+        result = align_chars(cleaned, original)
+        new_time = time.perf_counter() - start
+
+        print(f"{size:>8}{legacy_time:>12.3f}{legacy_acc:>10.4f}"
+              f"{new_time:>12.3f}{accuracy(result['kept_indices'], keep):>10.4f}{result['confidence']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+进度写入延迟对比：每次新建连接（旧流程） vs 连接池 vs 连接池 + 合并写入
+多个线程模拟并发任务高频上报进度，统计每次更新调用的平均 / P95 延迟和实际写库次数。
+需要一个本地 MySQL（或兼容协议的替代服务），默认使用 app.MYSQL_CONFIG。
+
+用法: python benchmarks/bench_db.py [--tasks 8] [--updates 200] [--host 127.0.0.1] [--port 3306]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql
+
+import app
+from db_pool import ConnectionPool, ProgressCoalescer
+
+
+def direct_update(config, task_id, **fields):
+    """旧流程：每次更新新建并关闭一个连接"""
+    conn = pymysql.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            assignments = ", ".join(f"{k} = %s" for k in fields)
+            cursor.execute(f"UPDATE video_tasks SET {assignments}, updated_at = %s WHERE id = %s",
+                           list(fields.values()) + [datetime.now(), task_id])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def pooled_update(pool, task_id, **fields):
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            assignments = ", ".join(f"{k} = %s" for k in fields)
+            cursor.execute(f"UPDATE video_tasks SET {assignments}, updated_at = %s WHERE id = %s",
+                           list(fields.values()) + [datetime.now(), task_id])
+        conn.commit()
+
+
+def run(name, update, task_ids, updates):
+    """每个任务一个线程，连续上报 updates 次进度"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(task_id):
+        local = []
+        for i in range(updates):
+            start = time.perf_counter()
+            update(task_id, progress=i * 100 // updates, current_step=f"步骤 {i}")
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(tid,)) for tid in task_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return name, wall, statistics.mean(latencies), latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    config = dict(app.MYSQL_CONFIG)
+    if args.host:
+        config["host"] = args.host
+    if args.port:
+        config["port"] = args.port
+    app.db_pool = ConnectionPool(config)
+    app.init_db()
+    task_ids = [str(uuid.uuid4()) for _ in range(args.tasks)]
+    for tid in task_ids:
+        app.save_task(tid, "bench", "bench")
+
+    pool = ConnectionPool(config, size=args.tasks)
+    coalescer = ProgressCoalescer(pool)
+    results = [
+        run("每次新建连接", lambda tid, **f: direct_update(config, tid, **f), task_ids, args.updates),
+        run("连接池", lambda tid, **f: pooled_update(pool, tid, **f), task_ids, args.updates),
+        run("连接池+合并", coalescer.update, task_ids, args.updates),
+    ]
+    coalescer.close()
+
+    with pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM video_tasks WHERE id IN ({', '.join(['%s'] * len(task_ids))})", task_ids)
+        conn.commit()
+    pool.close()
+
+    total = args.tasks * args.updates
+    print("\n" + "=" * 60)
+    print(f"{args.tasks} 个任务 × {args.updates} 次更新 = {total} 次")
+    print(f"{'方式':<14}{'总耗时(s)':>10}{'平均(ms)':>10}{'P95(ms)':>10}{'更新/秒':>10}")
+    for name, wall, mean, p95 in results:
+        print(f"{name:<14}{wall:>10.2f}{mean * 1000:>10.3f}{p95 * 1000:>10.3f}{total / wall:>10.0f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+音频提取性能对比：moviepy 旧流程 vs ffmpeg 直接解复用
+用 lavfi 生成一段合成长视频（测试画面 + 正弦音），分别计时并比较输出体积
+
+用法: python benchmarks/bench_extract_audio.py [时长秒数，默认 1800]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extract_audio_timestamps
+import ffmpeg_config
+
+
+def make_synthetic_video(path, duration):
+    """生成合成测试视频：低分辨率画面 + 440Hz 立体声音轨"""
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=25:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-ac', '2',
+        '-c:v', 'libx264', '-preset', 'ultrafast',
+        '-c:a', 'aac',
+        '-shortest',
+        path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 1800
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "synthetic.mp4")
+        print(f"正在生成 {duration}s 合成视频...")
+        make_synthetic_video(video, duration)
+
+        results = []
+        try:
+            legacy = os.path.join(tmp, "legacy.mp3")
+            _, elapsed = timed(extract_audio_timestamps.extract_audio_from_video_moviepy, video, legacy)
+            results.append(("moviepy", elapsed, os.path.getsize(legacy)))
+        except ImportError:
+            print("未安装 moviepy，跳过旧流程")
+
+        ffmpeg_file = os.path.join(tmp, "ffmpeg.mp3")
+        _, elapsed = timed(extract_audio_timestamps.extract_audio_from_video, video, ffmpeg_file)
+        results.append(("ffmpeg 文件", elapsed, os.path.getsize(ffmpeg_file)))
+
+        data, elapsed = timed(extract_audio_timestamps.extract_audio_from_video, video, None)
+        results.append(("ffmpeg 管道", elapsed, len(data)))
+
+    print("\n" + "=" * 50)
+    print(f"{'方式':<12}{'耗时(s)':>10}{'体积(MB)':>12}{'实时倍数':>10}")
+    for name, elapsed, size in results:
+        print(f"{name:<12}{elapsed:>10.2f}{size / (1024 * 1024):>12.2f}{duration / elapsed:>10.1f}")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+上传内存占用对比：整体读入内存再 put_object（旧流程） vs 从磁盘分片流式上传
+每种方式在独立子进程中运行，用 ru_maxrss 取峰值常驻内存，
+流式上传的峰值应基本不随文件大小变化。
+默认连接本地 MinIO（或兼容 S3 的替代服务），使用 app.MINIO_CONFIG；
+--fake 时改用本进程内的替身 FakeMinio（实现 fput_object / fget_object，对象存临时目录），
+不需要 MinIO 服务即可验证：上传走 fput_object 分片、下载走 fget_object、内容一致、峰值内存与文件大小无关，
+检查不通过时返回非零退出码。
+
+用法: python benchmarks/bench_ingest.py [文件大小MB，逗号分隔，默认 256,1024] [--endpoint host:port | --fake]
+"""
+import argparse
+import json
+import os
+import hashlib
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STREAM_SLACK_MB = 64  # --fake 检查：流式上传的内存增量允许超出 分片大小 × 并行数 的余量
+
+
+class FakeMinio:
+    """
+    MinIO 客户端替身：对象存在本地目录，fput_object 按 part_size 分片读写，记录调用方式
+    只实现 app 上传 / 下载用到的方法
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.buckets = set()
+        self.calls = []
+
+    def _path(self, bucket, name):
+        path = os.path.join(self.root, bucket, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def bucket_exists(self, bucket):
+        return bucket in self.buckets
+
+    def make_bucket(self, bucket):
+        self.buckets.add(bucket)
+
+    def fput_object(self, bucket, name, file_path, content_type=None, part_size=0, num_parallel_uploads=1, **kwargs):
+        self.calls.append({"method": "fput_object", "part_size": part_size, "parallel": num_parallel_uploads})
+        part_size = part_size or 5 * 1024 * 1024
+        with open(file_path, "rb") as src, open(self._path(bucket, name), "wb") as dst:
+            for part in iter(lambda: src.read(part_size), b""):
+                dst.write(part)
+
+    def put_object(self, bucket, name, data, length, **kwargs):
+        self.calls.append({"method": "put_object", "length": length})
+        with open(self._path(bucket, name), "wb") as dst:
+            dst.write(data.read())
+
+    def fget_object(self, bucket, name, file_path, **kwargs):
+        self.calls.append({"method": "fget_object"})
+        shutil.copyfile(self._path(bucket, name), file_path)
+
+    def remove_object(self, bucket, name):
+        os.remove(self._path(bucket, name))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_file(path, size_mb):
+    """写入 size_mb 大小的随机数据（每次 1MB，不占内存）"""
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+
+def peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def run_child(mode, path, endpoint, fake=False):
+    """子进程：执行一次上传，输出 JSON 结果；fake 时再下载回来校验内容"""
+    import app
+    from minio import Minio
+    fake_root = None
+    if fake:
+        fake_root = tempfile.mkdtemp(prefix="fake_minio_")
+        app.minio_client = FakeMinio(fake_root)
+    elif endpoint:
+        app.minio_client = Minio(**{**app.MINIO_CONFIG, "endpoint": endpoint})
+    baseline = peak_rss_mb()
+    task_id = str(uuid.uuid4())
+    start = time.perf_counter()
+    if mode == "legacy":
+        with open(path, "rb") as f:
+            data = f.read()
+        app.ensure_bucket()
+        key = f"raw/{task_id}/bench.bin"
+        app.minio_client.put_object(app.BUCKET_NAME, key, BytesIO(data), len(data))
+    else:
+        _, key = app.upload_video(task_id, "bench.bin", path)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_mb()
+    result = {"elapsed": elapsed, "peak_rss": peak, "baseline_rss": baseline}
+    if fake:
+        downloaded = os.path.join(fake_root, "downloaded.bin")
+        app.download_video(app.BUCKET_NAME, key, downloaded)
+        result["verified"] = file_sha256(downloaded) == file_sha256(path)
+        result["calls"] = app.minio_client.calls
+    app.minio_client.remove_object(app.BUCKET_NAME, key)
+    if fake_root:
+        shutil.rmtree(fake_root, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def check_fake(results):
+    """--fake 的检查项，返回失败原因列表"""
+    import app
+    limit = app.UPLOAD_PART_SIZE * app.UPLOAD_PARALLEL / 1024 / 1024 + STREAM_SLACK_MB
+    failures = []
+    for size_mb, mode, r in results:
+        if not r.get("verified"):
+            failures.append(f"{size_mb}MB {mode}: 下载内容与原文件不一致")
+        if mode != "stream":
+            continue
+        methods = [c["method"] for c in r["calls"]]
+        if "fput_object" not in methods or "put_object" in methods:
+            failures.append(f"{size_mb}MB stream: 上传没有走 fput_object 分片（{methods}）")
+        if "fget_object" not in methods:
+            failures.append(f"{size_mb}MB stream: 下载没有走 fget_object（{methods}）")
+        growth = r["peak_rss"] - r["baseline_rss"]
+        if growth > limit:
+            failures.append(f"{size_mb}MB stream: 内存增量 {growth:.1f}MB 超过 {limit:.0f}MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="?", default="256,1024")
+    parser.add_argument("--endpoint", default=None)
+    parser.add_argument("--fake", action="store_true", help="使用本地替身 FakeMinio，不需要 MinIO 服务，并检查流式路径")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child[0], args.child[1], args.endpoint, args.fake)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in [int(s) for s in args.sizes.split(",")]:
+            path = os.path.join(tmp, f"{size_mb}.bin")
+            print(f"正在生成 {size_mb}MB 测试文件...")
+            make_file(path, size_mb)
+            for mode in ("legacy", "stream"):
+                cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, path]
+                if args.endpoint:
+                    cmd += ["--endpoint", args.endpoint]
+                if args.fake:
+                    cmd.append("--fake")
+                output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+                results.append((size_mb, mode, json.loads(output.strip().splitlines()[-1])))
+            os.remove(path)
+
+    print("\n" + "=" * 60)
+    print(f"{'大小(MB)':>10}{'方式':>10}{'耗时(s)':>10}{'MB/s':>10}{'峰值RSS(MB)':>14}{'增量(MB)':>10}")
+    for size_mb, mode, r in results:
+        print(f"{size_mb:>10}{mode:>10}{r['elapsed']:>10.2f}{size_mb / r['elapsed']:>10.1f}"
+              f"{r['peak_rss']:>14.1f}{r['peak_rss'] - r['baseline_rss']:>10.1f}")
+    print("=" * 60)
+
+    if args.fake:
+        failures = check_fake(results)
+        for failure in failures:
+            print(f"检查失败: {failure}")
+        print("流式上传检查通过" if not failures else f"共 {len(failures)} 项检查失败")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+本地 OpenAI 兼容替身服务，用于测试 api_client 的限速、重试和并发：
+- POST /v1/audio/transcriptions：按上传音频的字节数推算时长（32kbps CBR），每秒 4 个字返回词级时间戳
+- POST /v1/chat/completions：原样返回最后一条用户消息（不删除任何内容）
+- 每个请求注入延迟，并按比例返回 500 / 503 或 429（带 Retry-After）
+
+用法:
+    python benchmarks/mock_openai_server.py --port 8765 --latency 0.3 --error-rate 0.2 --rate-limit-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock python main.py 输入.mp4
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEXT = "今天我们来讲一下视频剪辑的流程，首先提取音频，然后识别文字，最后根据时间戳剪辑视频。"
+CHARS_PER_SECOND = 4.0
+AUDIO_BITRATE = 32000
+
+counters = {"requests": 0, "errors": 0, "rate_limited": 0}
+counters_lock = threading.Lock()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        options = self.options
+        time.sleep(max(0.0, random.gauss(options.latency, options.latency * options.jitter)))
+        roll = random.random()
+        with counters_lock:
+            counters["requests"] += 1
+            if roll < options.rate_limit_rate:
+                counters["rate_limited"] += 1
+            elif roll < options.rate_limit_rate + options.error_rate:
+                counters["errors"] += 1
+        if roll < options.rate_limit_rate:
+            return self._reply(429, {"error": {"message": "rate limited", "type": "rate_limit"}},
+                               {"Retry-After": str(options.retry_after)})
+        if roll < options.rate_limit_rate + options.error_rate:
+            return self._reply(random.choice((500, 503)), {"error": {"message": "injected", "type": "server_error"}})
+
+        if self.path.endswith("/audio/transcriptions"):
+            duration = len(body) * 8 / AUDIO_BITRATE
+            step = 1.0 / CHARS_PER_SECOND
+            words = [{"word": TEXT[i % len(TEXT)], "start": round(i * step, 3), "end": round(i * step + step * 0.8, 3)}
+                     for i in range(int(duration * CHARS_PER_SECOND))]
+            return self._reply(200, {"task": "transcribe", "language": "zh", "duration": duration,
+                                     "text": "".join(w["word"] for w in words), "words": words})
+        if self.path.endswith("/chat/completions"):
+            request = json.loads(body or b"{}")
+            content = next((m["content"] for m in reversed(request.get("messages", [])) if m["role"] == "user"), "")
+            return self._reply(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": len(content), "completion_tokens": len(content),
+                          "total_tokens": 2 * len(content)},
+            })
+        self._reply(404, {"error": {"message": f"unknown path {self.path}"}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容替身服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.3, help="延迟的相对标准差")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="返回 5xx 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05, help="返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应的 Retry-After 秒数")
+    MockHandler.options = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", MockHandler.options.port), MockHandler)
+    print(f"替身服务已启动: http://127.0.0.1:{MockHandler.options.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"请求 {counters['requests']} 次，注入错误 {counters['errors']} 次，限流 {counters['rate_limited']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+端到端性能基准：在本地生成合成素材，分阶段和端到端计时，并与基线比较
+- 素材：lavfi 测试画面 + "响 2 秒 / 静 1 秒" 的正弦音（叠加少量噪声），时长可配置；
+  合成转写稿（synthetic.make_transcript，带注入的 "重来" 重讲）
+- 识别和 GPT 清理使用确定性的替身：fake 识别后端按时长铺排合成转写稿，
+  GPT 清理由规则引擎代替，因此不需要网络和 API key
+- 每个阶段在独立子进程中运行，记录耗时、峰值内存（本进程 / ffmpeg 子进程）和启动的进程数
+- 结果写成 JSON；指定 --baseline 时，任一阶段的耗时或内存超过基线 (1 + threshold) 倍即返回非零退出码
+
+用法:
+    python benchmarks/run_benchmarks.py --duration 300 --chars 20000 --out results.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json --threshold 0.2
+    python benchmarks/run_benchmarks.py --save-baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计内存
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import edit_video1
+import ffmpeg_config
+from synthetic import make_transcript
+
+STAGES = ["extract", "vad", "transcribe", "clean_rules", "clean_llm", "align", "plan",
+          "render_single_pass", "render_clips", "render_smart", "end_to_end"]
+MIN_COMPARE_SECONDS = 0.05  # 基线耗时低于该值的阶段噪声太大，不做耗时比较
+MIN_COMPARE_MB = 20  # 基线内存低于该值时不做内存比较
+
+
+# ---------- 合成素材 ----------
+def make_video(path, duration):
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=25:duration={duration}',
+        '-f', 'lavfi', '-i',
+        f"aevalsrc='0.3*sin(2*PI*220*t)*lt(mod(t,3),2)+0.01*(random(0)-0.5)':s=48000:d={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+        '-c:a', 'aac',
+        '-shortest',
+        path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def prepare(work_dir, duration, n_chars, seed):
+    """生成视频、音频、合成转写稿和保留片段，各阶段从这些文件读取输入"""
+    import extract_audio_timestamps
+    import segment_planner
+    from asr_backends import FakeBackend
+
+    video = os.path.join(work_dir, "input.mp4")
+    print(f"正在生成 {duration}s 合成视频...")
+    make_video(video, duration)
+    audio = extract_audio_timestamps.extract_audio_from_video(video, os.path.join(work_dir, "audio.mp3"))
+
+    original, cleaned, keep = make_transcript(n_chars, seed=seed)
+    text = "".join(original)
+    backend = FakeBackend(text=text, chars_per_second=len(original) / duration)
+    words = backend.transcribe(audio)
+    kept = [{'start': w.start, 'end': w.end} for i, w in enumerate(words) if keep[i % len(keep)]]
+    removed = [{'start': w.start, 'end': w.end} for i, w in enumerate(words) if not keep[i % len(keep)]]
+    segments, _ = segment_planner.plan_segments(kept, removed)
+    with open(os.path.join(work_dir, "inputs.json"), "w", encoding="utf-8") as f:
+        json.dump({"text": text, "cleaned": "".join(cleaned), "keep": keep,
+                   "chars_per_second": len(original) / duration,
+                   "kept": kept, "removed": removed, "segments": segments}, f, ensure_ascii=False)
+
+
+# ---------- 替身 ----------
+def fake_clean_text(text):
+    """GPT 清理的确定性替身：用规则引擎删除重讲"""
+    import retake_rules
+    chars = list(text)
+    cuts = retake_rules.detect_retakes(chars)['cuts']
+    return "".join(chars[i] for i in retake_rules.kept_after_cuts(len(chars), cuts))
+
+
+def install_stand_ins(inputs):
+    import asr_backends
+    import phase1_cut
+    phase1_cut.clean_text = fake_clean_text
+    asr_backends.register_backend(
+        "bench", lambda: asr_backends.FakeBackend(text=inputs["text"], chars_per_second=inputs["chars_per_second"]))
+
+
+# ---------- 各阶段 ----------
+def run_stage(stage, work_dir, inputs):
+    video = os.path.join(work_dir, "input.mp4")
+    audio = os.path.join(work_dir, "audio.mp3")
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    output = os.path.join(out_dir, "output.mp4")
+
+    if stage == "extract":
+        import extract_audio_timestamps
+        extract_audio_timestamps.extract_audio_from_video(video, None)
+    elif stage == "vad":
+        import vad
+        vad.tighten_segments(audio, inputs["kept"])
+    elif stage == "transcribe":
+        import extract_audio_timestamps
+        extract_audio_timestamps.get_audio_timestamps(audio, backend="bench")
+    elif stage in ("clean_rules", "clean_llm"):
+        import phase1_cut
+        phase1_cut.clean_chars(list(inputs["text"]), engine="rules" if stage == "clean_rules" else "llm")
+    elif stage == "align":
+        from alignment import align_chars
+        align_chars(list(inputs["cleaned"]), list(inputs["text"]))
+    elif stage == "plan":
+        import segment_planner
+        segment_planner.plan_segments(inputs["kept"], inputs["removed"])
+    elif stage.startswith("render_"):
+        edit_video1.render_video(video, inputs["segments"], output, out_dir, render_mode=stage[len("render_"):])
+    elif stage == "end_to_end":
+        from pipeline import Pipeline
+        Pipeline(video, output, config={"asr_backend": "bench", "clean_engine": "llm", "use_cache": False}).run()
+    else:
+        raise ValueError(f"未知阶段: {stage}")
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    rss = resource.getrusage(who).ru_maxrss
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    return round(rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def child_main(stage, work_dir, codec):
+    """子进程：运行单个阶段，输出一行 JSON"""
+    ffmpeg_config.VIDEO_CODEC = codec
+    with open(os.path.join(work_dir, "inputs.json"), encoding="utf-8") as f:
+        inputs = json.load(f)
+    install_stand_ins(inputs)
+
+    # 统计启动的进程数（subprocess.run / Popen 都经过 Popen.__init__）
+    spawns = [0]
+    original_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        spawns[0] += 1
+        original_init(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+
+    baseline_rss = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    start = time.perf_counter()
+    # 阶段内部的打印重定向到 stderr，stdout 只输出结果
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        run_stage(stage, work_dir, inputs)
+    finally:
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "seconds": round(elapsed, 4),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "baseline_rss_mb": baseline_rss,
+        "child_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "spawns": spawns[0],
+    }))
+
+
+# ---------- 汇总与比较 ----------
+def run_all(args, work_dir):
+    results = {}
+    for stage in args.stages:
+        runs = []
+        for _ in range(args.repeat):
+            cmd = [sys.executable, os.path.abspath(__file__), "--child", stage, "--work-dir", work_dir,
+                   "--codec", args.codec, "--ffmpeg", ffmpeg_config.FFMPEG_PATH]
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if proc.returncode != 0:
+                last = proc.stderr.strip().splitlines()[-1:] or ["?"]
+                if "No module named 'numpy'" in proc.stderr and stage == "vad":
+                    print(f"{stage:<20} 跳过（未安装 numpy）")
+                else:
+                    print(f"{stage:<20} 失败: {last[0]}")
+                    results[stage] = {"error": last[0]}
+                break
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        if not runs:
+            continue
+        result = dict(runs[-1])
+        result["seconds"] = round(statistics.median(r["seconds"] for r in runs), 4)
+        result["runs"] = [r["seconds"] for r in runs]
+        results[stage] = result
+        print(f"{stage:<20}{result['seconds']:>10.3f}s  内存 {result['peak_rss_mb']}MB  "
+              f"ffmpeg 内存 {result['child_peak_rss_mb']}MB  进程 {result['spawns']}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """返回回退列表 [(阶段, 指标, 基线值, 当前值), ...]"""
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        current = results.get(stage)
+        if not current or "error" in base:
+            continue
+        if "error" in current:
+            regressions.append((stage, "error", None, current["error"]))
+            continue
+        if base["seconds"] >= MIN_COMPARE_SECONDS and current["seconds"] > base["seconds"] * (1 + threshold):
+            regressions.append((stage, "seconds", base["seconds"], current["seconds"]))
+        for key in ("peak_rss_mb", "child_peak_rss_mb"):
+            if base.get(key) and current.get(key) and base[key] >= MIN_COMPARE_MB \
+                    and current[key] > base[key] * (1 + threshold):
+                regressions.append((stage, key, base[key], current[key]))
+        if current["spawns"] > base["spawns"] * (1 + threshold):
+            regressions.append((stage, "spawns", base["spawns"], current["spawns"]))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="合成素材性能基准")
+    parser.add_argument("--duration", type=int, default=120, help="合成视频时长（秒）")
+    parser.add_argument("--chars", type=int, default=5000, help="合成转写稿字数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数，取中位数")
+    parser.add_argument("--stages", default=",".join(STAGES), help="逗号分隔的阶段列表")
+    parser.add_argument("--codec", default="libx264", help="渲染使用的视频编码器")
+    parser.add_argument("--ffmpeg", default=None, help="ffmpeg 路径（默认 ffmpeg_config.FFMPEG_PATH）")
+    parser.add_argument("--out", default=None, help="结果 JSON 输出路径")
+    parser.add_argument("--baseline", default=None, help="基线 JSON，用于检测性能回退")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回退比例")
+    parser.add_argument("--save-baseline", default=None, help="把本次结果保存为基线")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.stages = [s for s in args.stages.split(",") if s]
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.ffmpeg:
+        ffmpeg_config.FFMPEG_PATH = args.ffmpeg
+    if args.child:
+        child_main(args.child, args.work_dir, args.codec)
+        return
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare(work_dir, args.duration, args.chars, args.seed)
+        print("\n" + "=" * 70)
+        results = run_all(args, work_dir)
+        print("=" * 70)
+
+    report = {
+        "meta": {
+            "duration": args.duration, "chars": args.chars, "seed": args.seed, "repeat": args.repeat,
+            "codec": args.codec, "python": platform.python_version(), "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "stages": results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入: {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n性能回退（阈值 {args.threshold:.0%}）:")
+            for stage, key, base, current in regressions:
+                print(f"  {stage}.{key}: {base} → {current}")
+            sys.exit(1)
+        print(f"\n与基线相比没有超过 {args.threshold:.0%} 的回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+模拟正在进行的录制，用于本地测试 live.py：
+用 lavfi 生成带 "响 2 秒 / 静 1 秒" 音频的测试画面，按实际时间节奏每次追加 PIECE_SECONDS 秒
+- 输出为 .ts 文件时直接追加到同一个文件（MPEG-TS 可直接拼接）
+- 输出为目录时按 seg_0000.ts、seg_0001.ts ... 写出分段
+写完后创建 <输出>.done 标记，live.py 随即处理剩余内容
+
+用法: python benchmarks/simulate_recording.py 录制中.ts [总时长秒数，默认 120] [加速倍数，默认 1]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ffmpeg_config
+
+PIECE_SECONDS = 5
+
+
+def make_piece(path, offset, duration):
+    """生成一段 MPEG-TS，时间戳从 offset 开始，拼接后时间轴连续"""
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=25:duration={duration}',
+        '-f', 'lavfi', '-i',
+        f"aevalsrc='0.3*sin(2*PI*220*(t+{offset}))*lt(mod(t+{offset},3),2)':s=48000:d={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '25',
+        '-c:a', 'aac',
+        '-output_ts_offset', str(offset),
+        '-f', 'mpegts',
+        path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    output = sys.argv[1]
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 120
+    pace = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    to_dir = not output.lower().endswith(".ts")
+    marker = output.rstrip("/\\") + ".done"
+    if os.path.exists(marker):
+        os.remove(marker)
+    if to_dir:
+        os.makedirs(output, exist_ok=True)
+    elif os.path.exists(output):
+        os.remove(output)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n, offset in enumerate(range(0, total, PIECE_SECONDS)):
+            started = time.monotonic()
+            duration = min(PIECE_SECONDS, total - offset)
+            if to_dir:
+                make_piece(os.path.join(output, f"seg_{n:04d}.ts"), offset, duration)
+            else:
+                piece = os.path.join(tmp, "piece.ts")
+                make_piece(piece, offset, duration)
+                with open(piece, 'rb') as src, open(output, 'ab') as dst:
+                    dst.write(src.read())
+            print(f"已录制 {offset + duration}s")
+            time.sleep(max(0.0, duration / pace - (time.monotonic() - started)))
+
+    open(marker, 'w').close()
+    print("录制结束")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+合成测试数据：带 "重来" 重讲结构的转写稿
+"""
+import random
+
+# 常用汉字区段，字表不宜太大，保证文本里有足够多的重复片段
+VOCAB = [chr(0x4e00 + i) for i in range(800)]
+RETAKE_SIGNALS = ["说错了重来", "不对重来", "重来", "讲错了", "算了重来"]
+
+
+def make_transcript(n_chars, retake_rate=0.1, seed=0):
+    """
+    生成约 n_chars 个字符的转写稿
+    返回 (原始字符列表, 清理后字符列表, 每个原始字符是否应保留)
+    重讲段 = 句子的前若干字 + 否定信号，随后是完整的句子
+    """
+    rng = random.Random(seed)
+    original = []
+    keep = []
+    while len(original) < n_chars:
+        sentence = [rng.choice(VOCAB) for _ in range(rng.randint(8, 30))]
+        if rng.random() < retake_rate:
+            retake = sentence[:rng.randint(3, len(sentence))] + list(rng.choice(RETAKE_SIGNALS))
+            original.extend(retake)
+            keep.extend([False] * len(retake))
+        original.extend(sentence)
+        keep.extend([True] * len(sentence))
+    cleaned = [c for c, k in zip(original, keep) if k]
+    return original, cleaned, keep
@@ -0,0 +1,280 @@
+"""
+流水线断点续跑：
+以 "任务ID + 输入视频哈希" 为键保存各阶段的产物（转写结果、清理后文本、保留片段），
+以及每个已渲染片段的参数签名。重跑同一任务时跳过已完成的阶段，只重新渲染缺失或失效的片段。
+检查点可以存本地目录，也可以存 MinIO，任何 worker 都能接着其他 worker 的进度继续。
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "checkpoints")
+MANIFEST_NAME = "manifest.json"
+UPLOAD_WORKERS = 2  # 片段上传到检查点的并发数，上传在后台进行，不占用渲染线程
+MANIFEST_SAVE_INTERVAL = 10.0  # 检查点中的片段清单最多每隔多少秒保存一次，close() 时再保存最终版本
+
+
+def file_hash(path):
+    """输入视频内容的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def params_signature(*params):
+    """渲染参数签名（参数需可 JSON 序列化），参数变化后旧片段失效"""
+    return hashlib.sha1(json.dumps(params, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def input_identity(path, checkpoint=None):
+    """
+    片段签名中的输入标识：有检查点时用输入内容哈希，否则用 路径 + 大小 + 修改时间
+    临时目录按固定路径复用，换了输入视频后时间相同的旧片段也会失效
+    """
+    if checkpoint is not None:
+        return checkpoint.input_hash
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+class LocalBackend:
+    """检查点存在本地目录"""
+
+    def __init__(self, root=CHECKPOINT_DIR):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def read(self, name):
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def put_file(self, name, file_path):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def get_file(self, name, file_path):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return False
+        shutil.copyfile(path, file_path)
+        return True
+
+    def delete_prefix(self, prefix):
+        shutil.rmtree(self._path(prefix), ignore_errors=True)
+
+
+class MinioBackend:
+    """检查点存在 MinIO bucket 的 checkpoints/ 前缀下"""
+
+    def __init__(self, client, bucket, prefix="checkpoints"):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, name):
+        return f"{self.prefix}/{name}"
+
+    def _missing(self, error):
+        return getattr(error, "code", None) in ("NoSuchKey", "NoSuchObject")
+
+    def read(self, name):
+        from minio.error import S3Error
+        try:
+            response = self.client.get_object(self.bucket, self._key(name))
+        except S3Error as e:
+            if self._missing(e):
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    def write(self, name, data):
+        self.client.put_object(self.bucket, self._key(name), BytesIO(data), len(data))
+
+    def put_file(self, name, file_path):
+        self.client.fput_object(self.bucket, self._key(name), file_path)
+
+    def get_file(self, name, file_path):
+        from minio.error import S3Error
+        try:
+            self.client.fget_object(self.bucket, self._key(name), file_path)
+            return True
+        except S3Error as e:
+            if self._missing(e):
+                return False
+            raise
+
+    def delete_prefix(self, prefix):
+        for obj in self.client.list_objects(self.bucket, prefix=self._key(prefix) + "/", recursive=True):
+            self.client.remove_object(self.bucket, obj.object_name)
+
+
+class Checkpoint:
+    """
+    用法：
+        checkpoint = Checkpoint.for_file(task_id, "输入.mp4")
+        data = checkpoint.load("transcript")
+        if data is None:
+            ...
+            checkpoint.save("transcript", data)
+    """
+
+    def __init__(self, task_id, input_hash, backend=None):
+        self.task_id = task_id
+        self.input_hash = input_hash
+        self.backend = backend or LocalBackend()
+        # 输入视频变化后哈希不同，旧检查点自然失效
+        self.prefix = f"{task_id}/{input_hash[:16]}"
+
+    @classmethod
+    def for_file(cls, task_id, input_path, backend=None):
+        return cls(task_id, file_hash(input_path), backend)
+
+    def load(self, stage, sig=None):
+        """
+        读取阶段产物，不存在返回 None
+        sig: 产生该产物的配置签名（见 params_signature），与保存时的签名不一致时同样返回 None
+        """
+        data = self.backend.read(f"{self.prefix}/{stage}.json.gz")
+        if data is None:
+            return None
+        value = json.loads(gzip.decompress(data).decode("utf-8"))
+        if sig is None:
+            return value
+        if not isinstance(value, dict) or value.get("sig") != sig:
+            print(f"检查点中的 {stage} 由不同的配置生成，重新计算")
+            return None
+        return value["value"]
+
+    def save(self, stage, value, sig=None):
+        if sig is not None:
+            value = {"sig": sig, "value": value}
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.backend.write(f"{self.prefix}/{stage}.json.gz", gzip.compress(data))
+
+    def put_file(self, name, file_path):
+        self.backend.put_file(f"{self.prefix}/{name}", file_path)
+
+    def get_file(self, name, file_path):
+        return self.backend.get_file(f"{self.prefix}/{name}", file_path)
+
+    def clear(self):
+        """任务完成后删除本任务本视频的检查点；同一 task_id 下其他视频的检查点不受影响"""
+        self.backend.delete_prefix(self.prefix)
+
+
+class ClipManifest:
+    """
+    已渲染片段清单：片段文件名 → {"sig": 参数签名, "size": 字节数}
+    清单写在片段目录下；传入 checkpoint 时片段在后台线程上传到检查点，上传完成的片段
+    按 MANIFEST_SAVE_INTERVAL 批量登记到检查点中的清单，本地缺失的片段可以从检查点恢复。
+    多线程渲染时可并发调用 record；渲染结束（包括失败）后调用 close() 等待上传完成。
+    """
+
+    def __init__(self, clips_dir, checkpoint=None, namespace="clips"):
+        self.clips_dir = clips_dir
+        self.checkpoint = checkpoint
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        os.makedirs(clips_dir, exist_ok=True)
+        self.path = os.path.join(clips_dir, MANIFEST_NAME)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        self.remote = {}
+        self._uploads = None
+        self._futures = []
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._save_lock = threading.Lock()
+        if checkpoint is not None:
+            self.remote = checkpoint.load(f"{namespace}_manifest") or {}
+            self._uploads = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix=f"{namespace}-upload")
+
+    def is_valid(self, name, sig):
+        """片段存在、大小与清单一致且参数签名相同；本地没有时尝试从检查点恢复"""
+        path = os.path.join(self.clips_dir, name)
+        entry = self.entries.get(name)
+        if entry and entry["sig"] == sig and os.path.exists(path) and os.path.getsize(path) == entry["size"]:
+            return True
+        remote = self.remote.get(name)
+        if remote and remote["sig"] == sig and self.checkpoint.get_file(f"{self.namespace}/{name}", path):
+            if os.path.getsize(path) == remote["size"]:
+                with self._lock:
+                    self.entries[name] = remote
+                    self._write_local()
+                return True
+        return False
+
+    def record(self, name, sig):
+        """片段渲染成功后登记；上传到检查点在后台进行"""
+        path = os.path.join(self.clips_dir, name)
+        entry = {"sig": sig, "size": os.path.getsize(path)}
+        with self._lock:
+            self.entries[name] = entry
+            self._write_local()
+        if self._uploads is not None:
+            self._futures.append(self._uploads.submit(self._upload, name, path, entry))
+
+    def _upload(self, name, path, entry):
+        self.checkpoint.put_file(f"{self.namespace}/{name}", path)
+        with self._lock:
+            self.remote[name] = entry
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= MANIFEST_SAVE_INTERVAL
+        if due:
+            self._save_remote()
+
+    def _save_remote(self):
+        # 快照在保存锁内取，后保存的一定是更新的清单
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self.remote)
+                self._dirty = False
+                self._saved_at = time.monotonic()
+            self.checkpoint.save(f"{self.namespace}_manifest", snapshot)
+
+    def close(self):
+        """等待后台上传完成并保存最终清单；上传失败只影响续跑，不影响本次渲染"""
+        if self._uploads is None:
+            return
+        self._uploads.shutdown(wait=True)
+        self._uploads = None
+        failed = [f.exception() for f in self._futures if f.exception() is not None]
+        if failed:
+            print(f"警告：{len(failed)} 个片段上传到检查点失败（{failed[0]}），续跑时将重新渲染")
+        self._save_remote()
+
+    def _write_local(self):
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(self.path + ".tmp", self.path)
@@ -0,0 +1,222 @@
+"""
+MySQL 连接池与进度写入合并
+- ConnectionPool：固定上限的连接池，多线程共享；取出时按空闲时长做 ping 健康检查，
+  坏连接直接丢弃重建。后进先出，最近用过的连接优先复用，长期空闲的自然老化。
+- ProgressCoalescer：进度更新先记在内存里，后台线程按间隔把同一任务的多次更新
+  合并成一次写入，多个任务在同一个事务中批量提交。
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pymysql
+
+POOL_SIZE = 8  # 最大连接数
+ACQUIRE_TIMEOUT = 10  # 等待空闲连接的超时（秒）
+CONNECT_TIMEOUT = 5  # 建立连接的超时（秒）
+PING_INTERVAL = 30  # 连接空闲超过该时长，取出时先 ping 一次
+FLUSH_INTERVAL = 1.0  # 进度合并写入的间隔（秒）
+
+
+class PoolTimeout(RuntimeError):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    """
+    用法：
+        pool = ConnectionPool(MYSQL_CONFIG, size=8)
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                ...
+            conn.commit()
+    """
+
+    def __init__(self, config, size=None, acquire_timeout=None, connect_timeout=None, ping_interval=None):
+        self.config = {"connect_timeout": connect_timeout or CONNECT_TIMEOUT, **config}
+        self.size = size or POOL_SIZE
+        self.acquire_timeout = acquire_timeout or ACQUIRE_TIMEOUT
+        self.ping_interval = PING_INTERVAL if ping_interval is None else ping_interval
+        # 元素为 (连接, 放回时间)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self):
+        return pymysql.connect(**self.config)
+
+    def _healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except pymysql.Error:
+            return False
+
+    def acquire(self, timeout=None):
+        """取出一个可用连接：优先复用空闲连接，未达上限时新建，否则等待"""
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"等待数据库连接超时 ({timeout}s)，连接池大小 {self.size}")
+                try:
+                    conn, idle_since = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken=False):
+        """归还连接；出错的连接回滚失败或标记为 broken 时直接丢弃"""
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        try:
+            conn.rollback()  # 清掉未提交的事务，避免带到下一个使用者
+        except pymysql.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            # 连接级错误（断线等），连接不再复用
+            self.release(conn, broken=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭所有空闲连接，使用中的连接归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def reset(self):
+        """关闭所有空闲连接并重新开放连接池；fork 子进程前调用，子进程不会继承父进程的连接"""
+        self.close()
+        self._closed = False
+
+    def stats(self):
+        return {"size": self.size, "created": self._created, "idle": self._idle.qsize()}
+
+
+class ProgressCoalescer:
+    """
+    合并频繁的进度更新：
+        coalescer = ProgressCoalescer(pool)
+        coalescer.update(task_id, progress=30, current_step="语音转写")
+    同一任务在一个间隔内的多次更新只写最后的值。
+    写入最终状态前先调用 flush(task_id) 或 discard(task_id)，避免滞后的进度覆盖最终状态：
+    取出和写入在同一把锁内完成，已被后台线程取出的进度一定先于最终状态写入；
+    不含 status 的进度更新只写入仍在 processing 的任务，作为兜底。
+    """
+
+    def __init__(self, pool, table="video_tasks", interval=None):
+        self.pool = pool
+        self.table = table
+        self.interval = interval or FLUSH_INTERVAL
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-coalescer", daemon=True)
+        self._thread.start()
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            self._pending.setdefault(task_id, {}).update(fields)
+
+    def discard(self, task_id):
+        """丢弃某任务尚未写入的更新；正在写入的批次先写完再返回"""
+        with self._flush_lock, self._lock:
+            self._pending.pop(task_id, None)
+
+    def flush(self, task_id=None):
+        """立即写入待提交的更新；指定 task_id 时只写该任务"""
+        with self._flush_lock:
+            with self._lock:
+                if task_id is None:
+                    batch, self._pending = self._pending, {}
+                else:
+                    batch = {task_id: self._pending.pop(task_id)} if task_id in self._pending else {}
+            if not batch:
+                return 0
+            # 按字段组合分组，同一组用 executemany 批量执行
+            groups = {}
+            now = datetime.now()
+            for tid, fields in batch.items():
+                columns = tuple(sorted(fields))
+                groups.setdefault(columns, []).append([fields[c] for c in columns] + [now, tid])
+            try:
+                with self.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        for columns, rows in groups.items():
+                            assignments = ", ".join(f"{c} = %s" for c in columns)
+                            # 纯进度更新不能改动已结束（或已退回 pending）的任务
+                            guard = "" if "status" in columns else " AND status = 'processing'"
+                            cursor.executemany(f"UPDATE {self.table} SET {assignments}, updated_at = %s "
+                                               f"WHERE id = %s{guard}", rows)
+                    conn.commit()
+            except Exception:
+                # 写入失败时放回队列，之后到达的新值优先
+                with self._lock:
+                    for tid, fields in batch.items():
+                        self._pending[tid] = {**fields, **self._pending.get(tid, {})}
+                raise
+            return len(batch)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"进度写入失败: {e}")
+
+    def close(self):
+        """停止后台线程并写入剩余更新"""
+        self._stop.set()
+        self._thread.join()
+        self.flush()
@@ -3,22 +3,84 @@ import os
 import subprocess
 import shutil
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# FFmpeg 路径配置
-FFMPEG_PATH = r"F:\ffmpeg\ffmpeg-2026-02-09-git-9bfa1635ae-essentials_build\ffmpeg-2026-02-09-git-9bfa1635ae-essentials_build\bin\ffmpeg.exe" # 配置ffmpeg路径
+import encoders
+import ffmpeg_config
+from checkpoint import ClipManifest, input_identity, params_signature
+from profiling import NULL_PROFILER, file_size, run_ffmpeg_progress
+
+# ffmpeg 路径和编码参数（VIDEO_CODEC / PRESET / CQ_VALUE 等）在 ffmpeg_config.py 配置
 
 # 视频路径 - 支持命令行参数
 if len(sys.argv) > 1:
     VIDEO_PATH = sys.argv[1]
 else:
     VIDEO_PATH = r"C:\Users\admin\Desktop\剪辑\输入.mp4" # 配置视频路径
+OUTPUT_VIDEO = r"C:\Users\admin\Desktop\剪辑\输出.mp4" # 配置输出路径（实际输出带 _加速 后缀）
+
+# --- 编码器回退 ---
+# True: 启动时探测可用编码器，VIDEO_CODEC 不可用或渲染中途失败时沿 nvenc → qsv → vaapi → 软件编码 依次回退
+# （探测结果和各编码器实测速度见 encoders.py）
+ENCODER_FALLBACK = True
+
+# --- 并行截取配置 ---
+# 同时运行的 ffmpeg 进程数；消费级 N 卡对 NVENC 并发会话数有限制，不宜设得过大
+MAX_WORKERS = 4
+# True: 任一片段失败立即停止；False: 跑完所有片段后汇总报告失败的片段
+FAIL_FAST = True
+
+# --- 渲染模式 ---
+# 'single_pass': 用一个 filter_complex 同时完成剪切和加速，只编码一次
+# 'clips': 逐片段截取 → 合并 → 整体加速（旧流程，编码两次）
+# 'smart': 关键帧感知剪辑，只重编码切点附近的帧（见 smart_cut.py）；SPEED 为 1 时画质无损
+RENDER_MODE = 'single_pass'
+# 输出视频播放速度
+SPEED = 1.5
+# 单个滤镜图最多包含的片段数，超过则自动拆分成多个子渲染再无损合并
+MAX_SEGMENTS_PER_GRAPH = 120
+
+
+def ffprobe_path():
+    """ffprobe 与 ffmpeg 位于同一目录，只替换路径中最后一个 ffmpeg（文件名部分）"""
+    idx = ffmpeg_config.FFMPEG_PATH.rfind('ffmpeg')
+    if idx < 0:
+        return 'ffprobe'
+    return ffmpeg_config.FFMPEG_PATH[:idx] + 'ffprobe' + ffmpeg_config.FFMPEG_PATH[idx + len('ffmpeg'):]
+
+
+def last_line(error):
+    """多行错误输出的最后一行，用于打印"""
+    lines = (error or "").strip().splitlines()
+    return lines[-1] if lines else ""
+
+
+class ClipRenderError(RuntimeError):
+    """片段截取失败，errors 为 [(片段序号, 错误输出), ...]，stderr 为全部错误输出"""
 
-# --- GPU 编码配置 ---
-# 只使用 GPU 编码，不使用 GPU 解码，以换取最大的稳定性
-VIDEO_CODEC = 'h264_nvenc'
-PRESET = 'p4'
-RC_MODE = 'vbr'
-CQ_VALUE = '23'
+    def __init__(self, errors):
+        self.errors = errors
+        self.stderr = "\n".join(msg for _, msg in errors)
+        detail = "; ".join(f"片段 {i + 1}: {last_line(msg)}" for i, msg in errors[:5])
+        super().__init__(f"共有 {len(errors)} 个片段处理失败 ({detail})")
+
+
+def video_codec_args(codec=None):
+    """根据编码器返回对应的视频编码参数"""
+    return encoders.codec_args(codec or ffmpeg_config.VIDEO_CODEC)
+
+
+def video_filter_args(codec=None):
+    """编码前需要追加的 -vf 参数（如 VAAPI 的上传显存），不需要时为空"""
+    vf = encoders.hw_filter(codec or ffmpeg_config.VIDEO_CODEC)
+    return ['-vf', vf] if vf else []
+
+
+def _graph_suffix(codec=None):
+    """滤镜图视频输出末尾需要追加的滤镜"""
+    vf = encoders.hw_filter(codec or ffmpeg_config.VIDEO_CODEC)
+    return f",{vf}" if vf else ""
 
 
 def parse_timestamps_keep(txt_path):
@@ -44,82 +106,164 @@ def merge_adjacent_segments(segments):
     if not segments:
         return []
     sorted_segments = sorted(segments, key=lambda x: x['start'])
-    merged = [sorted_segments[0]]
+    # 复制一份再合并，不修改调用方的片段
+    merged = [dict(sorted_segments[0])]
     for seg in sorted_segments[1:]:
         if seg['start'] <= merged[-1]['end']:
             merged[-1]['end'] = max(merged[-1]['end'], seg['end'])
         else:
-            merged.append(seg)
+            merged.append(dict(seg))
     return merged
 
 
-def concat_video_ffmpeg_safe(video_path, segments, temp_dir):
+def build_clip_cmd(video_path, seg, clip_path, codec=None):
+    """
+    构建截取单个片段的 ffmpeg 命令
+    -ss 放在 -i 前面：快速定位（输入级跳转，速度极快）
+    去掉了 -hwaccel cuda：避免定位导致的解码报错，由CPU软解，稳定性最高
+    """
+    duration = seg['end'] - seg['start']
+    return [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-ss', str(seg['start']),
+        '-i', video_path,
+        '-t', str(duration),
+        *video_filter_args(codec),
+        *video_codec_args(codec),
+        '-c:a', 'aac',
+        '-map', '0:v:0',
+        '-map', '0:a:0?',
+        clip_path
+    ]
+
+
+def render_clip(index, cmd, on_progress=None):
+    """
+    运行单个片段的截取命令，返回 (序号, 耗时, 错误输出)；错误输出保留最后 STDERR_TAIL_LINES 行
+    传入 on_progress 时解析 ffmpeg 进度，回调 on_progress(序号, 已输出秒数)
+    """
+    start = time.perf_counter()
+    try:
+        if on_progress:
+            returncode, stderr = run_ffmpeg_progress(cmd, lambda seconds: on_progress(index, seconds))
+        else:
+            result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    encoding='utf-8', errors='ignore')
+            returncode, stderr = result.returncode, result.stderr
+    except OSError as e:
+        # ffmpeg 不存在或无法执行，与编码失败一样汇总到 ClipRenderError
+        return index, time.perf_counter() - start, f"无法启动 ffmpeg: {e}"
+    elapsed = time.perf_counter() - start
+    if returncode != 0:
+        error = stderr.strip().splitlines()[-ffmpeg_config.STDERR_TAIL_LINES:]
+        return index, elapsed, "\n".join(error) if error else f"ffmpeg 退出码 {returncode}"
+    return index, elapsed, None
+
+
+def concat_video_ffmpeg_safe(video_path, segments, temp_dir, max_workers=None, fail_fast=None, codec=None,
+                             profiler=None, checkpoint=None, stats=None):
     """
     分步处理：
-    1. 分别截取每个片段保存为临时文件 (使用 GPU 编码)
+    1. 用有界进程池并行截取每个片段保存为临时文件 (默认 GPU 编码)
     2. 使用 concat 协议无损合并
+    片段文件按序号命名，合并顺序与并发完成顺序无关
+    已渲染且参数未变的片段（见 clips/manifest.json 或 checkpoint）直接复用，重跑时只渲染缺失的片段
+    传入 stats 字典时写入 stats["reused"]：复用的片段数
     """
+    max_workers = max_workers or MAX_WORKERS
+    fail_fast = FAIL_FAST if fail_fast is None else fail_fast
+    profiler = profiler or NULL_PROFILER
+
     segments = merge_adjacent_segments(segments)
     total = len(segments)
-    print(f"\n采用稳定模式处理，共有 {total} 个片段...")
-    print("正在排队处理中，请耐心等待...")
+    print(f"\n采用并行模式处理，共有 {total} 个片段，并发数 {max_workers}...")
 
     clips_dir = os.path.join(temp_dir, "clips")
-    if os.path.exists(clips_dir):
-        shutil.rmtree(clips_dir)
-    os.makedirs(clips_dir)
+    manifest = ClipManifest(clips_dir, checkpoint)
+
+    # 2. 并行截取每个片段
+    source_seconds = sum(seg['end'] - seg['start'] for seg in segments)
+    clip_names = [f"clip_{i:04d}.mp4" for i in range(total)]
+    clip_paths = [os.path.join(clips_dir, name) for name in clip_names]
+    source_id = input_identity(video_path, checkpoint)
+    clip_sigs = [params_signature(source_id, seg['start'], seg['end'], video_codec_args(codec)) for seg in segments]
+    pending = [i for i in range(total) if not manifest.is_valid(clip_names[i], clip_sigs[i])]
+    if len(pending) < total:
+        print(f"复用已渲染的片段 {total - len(pending)} 个，需要渲染 {len(pending)} 个")
+    if stats is not None:
+        stats["reused"] = total - len(pending)
+    # 每个片段已输出的秒数，汇总得到整体进度
+    clip_seconds = [segments[i]['end'] - segments[i]['start'] for i in range(total)]
+    for i in pending:
+        clip_seconds[i] = 0.0
+
+    def clip_progress(i, seconds):
+        clip_seconds[i] = min(seconds, segments[i]['end'] - segments[i]['start'])
+        if source_seconds > 0:
+            profiler.progress("cut", sum(clip_seconds) / source_seconds, f"{done}/{total}")
+
+    errors = []
+    done = total - len(pending)
+    wall_start = time.perf_counter()
+    try:
+        with profiler.stage("cut", bytes_in=file_size(video_path)) as record, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for i in pending:
+                cmd = build_clip_cmd(video_path, segments[i], clip_paths[i], codec)
+                futures.append(executor.submit(render_clip, i, cmd, clip_progress))
+
+            for future in as_completed(futures):
+                i, elapsed, error = future.result()
+                done += 1
+                seg = segments[i]
+                if error:
+                    print(f"\n错误：处理第 {i + 1} 个片段时失败 ({seg['start']:.2f}s - {seg['end']:.2f}s): "
+                          f"{last_line(error)}")
+                    errors.append((i, error))
+                    if fail_fast:
+                        for f in futures:
+                            f.cancel()
+                        break
+                else:
+                    manifest.record(clip_names[i], clip_sigs[i])
+                    print(f"[{done}/{total}] 片段 {i + 1} 完成: {seg['start']:.2f}s - {seg['end']:.2f}s "
+                          f"({elapsed:.1f}s)")
+            record["bytes_out"] = sum(file_size(path) for path in clip_paths)
+    finally:
+        # 已完成片段的后台上传在这里等待结束，失败时也保留已渲染的片段供续跑
+        manifest.close()
+
+    wall = time.perf_counter() - wall_start
+    if errors:
+        raise ClipRenderError(sorted(errors))
+
+    print(f"\n片段截取完成: {total} 个片段（渲染 {len(pending)} 个），耗时 {wall:.1f}s，"
+          f"{len(pending) / wall if wall > 0 else 0:.2f} 片段/秒，"
+          f"处理速度 {source_seconds / wall if wall > 0 else 0:.2f}x 实时")
 
-    # 2. 循环截取每个片段
-    for i, seg in enumerate(segments):
-        clip_path = os.path.join(clips_dir, f"clip_{i:04d}.mp4")
-        duration = seg['end'] - seg['start']
-
-        # 命令解释：
-        # -ss 放在 -i 前面：快速定位（输入级跳转，速度极快）
-        # 去掉了 -hwaccel cuda：避免定位导致的解码报错，由CPU软解，稳定性最高
-        # -c:v h264_nvenc：核心加速点，使用显卡编码，速度极快
-        cmd = [
-            FFMPEG_PATH, '-y',
-            '-ss', str(seg['start']),
-            '-i', video_path,
-            '-t', str(duration),
-            '-c:v', VIDEO_CODEC,  # GPU 编码
-            '-preset', PRESET,
-            '-rc', RC_MODE,
-            '-cq', CQ_VALUE,
-            '-c:a', 'aac',
-            '-map', '0:v:0',
-            '-map', '0:a:0?',
-            clip_path
-        ]
+    print("\n\n正在合并片段...")
 
-        # 打印进度，不隐藏输出，让你看到它在动
-        print(f"\n[{i + 1}/{total}] 正在处理片段: {seg['start']:.2f}s - {seg['end']:.2f}s")
+    # 3. 合并视频 (无需重编码，速度极快)
+    output_path = os.path.join(temp_dir, "cut_video.mp4")
+    with profiler.stage("concat", bytes_in=record["bytes_out"]) as concat_record:
+        concat_files(clip_paths, output_path, os.path.join(temp_dir, "filelist.txt"))
+        concat_record["bytes_out"] = file_size(output_path)
 
-        try:
-            # 这里的 check=True 如果报错会直接抛出异常，方便排查
-            subprocess.run(cmd, check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"\n错误：处理第 {i + 1} 个片段时失败。")
-            print(f"错误命令: {e.cmd}")
-            # 可以选择继续或停止
-            break
+    print(f"剪辑完成: {output_path}")
+    return output_path
 
-    print("\n\n正在合并片段...")
 
-    # 3. 创建合并列表文件
-    list_file_path = os.path.join(temp_dir, "filelist.txt")
+def concat_files(paths, output_path, list_file_path):
+    """使用 concat 协议无损合并多个编码参数一致的文件"""
     with open(list_file_path, 'w', encoding='utf-8') as f:
-        for i in range(total):
-            abs_path = os.path.abspath(os.path.join(clips_dir, f"clip_{i:04d}.mp4"))
-            safe_path = abs_path.replace('\\', '/')
+        for path in paths:
+            safe_path = os.path.abspath(path).replace('\\', '/')
             f.write(f"file '{safe_path}'\n")
 
-    output_path = os.path.join(temp_dir, "cut_video.mp4")
-
-    # 4. 合并视频 (无需重编码，速度极快)
     cmd_concat = [
-        FFMPEG_PATH, '-y',
+        ffmpeg_config.FFMPEG_PATH, '-y',
         '-f', 'concat',
         '-safe', '0',
         '-i', list_file_path,
@@ -127,61 +271,272 @@ def concat_video_ffmpeg_safe(video_path, segments, temp_dir):
         output_path
     ]
     subprocess.run(cmd_concat, check=True)
+    return output_path
 
-    print(f"剪辑完成: {output_path}")
+
+def atempo_chain(speed):
+    """atempo 单级只支持 0.5~2.0 倍，超出范围时拆成多级串联"""
+    stages = []
+    while speed > 2.0:
+        stages.append(2.0)
+        speed /= 2.0
+    while speed < 0.5:
+        stages.append(0.5)
+        speed /= 0.5
+    stages.append(speed)
+    return ",".join(f"atempo={s:g}" for s in stages)
+
+
+def build_single_pass_graph(segments, offset, speed, codec=None):
+    """
+    构建 trim/atrim → concat → setpts/atempo 的滤镜图
+    offset 为输入端 -ss 的跳转位置，片段时间需要换算成相对时间
+    """
+    n = len(segments)
+    parts = [f"[0:v]split={n}" + "".join(f"[vs{i}]" for i in range(n)),
+             f"[0:a]asplit={n}" + "".join(f"[as{i}]" for i in range(n))] if n > 1 else []
+    concat_inputs = []
+    for i, seg in enumerate(segments):
+        start = seg['start'] - offset
+        end = seg['end'] - offset
+        v_in = f"[vs{i}]" if n > 1 else "[0:v]"
+        a_in = f"[as{i}]" if n > 1 else "[0:a]"
+        parts.append(f"{v_in}trim=start={start:.3f}:end={end:.3f},setpts=PTS-STARTPTS[v{i}]")
+        parts.append(f"{a_in}atrim=start={start:.3f}:end={end:.3f},asetpts=PTS-STARTPTS[a{i}]")
+        concat_inputs.append(f"[v{i}][a{i}]")
+    parts.append("".join(concat_inputs) + f"concat=n={n}:v=1:a=1[vc][ac]")
+    parts.append(f"[vc]setpts=PTS/{speed}{_graph_suffix(codec)}[v]")
+    parts.append(f"[ac]{atempo_chain(speed)}[a]")
+    return ";\n".join(parts)
+
+
+def render_single_pass(video_path, segments, output_path, temp_dir, speed=1.5,
+                       max_segments_per_graph=None, max_workers=None, codec=None, profiler=None,
+                       checkpoint=None, stats=None):
+    """
+    单次编码渲染：剪切与加速在同一个滤镜图里完成
+    片段过多时按 max_segments_per_graph 拆成若干子渲染（并行），最后无损合并；
+    已完成且参数未变的子渲染在重跑时直接复用，传入 stats 字典时写入 stats["reused"]：复用的子渲染数
+    剪切和加速在同一次编码中完成，耗时统一记在 cut 阶段
+    """
+    max_segments_per_graph = max_segments_per_graph or MAX_SEGMENTS_PER_GRAPH
+    max_workers = max_workers or MAX_WORKERS
+    profiler = profiler or NULL_PROFILER
+
+    segments = merge_adjacent_segments(segments)
+    groups = [segments[i:i + max_segments_per_graph]
+              for i in range(0, len(segments), max_segments_per_graph)]
+    print(f"\n采用单次编码模式，共有 {len(segments)} 个片段，拆分为 {len(groups)} 个子渲染 ({speed}x)...")
+
+    parts_dir = os.path.join(temp_dir, "parts")
+    manifest = ClipManifest(parts_dir, checkpoint, namespace="parts")
+
+    single = len(groups) == 1
+    part_paths = []
+    part_sigs = {}
+    source_id = input_identity(video_path, checkpoint)
+    jobs = {}
+    for g, group in enumerate(groups):
+        # 输入端跳转到本组第一个片段，只解码本组覆盖的区间
+        offset = group[0]['start']
+        span = group[-1]['end'] - offset
+        graph = build_single_pass_graph(group, offset, speed, codec)
+        part_name = f"part_{g:03d}.mp4"
+        part_path = output_path if single else os.path.join(parts_dir, part_name)
+        part_paths.append(part_path)
+        if not single:
+            part_sigs[g] = params_signature(source_id, graph, offset, span, video_codec_args(codec))
+            if manifest.is_valid(part_name, part_sigs[g]):
+                continue
+
+        script_path = os.path.join(parts_dir, f"graph_{g:03d}.txt")
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(graph)
+        jobs[g] = [
+            ffmpeg_config.FFMPEG_PATH, '-y',
+            '-hide_banner', '-loglevel', 'error',
+            '-ss', str(offset),
+            '-t', str(span),
+            '-i', video_path,
+            '-filter_complex_script', script_path,
+            '-map', '[v]',
+            '-map', '[a]',
+            *video_codec_args(codec),
+            '-c:a', 'aac',
+            part_path
+        ]
+    if len(jobs) < len(groups):
+        print(f"复用已完成的子渲染 {len(groups) - len(jobs)} 个")
+    if stats is not None:
+        stats["reused"] = len(groups) - len(jobs)
+
+    # ffmpeg 报告的是加速后的输出时长，乘以 speed 换算回源视频秒数
+    source_seconds = sum(seg['end'] - seg['start'] for seg in segments)
+    group_seconds = [sum(seg['end'] - seg['start'] for seg in group) for group in groups]
+    part_seconds = [0.0 if g in jobs else group_seconds[g] for g in range(len(groups))]
+
+    def part_progress(g, seconds):
+        part_seconds[g] = min(seconds * speed, group_seconds[g])
+        if source_seconds > 0:
+            profiler.progress("cut", sum(part_seconds) / source_seconds)
+
+    wall_start = time.perf_counter()
+    errors = []
+    try:
+        with profiler.stage("cut", bytes_in=file_size(video_path)) as record, \
+                ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(render_clip, g, cmd, part_progress) for g, cmd in jobs.items()]
+            for future in as_completed(futures):
+                g, elapsed, error = future.result()
+                if error:
+                    print(f"\n错误：子渲染 {g + 1} 失败: {last_line(error)}")
+                    errors.append((g, error))
+                else:
+                    if not single:
+                        manifest.record(f"part_{g:03d}.mp4", part_sigs[g])
+                    print(f"子渲染 {g + 1}/{len(groups)} 完成 ({elapsed:.1f}s)")
+            record["bytes_out"] = sum(file_size(path) for path in part_paths)
+    finally:
+        manifest.close()
+    if errors:
+        raise ClipRenderError(sorted(errors))
+
+    if not single:
+        print("\n正在合并子渲染...")
+        with profiler.stage("concat", bytes_in=record["bytes_out"]) as concat_record:
+            concat_files(part_paths, output_path, os.path.join(parts_dir, "filelist.txt"))
+            concat_record["bytes_out"] = file_size(output_path)
+
+    wall = time.perf_counter() - wall_start
+    print(f"单次编码完成: {output_path}，耗时 {wall:.1f}s，"
+          f"处理速度 {source_seconds / wall if wall > 0 else 0:.2f}x 实时")
     return output_path
 
 
-def speed_up_video(input_path, output_path, speed=1.5):
-    """加速视频 (GPU加速)"""
-    print(f"\n正在加速视频 ({speed}x, GPU模式)...")
+def speed_up_video(input_path, output_path, speed=1.5, profiler=None, duration=None, codec=None):
+    """
+    加速视频 (GPU加速)
+    duration 为输入视频时长，传入时按输出进度上报百分比
+    """
+    profiler = profiler or NULL_PROFILER
+    print(f"\n正在加速视频 ({speed}x, {codec or ffmpeg_config.VIDEO_CODEC})...")
 
     cmd = [
-        FFMPEG_PATH, '-y',
+        ffmpeg_config.FFMPEG_PATH, '-y',
         # 这一步也可以去掉 -hwaccel cuda，更稳妥
         '-i', input_path,
         '-filter_complex',
-        f'[0:v]setpts=1/{speed}*PTS[v];[0:a]atempo={speed}[a]',
+        f'[0:v]setpts=1/{speed}*PTS{_graph_suffix(codec)}[v];[0:a]{atempo_chain(speed)}[a]',
         '-map', '[v]',
         '-map', '[a]',
-        '-c:v', VIDEO_CODEC,
-        '-preset', PRESET,
-        '-rc', RC_MODE,
-        '-cq', CQ_VALUE,
+        *video_codec_args(codec),
         '-c:a', 'aac',
         output_path
     ]
 
-    subprocess.run(cmd, check=True)
+    def on_progress(seconds):
+        if duration:
+            profiler.progress("speedup", seconds * speed / duration)
+
+    with profiler.stage("speedup", bytes_in=file_size(input_path)) as record:
+        returncode, stderr = run_ffmpeg_progress(cmd, on_progress)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+        record["bytes_out"] = file_size(output_path)
     print(f"加速完成: {output_path}")
 
 
+def _render_with_codec(video_path, segments, output_path, temp_dir, render_mode, speed, profiler, checkpoint,
+                       codec):
+    """用指定编码器按渲染模式完成一次渲染，返回从检查点复用的片段 / 子渲染数"""
+    stats = {"reused": 0}
+    if render_mode == 'single_pass':
+        # 剪辑 + 加速，一次编码
+        render_single_pass(video_path, segments, output_path, temp_dir, speed=speed, codec=codec,
+                           profiler=profiler, checkpoint=checkpoint, stats=stats)
+        return stats["reused"]
+
+    # 剪辑
+    if render_mode == 'smart':
+        import smart_cut
+        with profiler.stage("cut", bytes_in=file_size(video_path)) as record:
+            cut_video = smart_cut.smart_cut_video(video_path, segments, temp_dir, codec=codec)
+            record["bytes_out"] = file_size(cut_video)
+    else:
+        cut_video = concat_video_ffmpeg_safe(video_path, segments, temp_dir, codec=codec, profiler=profiler,
+                                             checkpoint=checkpoint, stats=stats)
+
+    # 加速
+    kept_seconds = sum(seg['end'] - seg['start'] for seg in merge_adjacent_segments(segments))
+    if speed == 1:
+        shutil.copyfile(cut_video, output_path)
+    else:
+        speed_up_video(cut_video, output_path, speed=speed, profiler=profiler, duration=kept_seconds, codec=codec)
+    return stats["reused"]
+
+
+def render_video(video_path, segments, output_path, temp_dir, render_mode=None, speed=None, profiler=None,
+                 checkpoint=None, codec=None, stats=None):
+    """
+    按渲染模式把保留片段渲染为最终视频，profiler 记录 cut / concat / speedup 阶段
+    checkpoint 用于保存 / 恢复已渲染的片段（见 checkpoint.py）
+    传入 stats 字典时写入 stats["codec"]：实际使用的编码器
+    ENCODER_FALLBACK 为 True 时，编码器本身的报错或 NVENC 会话数超限自动换回退阶梯上的下一个编码器重试
+    （见 encoders.py）；输入损坏、磁盘已满等与编码器无关的失败直接抛出，不在每个编码器上重复渲染
+    """
+    render_mode = render_mode or RENDER_MODE
+    speed = SPEED if speed is None else speed
+    profiler = profiler or NULL_PROFILER
+    codec = codec or ffmpeg_config.VIDEO_CODEC
+    os.makedirs(temp_dir, exist_ok=True)
+
+    attempts = encoders.ladder(codec) if ENCODER_FALLBACK else [codec]
+    if attempts[0] != codec:
+        print(f"编码器 {codec} 不可用或较慢，使用 {attempts[0]}")
+    kept_seconds = sum(seg['end'] - seg['start'] for seg in merge_adjacent_segments(segments))
+    for n, encoder in enumerate(attempts):
+        start = time.perf_counter()
+        try:
+            reused = _render_with_codec(video_path, segments, output_path, temp_dir, render_mode, speed, profiler,
+                                        checkpoint, encoder)
+        except (ClipRenderError, subprocess.CalledProcessError) as e:
+            error = f"{e} {getattr(e, 'stderr', None) or ''}"
+            # 只有编码器本身的报错才会停用该编码器，输入问题等其他失败不影响之后的任务
+            kind = encoders.report_failure(encoder, error)
+            if kind == 'other' or n + 1 == len(attempts):
+                raise
+            note = "，本进程内停用该编码器" if kind == 'encoder' else ""
+            print(f"\n编码器 {encoder} 渲染失败{note}，改用 {attempts[n + 1]} 重试: {e}")
+            continue
+        # 复用了检查点中的片段时耗时偏短，不计入编码器速度，以免影响回退阶梯的排序
+        if not reused:
+            encoders.record_throughput(encoder, kept_seconds, time.perf_counter() - start)
+        if stats is not None:
+            stats["codec"] = encoder
+        return output_path
+
+
 def main():
-    VIDEO_PATH = r"C:\Users\admin\Desktop\剪辑\输入.mp4"
+    TIMESTAMPS_KEEP_STORE = "timestamps_1.bin"
     TIMESTAMPS_KEEP = "timestamps_1.txt"
-    OUTPUT_VIDEO = r"C:\Users\admin\Desktop\剪辑\输出.mp4"
     TEMP_DIR = os.path.join(os.path.dirname(__file__), "temp")
 
-    os.makedirs(TEMP_DIR, exist_ok=True)
-
     print("=" * 50)
     print("视频剪辑工具（GPU编码 - 极速稳定版）")
     print("=" * 50)
 
-    print("\n正在读取 timestamps_1.txt...")
-    segments = parse_timestamps_keep(TIMESTAMPS_KEEP)
+    if os.path.exists(TIMESTAMPS_KEEP_STORE):
+        print(f"\n正在读取 {TIMESTAMPS_KEEP_STORE}...")
+        from transcript_store import TranscriptStore
+        with TranscriptStore.load(TIMESTAMPS_KEEP_STORE) as store:
+            segments = store.segments()
+    else:
+        print(f"\n正在读取 {TIMESTAMPS_KEEP}...")
+        segments = parse_timestamps_keep(TIMESTAMPS_KEEP)
     print(f"共读取到 {len(segments)} 个保留片段")
 
-    # 剪辑
-    cut_video = concat_video_ffmpeg_safe(VIDEO_PATH, segments, TEMP_DIR)
-
-    # 加速
     final_output = OUTPUT_VIDEO.replace(".mp4", "_加速.mp4")
-    speed_up_video(cut_video, final_output, speed=1.5)
-
-    # 删除临时文件
-    if os.path.exists(OUTPUT_VIDEO):
-        os.remove(OUTPUT_VIDEO)
+    render_video(VIDEO_PATH, segments, final_output, TEMP_DIR)
 
     print("\n" + "=" * 50)
     print(f"完成！输出视频: {final_output}")
@@ -0,0 +1,318 @@
+"""
+剪辑决策表导出：对齐 / 片段规划之后不渲染，直接输出保留与删除的时间段
+- plan.json：保留片段和删除片段（含被删除的文字），可用 main.py --from-plan 直接渲染
+- plan.edl：CMX3600 EDL，每个保留片段一个事件，删除的文字写在注释行
+- plan.fcpxml：FCPXML 1.9，保留片段依次放在主故事线上，删除的文字作为片段开头的标记
+- cut_segments.txt：被剪去的时间段及其文字，格式与 timestamps.txt 相同
+所有时间均为源视频时间（1 倍速），加速在渲染时进行。
+在剪辑软件中微调后导出的 EDL / FCPXML 也能被 load_plan 读回，不需要重新转写和调用 GPT。
+"""
+import bisect
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from fractions import Fraction
+from urllib.parse import quote, unquote
+from xml.sax.saxutils import quoteattr
+
+import edit_video1
+
+PLAN_VERSION = 1
+DEFAULT_FPS = Fraction(25)  # 读不到视频帧率时使用
+EDL_REEL = "AX"
+COMMENT_CHARS = 60  # EDL 注释行中每段删除文字最多保留的字符数
+
+
+# ---------- 生成 ----------
+def probe_source(video_path):
+    """读取源视频的帧率（r_frame_rate 的精确分数）和时长，ffprobe 不可用时返回 (DEFAULT_FPS, None)"""
+    import extract_audio_timestamps
+    import smart_cut
+    try:
+        stream = smart_cut.probe_video_stream(video_path) or {}
+        rate = stream.get('r_frame_rate', '')
+        fps = Fraction(rate) if rate and not rate.startswith('0') else DEFAULT_FPS
+        return fps, extract_audio_timestamps.probe_duration(video_path)
+    except Exception:
+        return DEFAULT_FPS, None
+
+
+def exact_rate(fps):
+    """
+    帧率 → 精确分数：NTSC 帧率（23.976、29.97、59.94 等）对齐到 n×1000/1001，
+    其余按整数或原值；plan.json 中只有取整后的 fps 时也能还原出 30000/1001 这样的帧率
+    """
+    fps = Fraction(fps).limit_denominator(1001)
+    nominal = round(fps * Fraction(1001, 1000))
+    if nominal and fps.denominator != 1 and abs(fps - Fraction(nominal * 1000, 1001)) < Fraction(1, 100):
+        return Fraction(nominal * 1000, 1001)
+    if abs(fps - round(fps)) < Fraction(1, 1000):
+        return Fraction(round(fps))
+    return fps
+
+
+def _plan_rate(plan):
+    """决策表的精确帧率：优先 frame_rate 字段（如 "30000/1001"），旧文件只有 fps 时按 exact_rate 还原"""
+    return exact_rate(Fraction(plan["frame_rate"]) if plan.get("frame_rate") else plan["fps"])
+
+
+def _text_between(store, start, end):
+    """中心时间落在 [start, end) 内的词拼成的文本"""
+    if store is None:
+        return ""
+    lo = max(0, bisect.bisect_left(store.starts, start) - 1)
+    hi = bisect.bisect_right(store.starts, end)
+    return "".join(store.word(i) for i in range(lo, hi)
+                   if start <= (store.starts[i] + store.ends[i]) / 2 < end).strip()
+
+
+def build_plan(source, kept, store=None, removed=None, duration=None, fps=None):
+    """
+    source: 源视频路径；kept: 保留片段；store: 原始转写（用于填写文字）
+    removed: 被删除的词的时间区间，用于区分 "重讲删除" 和 "静音 / 停顿"
+    """
+    kept = edit_video1.merge_adjacent_segments(kept)
+    if duration is None:
+        duration = max([kept[-1]['end'] if kept else 0.0] + ([store.ends[-1]] if store is not None and len(store) else []))
+    removed_spans = edit_video1.merge_adjacent_segments(removed or [])
+    removed_starts = [s['start'] for s in removed_spans]
+
+    def has_removed_words(start, end):
+        idx = bisect.bisect_left(removed_starts, start)
+        if idx > 0 and removed_spans[idx - 1]['end'] > start:
+            return True
+        return idx < len(removed_spans) and removed_starts[idx] < end
+
+    cuts = []
+    position = 0.0
+    for seg in kept + [{'start': duration, 'end': duration}]:
+        if seg['start'] - position > 1e-3:
+            cuts.append({'start': round(position, 3), 'end': round(seg['start'], 3),
+                         'reason': "retake" if has_removed_words(position, seg['start']) else "silence",
+                         'text': _text_between(store, position, seg['start'])})
+        position = max(position, seg['end'])
+
+    rate = exact_rate(fps or DEFAULT_FPS)
+    return {
+        "version": PLAN_VERSION,
+        "source": os.path.abspath(source),
+        "fps": round(float(rate), 3),
+        "frame_rate": f"{rate.numerator}/{rate.denominator}",
+        "duration": round(duration, 3),
+        "kept": [{'start': round(s['start'], 3), 'end': round(s['end'], 3),
+                  'text': _text_between(store, s['start'], s['end'])} for s in kept],
+        "removed": cuts,
+        "kept_seconds": round(sum(s['end'] - s['start'] for s in kept), 3),
+        "removed_seconds": round(sum(c['end'] - c['start'] for c in cuts), 3),
+    }
+
+
+# ---------- 写出 ----------
+def write_json(plan, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def write_cut_segments(plan, path):
+    """被剪去的时间段，格式与 timestamps.txt 一致"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("=" * 50 + "\n")
+        f.write("被剪去的时间段\n")
+        f.write("=" * 50 + "\n\n")
+        for cut in plan["removed"]:
+            label = "重讲" if cut["reason"] == "retake" else "停顿"
+            f.write(f"[{cut['start']:.2f}s - {cut['end']:.2f}s] ({label}) {cut['text']}\n")
+    return path
+
+
+def to_frames(seconds, fps):
+    """秒数 → 最近的整帧数；EDL / FCPXML 的入点、出点和时长都先换算成整帧再输出，保证彼此一致"""
+    return round(Fraction(seconds).limit_denominator(100000) * fps)
+
+
+def _frame_spans(plan, fps):
+    """保留片段 → (源入点帧, 源出点帧, 录制入点帧)，时长一律为 出点帧 - 入点帧，录制位置按整帧累加"""
+    spans = []
+    record = 0
+    for seg in plan["kept"]:
+        start, end = to_frames(seg["start"], fps), to_frames(seg["end"], fps)
+        spans.append((start, end, record))
+        record += end - start
+    return spans
+
+
+def timecode(frames, fps):
+    """帧数 → 非丢帧时间码 HH:MM:SS:FF（29.97 等帧率按取整后的帧基计数）"""
+    base = round(fps)
+    f = frames % base
+    s = frames // base
+    return f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}:{f:02d}"
+
+
+def _comment(text):
+    text = re.sub(r"\s+", " ", text)
+    return text if len(text) <= COMMENT_CHARS else text[:COMMENT_CHARS] + "..."
+
+
+def _cut_line(cut):
+    line = f"* CUT {cut['start']:.2f}-{cut['end']:.2f} {cut['reason'].upper()}"
+    return f"{line}: {_comment(cut['text'])}" if cut["text"] else line
+
+
+def write_edl(plan, path, title=None):
+    """CMX3600 EDL：每个保留片段一个视音频事件，前面被删除的内容写成注释"""
+    fps = _plan_rate(plan)
+    title = title or os.path.splitext(os.path.basename(plan["source"]))[0]
+    cuts_before = {}
+    for cut in plan["removed"]:
+        cuts_before.setdefault(cut["end"], []).append(cut)
+    lines = [f"TITLE: {title}", "FCM: NON-DROP FRAME", ""]
+    for n, (seg, (start, end, record)) in enumerate(zip(plan["kept"], _frame_spans(plan, fps)), 1):
+        lines.append(f"{n:03d}  {EDL_REEL:<8} AA/V  C        "
+                     f"{timecode(start, fps)} {timecode(end, fps)} "
+                     f"{timecode(record, fps)} {timecode(record + end - start, fps)}")
+        lines.append(f"* FROM CLIP NAME: {os.path.basename(plan['source'])}")
+        for cut in cuts_before.get(seg["start"], []):
+            lines.append(_cut_line(cut))
+        lines.append("")
+    last_end = plan["kept"][-1]["end"] if plan["kept"] else 0.0
+    lines.extend(_cut_line(cut) for cut in plan["removed"] if cut["start"] >= last_end)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def _rational(frames, frame_duration):
+    """整帧数写成 FCPXML 的有理数时间"""
+    value = frames * frame_duration
+    return f"{value.numerator}/{value.denominator}s" if value.denominator != 1 else f"{value.numerator}s"
+
+
+def _marker_text(cut):
+    return f"删除 {cut['start']:.2f}-{cut['end']:.2f}: {_comment(cut['text'])}"
+
+
+def write_fcpxml(plan, path, title=None):
+    """FCPXML 1.9：保留片段依次排在主故事线上，删除的内容作为片段开头的标记"""
+    fps = _plan_rate(plan)
+    frame_duration = 1 / fps  # 29.97 → 1001/30000s
+    title = title or os.path.splitext(os.path.basename(plan["source"]))[0]
+    path_part = plan["source"].replace("\\", "/")
+    src = "file://" + quote(path_part if path_part.startswith("/") else "/" + path_part, safe="/:")
+    cuts_before = {}
+    for cut in plan["removed"]:
+        cuts_before.setdefault(cut["end"], []).append(cut)
+
+    one_frame = f"{frame_duration.numerator}/{frame_duration.denominator}s"
+
+    clips = []
+    offset = 0
+    for seg, (start, end, offset) in zip(plan["kept"], _frame_spans(plan, fps)):
+        clip = (f'                        <asset-clip ref="r2" name={quoteattr(title)} '
+                f'offset="{_rational(offset, frame_duration)}" start="{_rational(start, frame_duration)}" '
+                f'duration="{_rational(end - start, frame_duration)}"')
+        markers = [
+            f'                            <marker start="{_rational(start, frame_duration)}" '
+            f'duration="{one_frame}" value={quoteattr(_marker_text(cut))}/>'
+            for cut in cuts_before.get(seg["start"], [])]
+        if markers:
+            clips.append(clip + ">\n" + "\n".join(markers) + "\n                        </asset-clip>")
+        else:
+            clips.append(clip + "/>")
+        offset += end - start
+
+    xml = f'''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE fcpxml>
+<fcpxml version="1.9">
+    <resources>
+        <format id="r1" frameDuration="{one_frame}"/>
+        <asset id="r2" name={quoteattr(title)} start="0s" duration="{_rational(to_frames(plan["duration"], fps), frame_duration)}" hasVideo="1" hasAudio="1" format="r1">
+            <media-rep kind="original-media" src={quoteattr(src)}/>
+        </asset>
+    </resources>
+    <library>
+        <event name={quoteattr(title)}>
+            <project name={quoteattr(title + " 剪辑")}>
+                <sequence format="r1" duration="{_rational(offset, frame_duration)}" tcStart="0s" tcFormat="NDF">
+                    <spine>
+{chr(10).join(clips)}
+                    </spine>
+                </sequence>
+            </project>
+        </event>
+    </library>
+</fcpxml>
+'''
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(xml)
+    return path
+
+
+def export_all(plan, directory, basename="plan"):
+    """写出 JSON / EDL / FCPXML / cut_segments.txt，返回路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    return [
+        write_json(plan, os.path.join(directory, f"{basename}.json")),
+        write_edl(plan, os.path.join(directory, f"{basename}.edl")),
+        write_fcpxml(plan, os.path.join(directory, f"{basename}.fcpxml")),
+        write_cut_segments(plan, os.path.join(directory, "cut_segments.txt")),
+    ]
+
+
+# ---------- 读回 ----------
+def _parse_timecode(tc, fps):
+    h, m, s, f = (int(x) for x in re.split(r"[:;]", tc))
+    return float(((h * 3600 + m * 60 + s) * round(fps) + f) / exact_rate(fps))
+
+
+def _parse_rational(value):
+    value = value.rstrip("s")
+    return float(Fraction(value)) if value else 0.0
+
+
+def load_plan(path, fps=None):
+    """
+    读取 plan.json / CMX3600 EDL / FCPXML，返回 (源视频路径或 None, 保留片段)
+    EDL 只记录片段名，返回的源视频路径为文件名
+    EDL 不记录帧率，默认按 fps（或 DEFAULT_FPS）换算时间码
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            plan = json.load(f)
+        return plan.get("source"), [{'start': s['start'], 'end': s['end']} for s in plan["kept"]]
+
+    if ext == ".edl":
+        fps = fps or DEFAULT_FPS
+        segments = []
+        source = None
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                match = re.match(r"\s*\d+\s+\S+\s+\S+\s+C\s+(\S+)\s+(\S+)\s+\S+\s+\S+", line)
+                if match:
+                    segments.append({'start': round(_parse_timecode(match.group(1), fps), 3),
+                                     'end': round(_parse_timecode(match.group(2), fps), 3)})
+                elif line.startswith("* FROM CLIP NAME:") and source is None:
+                    source = line.split(":", 1)[1].strip()
+        return source, segments
+
+    if ext not in (".fcpxml", ".xml"):
+        raise ValueError(f"不支持的决策表格式: {path}（支持 .json / .edl / .fcpxml）")
+    # FCPXML：主故事线上的 asset-clip / clip
+    root = ET.parse(path).getroot()
+    source = None
+    rep = root.find(".//media-rep")
+    if rep is not None and rep.get("src", "").startswith("file://"):
+        source = unquote(rep.get("src")[len("file://"):])
+        if re.match(r"/[A-Za-z]:/", source):
+            source = source[1:]  # Windows 路径 file:///C:/...
+    spine = root.find(".//spine")
+    segments = []
+    for clip in (spine if spine is not None else root.iter()):  # 只取主故事线，忽略连接片段
+        if clip.tag in ("asset-clip", "clip") and clip.get("duration"):
+            start = _parse_rational(clip.get("start", "0s"))
+            segments.append({'start': round(start, 3),
+                             'end': round(start + _parse_rational(clip.get("duration")), 3)})
+    return source, segments
@@ -0,0 +1,284 @@
+"""
+视频编码器能力探测与回退阶梯
+1. 用 ffmpeg -encoders 列出编译进来的编码器，再对候选编码器做一次极短的试编码
+   （驱动或硬件不满足时在这里就会失败），结果按 ffmpeg 路径 + 修改时间缓存到磁盘，同一台机器只探测一次；
+   会话数超限、超时等暂时性失败只在本进程内生效，不写入缓存。多个 worker 进程写缓存时合并各自的结果
+2. 回退阶梯：nvenc → qsv → vaapi → 软件编码（libx264 / libx265），各编码器使用画质大致相当的参数
+3. 渲染中途编码器本身报错或 NVENC 会话数超限时，edit_video1.render_video 自动换下一级编码器重试；
+   只有编码器本身的报错才停用该编码器，会话数超限单独计数，与编码器无关的失败直接抛出
+4. 每次渲染成功后记录该编码器的处理速度（x 实时，复用了检查点片段的渲染不计入），
+   PREFER_FASTEST 时在有实测数据的编码器中优先使用最快的；
+   没有实测数据的编码器只在排在它前面的编码器失败时才会用到（阶梯最前面的可用编码器除外），不会为了测速而降级
+"""
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import threading
+
+import ffmpeg_config
+
+# 回退阶梯，按优先级排列
+LADDERS = {
+    'h264': ['h264_nvenc', 'h264_qsv', 'h264_vaapi', 'libx264'],
+    'hevc': ['hevc_nvenc', 'hevc_qsv', 'hevc_vaapi', 'libx265'],
+}
+
+# --- 各编码器参数（nvenc / libx264 沿用 ffmpeg_config 中的 PRESET / CQ_VALUE / CRF_VALUE） ---
+QSV_PRESET = 'medium'
+VAAPI_DEVICE = '/dev/dri/renderD128'
+X265_CRF = '28'  # libx265 的 CRF 28 与 libx264 的 CRF 23 画质大致相当
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "encoders.json")
+PROBE_TIMEOUT = 30  # 单次试编码的超时秒数
+PREFER_FASTEST = True  # True: 按实测速度排序可用编码器
+SPEED_SMOOTHING = 0.3  # 处理速度的指数滑动平均系数
+
+# NVENC 并发会话数超限时的报错（新驱动为 out of memory，旧驱动为 incompatible client key）
+SESSION_LIMIT_PATTERNS = ('OpenEncodeSessionEx failed: out of memory', 'incompatible client key')
+# 明确由编码器 / 驱动 / 硬件引起的报错；只有这类失败才在本进程内停用该编码器，
+# 输入损坏、片段参数错误等其他失败换编码器重试，但不影响之后的任务
+ENCODER_ERROR_PATTERNS = (
+    'Error while opening encoder', 'Error initializing output stream', 'Unknown encoder',
+    'No NVENC capable devices found', 'No capable devices found', 'Cannot load libcuda', 'Cannot load nvcuda',
+    'Driver does not support the required nvenc API version', 'OpenEncodeSessionEx failed',
+    'Failed to initialise VAAPI', 'No VA display found', 'Failed to create a VAAPI device',
+    'Error creating a MFX session', 'Error initializing an internal MFX session',
+)
+
+PROBE_TIMEOUT_ERROR = "试编码超时"
+
+_lock = threading.Lock()
+_state = None  # 缓存内容（磁盘上的最新状态 + 本进程的改动）
+_pending = None  # 本进程尚未写入磁盘的改动
+_transient = {}  # 本进程内暂时性探测失败的结果，不写入缓存
+_failed = set()  # 本进程内已确认不可用的编码器（只计入编码器本身的报错，会话数超限属于暂时性失败）
+
+
+def family(codec):
+    """编码器所属的编码格式"""
+    return 'hevc' if 'hevc' in codec or codec == 'libx265' else 'h264'
+
+
+def codec_args(codec):
+    """编码器对应的视频编码参数"""
+    if codec.endswith('_nvenc'):
+        return ['-c:v', codec, '-preset', ffmpeg_config.PRESET, '-rc', ffmpeg_config.RC_MODE,
+                '-cq', ffmpeg_config.CQ_VALUE]
+    if codec.endswith('_qsv'):
+        return ['-c:v', codec, '-preset', QSV_PRESET, '-global_quality', ffmpeg_config.CQ_VALUE]
+    if codec.endswith('_vaapi'):
+        # -vaapi_device 是全局选项，放在命令行任意位置都生效
+        return ['-vaapi_device', VAAPI_DEVICE, '-c:v', codec, '-rc_mode', 'CQP', '-qp', ffmpeg_config.CQ_VALUE]
+    if codec == 'libx265':
+        return ['-c:v', codec, '-preset', ffmpeg_config.SOFTWARE_PRESET, '-crf', X265_CRF]
+    return ['-c:v', codec, '-preset', ffmpeg_config.SOFTWARE_PRESET, '-crf', ffmpeg_config.CRF_VALUE]
+
+
+def hw_filter(codec):
+    """编码前需要追加的滤镜：VAAPI 只接受显存中的帧，需要先上传"""
+    if codec.endswith('_vaapi'):
+        return 'format=nv12,hwupload'
+    return None
+
+
+def _ffmpeg_id():
+    path = shutil.which(ffmpeg_config.FFMPEG_PATH) or ffmpeg_config.FFMPEG_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return {"ffmpeg": path, "mtime": mtime}
+
+
+def listed_encoders():
+    """ffmpeg -encoders 中的视频编码器名称"""
+    result = subprocess.run([ffmpeg_config.FFMPEG_PATH, '-hide_banner', '-encoders'],
+                            capture_output=True, encoding='utf-8', errors='ignore')
+    return set(re.findall(r'^\s*V\S*\s+(\S+)', result.stdout, re.MULTILINE))
+
+
+def test_encode(codec):
+    """用 lavfi 测试画面编码几帧，返回 (是否成功, 错误信息)"""
+    vf = hw_filter(codec)
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'testsrc2=size=320x240:rate=25:duration=0.4',
+        *(['-vf', vf] if vf else []),
+        *codec_args(codec),
+        '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, encoding='utf-8', errors='ignore', timeout=PROBE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return False, PROBE_TIMEOUT_ERROR
+    if result.returncode != 0:
+        # 保留完整的错误输出：NVENC 会话数超限等原因在 "Error while opening encoder" 之前的行里
+        lines = result.stderr.strip().splitlines()[-ffmpeg_config.STDERR_TAIL_LINES:]
+        return False, "\n".join(lines) if lines else f"ffmpeg 退出码 {result.returncode}"
+    return True, None
+
+
+def _read_cache(ident):
+    """读取磁盘缓存，ffmpeg 变化后作废"""
+    state = None
+    try:
+        with open(CACHE_PATH, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if not state or state.get("ffmpeg") != ident["ffmpeg"] or state.get("mtime") != ident["mtime"]:
+        state = dict(ident, listed=None, available={}, errors={}, speed={}, session_limit_hits=0)
+    return state
+
+
+def _load():
+    global _state
+    if _state is None:
+        _state = _read_cache(_ffmpeg_id())
+    return _state
+
+
+def _changes():
+    global _pending
+    if _pending is None:
+        _pending = {"listed": None, "available": {}, "errors": {}, "speed": {}, "session_limit_hits": 0}
+    return _pending
+
+
+def _set(key, codec, value):
+    """修改缓存中的一项，同时记入待写入的改动"""
+    _load()[key][codec] = value
+    _changes()[key][codec] = value
+
+
+def _save():
+    """把本进程的改动合并进磁盘上的最新状态后写回，同时运行的 worker 进程不会覆盖彼此的结果"""
+    global _state, _pending
+    state = _load()
+    changes = _changes()
+    merged = _read_cache({"ffmpeg": state["ffmpeg"], "mtime": state["mtime"]})
+    if changes["listed"] is not None:
+        merged["listed"] = changes["listed"]
+    for key in ("available", "errors", "speed"):
+        merged[key].update(changes[key])
+    merged["session_limit_hits"] += changes["session_limit_hits"]
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    tmp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, CACHE_PATH)
+    _state = merged
+    _pending = None
+
+
+def is_available(codec):
+    """编码器是否可用；首次查询时试编码，结果写入缓存（暂时性失败除外）"""
+    with _lock:
+        state = _load()
+        if codec in _failed:
+            return False
+        if codec in state["available"]:
+            return state["available"][codec]
+        if codec in _transient:
+            return _transient[codec]
+        if state["listed"] is None:
+            state["listed"] = _changes()["listed"] = sorted(listed_encoders())
+        if codec not in state["listed"]:
+            ok, error = False, "ffmpeg 未编译该编码器"
+        else:
+            ok, error = test_encode(codec)
+        if not ok and (error == PROBE_TIMEOUT_ERROR or classify_failure(error) == 'session_limit'):
+            # 多个 worker 同时启动探测时容易遇到：会话数超限说明编码器本身可用，超时则下次启动重新探测
+            _transient[codec] = error != PROBE_TIMEOUT_ERROR
+            print(f"编码器 {codec} 探测遇到暂时性失败，本次不写入缓存: {error.strip().splitlines()[-1]}")
+            return _transient[codec]
+        _set("available", codec, ok)
+        if error:
+            _set("errors", codec, error)
+        _save()
+        return ok
+
+
+def probe(preferred=None):
+    """启动时探测回退阶梯上的编码器，返回可用的编码器列表"""
+    preferred = preferred or ffmpeg_config.VIDEO_CODEC
+    available = [codec for codec in LADDERS[family(preferred)] if is_available(codec)]
+    print(f"可用视频编码器: {', '.join(available) or '无'}")
+    return available
+
+
+def ladder(preferred=None):
+    """
+    从 preferred 开始往下的可用编码器，按尝试顺序排列
+    一个都不可用时仍返回 [preferred]，让渲染以真实报错结束
+    """
+    preferred = preferred or ffmpeg_config.VIDEO_CODEC
+    rungs = LADDERS[family(preferred)]
+    rungs = rungs[rungs.index(preferred):] if preferred in rungs else [preferred]
+    available = [codec for codec in rungs if is_available(codec)]
+    if PREFER_FASTEST and available:
+        # 有实测速度的按速度排序；阶梯最前面的可用编码器没有实测数据时排第一（首次使用），
+        # 其余没有实测数据的按阶梯顺序排在最后，只作为回退
+        speed = _load()["speed"]
+        first = available[0]
+        available.sort(key=lambda c: -speed.get(c, math.inf if c == first else -math.inf))
+    return available or [preferred]
+
+
+def classify_failure(error):
+    """'session_limit'：NVENC 会话数超限；'encoder'：编码器本身的报错；'other'：与编码器无关或无法判断"""
+    error = error or ''
+    if any(pattern in error for pattern in SESSION_LIMIT_PATTERNS):
+        return 'session_limit'
+    if any(pattern in error for pattern in ENCODER_ERROR_PATTERNS):
+        return 'encoder'
+    return 'other'
+
+
+def report_failure(codec, error):
+    """
+    记录渲染中途的编码失败，返回 classify_failure 的分类
+    只有编码器本身的报错才在本进程内停用该编码器；会话数超限是暂时的，
+    其他失败（如输入损坏）不能说明编码器有问题，长期运行的 worker 不会因为一个坏任务永久降级
+    """
+    kind = classify_failure(error)
+    with _lock:
+        state = _load()
+        if kind == 'session_limit':
+            state["session_limit_hits"] += 1
+            _changes()["session_limit_hits"] += 1
+            print(f"编码器 {codec} 并发会话数超限（累计 {state['session_limit_hits']} 次），可调小 MAX_WORKERS")
+        elif kind == 'encoder':
+            _failed.add(codec)
+            _set("errors", codec, error)
+        _save()
+    return kind
+
+
+def record_throughput(codec, source_seconds, wall):
+    """记录一次成功渲染的处理速度（源视频秒数 / 墙钟秒数），按指数滑动平均累计"""
+    if wall <= 0 or source_seconds <= 0:
+        return
+    speed = source_seconds / wall
+    with _lock:
+        state = _load()
+        previous = state["speed"].get(codec)
+        if previous is not None:
+            speed = previous + SPEED_SMOOTHING * (speed - previous)
+        _set("speed", codec, round(speed, 2))
+        _save()
+
+
+def stats():
+    with _lock:
+        state = _load()
+        return {
+            "available": {codec: ok and codec not in _failed for codec, ok in state["available"].items()},
+            "errors": dict(state["errors"]),
+            "speed": dict(state["speed"]),
+            "session_limit_hits": state["session_limit_hits"],
+        }
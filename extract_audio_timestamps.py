@@ -1,66 +1,270 @@
 """
 从视频中提取音频并获取说话内容的时间戳
 """
-from openai import OpenAI
-from moviepy import VideoFileClip
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 import os
+import re
+import subprocess
 import sys
+import time
+
+import api_client
+import asr_backends
+import edit_video1
+import ffmpeg_config
+from transcription_cache import TranscriptionCache
+from transcript_store import TranscriptStore
 
 # 配置 - 支持命令行参数
 if len(sys.argv) > 1:
     VIDEO_PATH = sys.argv[1]
 else:
     VIDEO_PATH = r"C:\Users\admin\Desktop\剪辑\输入.mp4"  # 默认路径
-OUTPUT_TXT = os.path.join(os.path.dirname(__file__), "timestamps.txt")  # 时间戳输出路径
-AUDIO_TEMP = "temp_audio.mp3"  # 临时音频文件
+OUTPUT_STORE = os.path.join(os.path.dirname(__file__), "timestamps.bin")  # 时间戳输出路径（结构化）
+OUTPUT_TXT = os.path.join(os.path.dirname(__file__), "timestamps.txt")  # 人工查看用的文本导出
+EXPORT_TXT = True  # 是否同时导出 timestamps.txt
+AUDIO_TEMP = "temp_audio.mp3"  # 临时音频文件（USE_PIPE 为 False 时使用）
+USE_PIPE = True  # True: 音频经管道直接读入内存，不在当前目录落盘
+USE_CACHE = True  # 相同音频 + 模型参数命中缓存时跳过接口调用
+WHISPER_MODEL = "whisper-1"
+TIMESTAMP_GRANULARITY = "word"
+
+# --- 音频提取配置 ---
+# 语音识别只需要 16kHz 单声道，低码率 CBR mp3 体积小，且可由字节数直接推算时长
+AUDIO_SAMPLE_RATE = 16000
+AUDIO_BITRATE = 32000  # bps
+
+# --- 分块转写配置 ---
+MAX_UPLOAD_BYTES = 24 * 1024 * 1024  # 接口单次上传上限 25MB，留出余量
+MAX_CHUNK_SECONDS = 600  # 单块最长时长，块越多并发度越高
+TRANSCRIBE_CONCURRENCY = 4  # 同时进行的转写请求数
+CHUNK_OVERLAP = 1.0  # 找不到静音切点时，相邻块重叠的秒数
+SILENCE_NOISE = "-35dB"  # 低于该音量视为静音
+SILENCE_MIN_DURATION = 0.3  # 最短静音时长 (秒)
 
-# OpenAI 客户端
-os.environ["OPENAI_API_KEY"] = "sk-**********************************" # 配置api key
-client = OpenAI(
-    base_url="https://********************"
-)
 
+def _audio_input(audio):
+    """ffmpeg 输入：文件路径直接读取，内存中的音频经 stdin 传入"""
+    if isinstance(audio, (bytes, bytearray)):
+        return 'pipe:0', bytes(audio)
+    return audio, None
 
-def extract_audio_from_video(video_path, audio_output_path):
+
+def extract_audio_from_video(video_path, audio_output_path=None):
     """
-    从视频中提取音频
+    用 ffmpeg 直接解复用并重采样为 16kHz 单声道 mp3
+    audio_output_path 为 None 时经管道输出，返回音频字节；否则写文件并返回路径
     """
     print(f"正在提取视频音频: {video_path}")
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-i', video_path,
+        '-vn', '-map', '0:a:0',
+        '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE),
+        '-c:a', 'libmp3lame', '-b:a', str(AUDIO_BITRATE),
+        '-f', 'mp3',
+        audio_output_path or 'pipe:1'
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    if audio_output_path is None:
+        print(f"音频已读入内存: {len(result.stdout) / (1024 * 1024):.2f} MB")
+        return result.stdout
+    print(f"音频已保存到: {audio_output_path}")
+    return audio_output_path
+
+
+def extract_audio_from_video_moviepy(video_path, audio_output_path):
+    """
+    旧版提取方式（moviepy 全速率立体声），仅保留用于性能对比
+    """
+    from moviepy import VideoFileClip
     video = VideoFileClip(video_path)
     audio = video.audio
-    audio.write_audiofile(audio_output_path)
+    audio.write_audiofile(audio_output_path, logger=None)
     video.close()
-    print(f"音频已保存到: {audio_output_path}")
     return audio_output_path
 
 
-def get_audio_timestamps(audio_path):
+def probe_duration(audio):
+    """获取音频时长（秒）；内存中的 CBR 音频直接按码率推算"""
+    if isinstance(audio, (bytes, bytearray)):
+        return len(audio) * 8 / AUDIO_BITRATE
+    cmd = [
+        edit_video1.ffprobe_path(), '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'csv=p=0',
+        audio
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True, encoding='utf-8', errors='ignore')
+    return float(result.stdout.strip())
+
+
+def detect_silences(audio):
+    """用 ffmpeg silencedetect 找出静音区间，返回 [(开始, 结束), ...]"""
+    source, data = _audio_input(audio)
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-hide_banner', '-nostats',
+        '-i', source,
+        '-af', f'silencedetect=noise={SILENCE_NOISE}:d={SILENCE_MIN_DURATION}',
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, input=data, capture_output=True)
+    silences = []
+    start = None
+    for line in result.stderr.decode('utf-8', errors='ignore').splitlines():
+        match = re.search(r'silence_start: ([\d.]+)', line)
+        if match:
+            start = float(match.group(1))
+            continue
+        match = re.search(r'silence_end: ([\d.]+)', line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(duration, silences, max_chunk_seconds, overlap=CHUNK_OVERLAP):
+    """
+    规划分块：优先在静音中点切分；块内找不到静音时硬切，并与下一块重叠 overlap 秒
+    返回 [(开始, 结束, 归属开始, 归属结束), ...]，词按中心时间落在哪块的归属区间去重
+    """
+    if overlap >= max_chunk_seconds:
+        # 硬切时每块只前进 max_chunk_seconds - overlap 秒，不为正数时无法推进
+        raise ValueError(f"分块重叠秒数 ({overlap}) 必须小于分块时长 ({max_chunk_seconds:.1f})")
+    midpoints = [(s + e) / 2 for s, e in silences]
+    chunks = []
+    start = 0.0
+    own_start = 0.0
+    while duration - start > max_chunk_seconds:
+        limit = start + max_chunk_seconds
+        # 在块的后半段里找最靠后的静音
+        candidates = [m for m in midpoints if start + max_chunk_seconds / 2 <= m <= limit]
+        if candidates:
+            cut = candidates[-1]
+            chunks.append((start, cut, own_start, cut))
+            start = own_start = cut
+        else:
+            boundary = limit - overlap / 2
+            chunks.append((start, limit, own_start, boundary))
+            start = limit - overlap
+            own_start = boundary
+    chunks.append((start, duration, own_start, duration))
+    return chunks
+
+
+def extract_chunk(audio, start, end):
+    """将 [start, end) 区间重新编码为单声道 mp3，直接读到内存"""
+    source, data = _audio_input(audio)
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+        '-ss', f"{start:.3f}",
+        '-t', f"{end - start:.3f}",
+        '-i', source,
+        '-ac', '1', '-ar', str(AUDIO_SAMPLE_RATE), '-b:a', str(AUDIO_BITRATE),
+        '-f', 'mp3', 'pipe:1'
+    ]
+    return subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+
+
+def transcribe(audio_file):
+    """
+    单次调用转写接口，返回词列表
+    请求经 api_client 限速、失败重试；API key 和接口地址见环境变量 OPENAI_API_KEY / OPENAI_BASE_URL
+    """
+    return api_client.transcribe(audio_file, WHISPER_MODEL, TIMESTAMP_GRANULARITY)
+
+
+def transcribe_chunk(audio, chunk, backend):
+    """转写单个分块，并把时间换算为整段音频的绝对时间，只保留归属于本块的词"""
+    start, end, own_start, own_end = chunk
+    data = extract_chunk(audio, start, end)
+    words = []
+    for w in backend.transcribe(data, duration=end - start):
+        word = SimpleNamespace(start=w.start + start, end=w.end + start, word=w.word)
+        center = (word.start + word.end) / 2
+        if own_start <= center < own_end:
+            words.append(word)
+    return words
+
+
+def stitch_words(chunk_words):
+    """按块顺序拼接词列表，去掉边界处重复识别的同一个词"""
+    words = []
+    for chunk in chunk_words:
+        for word in chunk:
+            if words and word.word == words[-1].word and word.start < words[-1].end:
+                continue
+            words.append(word)
+    return words
+
+
+def _resolve_backend(backend):
+    """backend 可以是后端名、后端实例或 None（使用默认后端）"""
+    if isinstance(backend, asr_backends.ASRBackend):
+        return backend
+    return asr_backends.get_backend(backend)
+
+
+def get_audio_timestamps(audio, concurrency=None, backend=None):
     """
-    调用 OpenAI Whisper API 获取音频的时间戳
+    调用识别后端（默认 OpenAI Whisper API）获取音频的时间戳
+    audio 可以是音频文件路径，也可以是内存中的音频字节
+    后端有上传 / 时长上限时，超限的音频在静音处分块，并发转写后拼接
     """
-    # 获取文件大小
-    file_size = os.path.getsize(audio_path)
-    print(f"正在上传音频并获取时间戳...")
+    backend = _resolve_backend(backend)
+    concurrency = concurrency or backend.concurrency
+    in_memory = isinstance(audio, (bytes, bytearray))
+    file_size = len(audio) if in_memory else os.path.getsize(audio)
+    print(f"正在获取时间戳（识别后端: {backend.name}）...")
     print(f"音频文件大小: {file_size / (1024 * 1024):.2f} MB")
-    print(f"正在上传...")
 
-    with open(audio_path, "rb") as audio_file:
+    duration = probe_duration(audio)
+    wall_start = time.perf_counter()
+    max_upload_bytes = backend.max_upload_bytes or float("inf")
+    max_chunk_seconds = min(backend.max_chunk_seconds or float("inf"), max_upload_bytes * 8 / AUDIO_BITRATE)
+    if file_size <= max_upload_bytes and duration <= max_chunk_seconds:
         try:
-            print(f"上传中，请稍候...")
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
-                model="whisper-1",
-                response_format="verbose_json",
-                timestamp_granularities=["word"]
-            )
-            print(f"上传成功!")
-            print(f"正在处理音频...")
-            print(f"时间戳获取成功!")
-            print(f"共识别到 {len(transcription.words)} 个词")
-            return transcription.words
+            print(f"识别中，请稍候...")
+            words = backend.transcribe(audio, duration=duration)
         except Exception as e:
-            print(f"上传失败: {e}")
+            print(f"识别失败: {e}")
             raise
+    else:
+        chunks = plan_chunks(duration, detect_silences(audio), max_chunk_seconds)
+        print(f"音频时长 {duration:.1f}s，分为 {len(chunks)} 块，并发数 {concurrency}")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                # map 按提交顺序返回结果，拼接顺序与完成顺序无关
+                chunk_words = list(executor.map(lambda c: transcribe_chunk(audio, c, backend), chunks))
+            except Exception as e:
+                print(f"识别失败: {e}")
+                raise
+        words = stitch_words(chunk_words)
+
+    wall = time.perf_counter() - wall_start
+    print(f"时间戳获取成功!")
+    print(f"共识别到 {len(words)} 个词，音频 {duration:.1f}s，耗时 {wall:.1f}s，"
+          f"吞吐 {duration / wall if wall > 0 else 0:.1f} 音频秒/秒")
+    return words
+
+
+def get_audio_timestamps_cached(audio, cache=None, backend=None):
+    """先查转写缓存，未命中再调用识别后端并写回缓存"""
+    if cache is None:
+        return get_audio_timestamps(audio, backend=backend)
+
+    backend = _resolve_backend(backend)
+    key = cache.make_key(audio, backend.cache_id(), TIMESTAMP_GRANULARITY)
+    words = cache.get(key)
+    if words is not None:
+        print(f"命中转写缓存: {key[:12]}... ({len(words)} 个词)")
+        return words
+
+    words = get_audio_timestamps(audio, backend=backend)
+    cache.put(key, words)
+    return words
 
 
 def save_timestamps_to_txt(words, output_path):
@@ -94,16 +298,23 @@ def cleanup_temp_file(file_path):
 
 def main():
     # 1. 提取音频
-    extract_audio_from_video(VIDEO_PATH, AUDIO_TEMP)
+    audio = extract_audio_from_video(VIDEO_PATH, None if USE_PIPE else AUDIO_TEMP)
 
-    # 2. 获取时间戳
-    words = get_audio_timestamps(AUDIO_TEMP)
+    # 2. 获取时间戳（优先查缓存）
+    cache = TranscriptionCache() if USE_CACHE else None
+    words = get_audio_timestamps_cached(audio, cache)
+    if cache:
+        print(f"转写缓存统计: {cache.stats()}")
 
-    # 3. 保存到 txt
-    save_timestamps_to_txt(words, OUTPUT_TXT)
+    # 3. 保存时间戳
+    TranscriptStore.from_words(words).save(OUTPUT_STORE)
+    print(f"时间戳已保存到: {OUTPUT_STORE}")
+    if EXPORT_TXT:
+        save_timestamps_to_txt(words, OUTPUT_TXT)
 
     # 4. 清理临时文件
-    cleanup_temp_file(AUDIO_TEMP)
+    if not USE_PIPE:
+        cleanup_temp_file(AUDIO_TEMP)
 
     print("\n完成!")
 
@@ -0,0 +1,21 @@
+"""
+ffmpeg 路径与视频编码参数
+edit_video1 / encoders / smart_cut 等模块共用，单独放在这里，encoders 不需要反过来导入 edit_video1
+"""
+
+# FFmpeg 路径配置
+FFMPEG_PATH = r"F:\ffmpeg\ffmpeg-2026-02-09-git-9bfa1635ae-essentials_build\ffmpeg-2026-02-09-git-9bfa1635ae-essentials_build\bin\ffmpeg.exe" # 配置ffmpeg路径
+
+# --- GPU 编码配置 ---
+# 只使用 GPU 编码，不使用 GPU 解码，以换取最大的稳定性
+VIDEO_CODEC = 'h264_nvenc'
+PRESET = 'p4'
+RC_MODE = 'vbr'
+CQ_VALUE = '23'
+
+# --- CPU 软件编码配置 ---
+SOFTWARE_PRESET = 'veryfast'
+CRF_VALUE = '23'
+
+# 失败时保留 ffmpeg 错误输出的最后几行（编码器报错通常在最后一行之前，回退判断需要完整上下文）
+STDERR_TAIL_LINES = 20
@@ -0,0 +1,359 @@
+"""
+直播 / 录制中的增量剪辑：不等录制结束，边录边处理
+1. 监视正在写入的文件（mkv / ts / flv 等可边写边读的容器），或录制软件分段输出的目录
+2. 新增的音频按 CHUNK_SECONDS 滚动切块转写；块尾 CHUNK_GUARD 秒内的词留到下一块重新识别，避免词被切断
+3. 重讲检测只在最近的 lookback 窗口内进行：比最新字符早 LOOKBACK_CHARS 以上的字符不会再被后续的
+   "重来" 删除，视为已定稿
+4. 已定稿的保留片段攒够 RENDER_BATCH_SECONDS 后立即单次编码渲染成一个分段（剪切 + 加速）
+5. 录制结束（文件 IDLE_SECONDS 内不再增长，或出现 <文件名>.done 标记）后处理剩余部分，无损合并所有分段
+   分段渲染失败时与离线渲染一样沿编码器回退阶梯重试；中途换过编码器时最后合并需要重新编码
+录制结束后只需处理最后一小段，成片几分钟内即可拿到。
+
+用法:
+    python live.py 录制中.mkv -o 输出.mp4
+    python live.py 分段目录/ --pattern "*.ts" -o 输出.mp4
+本地测试: python benchmarks/simulate_recording.py 录制中.ts 与 python live.py 录制中.ts --asr fake 同时运行
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+
+import asr_backends
+import edit_video1
+import encoders
+import extract_audio_timestamps
+import ffmpeg_config
+import phase1_cut
+import retake_rules
+import segment_planner
+from profiling import StageProfiler
+
+CHUNK_SECONDS = 30  # 每次转写的音频时长
+CHUNK_GUARD = 1.0  # 块尾该秒数内结束的词留给下一块，避免词被切断
+MIN_CHUNK_SECONDS = 0.5  # 录制结束后剩余音频短于该值时不再转写
+LOOKBACK_CHARS = retake_rules.MAX_LOOKBACK  # 重讲最多向前删除的字符数
+SIGNAL_MARGIN = 20  # 否定信号可能跨块，定稿位置再多留的字符数
+RENDER_BATCH_SECONDS = 30  # 已定稿的保留内容攒够该秒数后渲染一个分段
+POLL_INTERVAL = 2.0  # 检查输入是否增长的间隔（秒）
+IDLE_SECONDS = 10  # 输入超过该秒数不再增长即视为录制结束
+DONE_SUFFIX = ".done"  # 出现 <输入>.done 标记文件时立即视为录制结束
+CLEAN_ENGINE = 'rules'  # 增量清理默认用规则引擎，窗口反复重算时不产生接口调用
+
+
+class GrowingFile:
+    """正在写入的单个录制文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._size = -1
+        self._changed_at = time.monotonic()
+
+    def input(self):
+        return self.path
+
+    def poll(self):
+        """返回输入自上次检查以来是否有变化"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else -1
+        if size != self._size:
+            self._size = size
+            self._changed_at = time.monotonic()
+            return True
+        return False
+
+    def finished(self):
+        return os.path.exists(self.path + DONE_SUFFIX) or \
+            (self._size >= 0 and time.monotonic() - self._changed_at >= IDLE_SECONDS)
+
+
+class SegmentDirectory:
+    """
+    录制软件分段输出的目录：最新的一个分段可能仍在写入，之前的分段都已完成
+    已完成的分段写成 ffconcat 列表作为单一输入，时间轴连续；
+    列表放在分段目录中并使用相对文件名，分段文件名需只含 ASCII 字符（concat 安全路径要求）
+    """
+
+    def __init__(self, directory, pattern="*.ts"):
+        self.directory = directory
+        self.pattern = pattern
+        self.list_path = os.path.join(directory, ".live_segments.ffconcat")
+        self._files = []
+        self._sizes = None
+        self._changed_at = time.monotonic()
+
+    def _scan(self):
+        return sorted(glob.glob(os.path.join(self.directory, self.pattern)))
+
+    def input(self):
+        files = self._files if self.finished() else self._files[:-1]
+        with open(self.list_path, 'w', encoding='utf-8') as f:
+            f.write("ffconcat version 1.0\n")
+            for path in files:
+                f.write(f"file '{os.path.basename(path)}'\n")
+        return self.list_path
+
+    def poll(self):
+        files = self._scan()
+        sizes = [os.path.getsize(path) for path in files]
+        if sizes != self._sizes:
+            self._files, self._sizes = files, sizes
+            self._changed_at = time.monotonic()
+            return True
+        return False
+
+    def finished(self):
+        return os.path.exists(self.directory.rstrip("/\\") + DONE_SUFFIX) or \
+            (bool(self._files) and time.monotonic() - self._changed_at >= IDLE_SECONDS)
+
+
+def extract_window(source, start, duration):
+    """从输入中截取 [start, start + duration) 的音频为内存中的 mp3；输入尚不够长时得到较短的音频"""
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+        '-ss', f"{start:.3f}",
+        '-t', f"{duration:.3f}",
+        '-i', source,
+        '-vn', '-map', '0:a:0',
+        '-ac', '1', '-ar', str(extract_audio_timestamps.AUDIO_SAMPLE_RATE),
+        '-c:a', 'libmp3lame', '-b:a', str(extract_audio_timestamps.AUDIO_BITRATE),
+        '-f', 'mp3', 'pipe:1'
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    # 文件尾部正在写入时 ffmpeg 可能报错，等下一次轮询再读
+    return result.stdout if result.returncode == 0 else b""
+
+
+def concat_reencode(paths, output_path, codec):
+    """编码器不同的分段不能无损合并，用 concat 滤镜重新编码"""
+    inputs = [arg for path in paths for arg in ('-i', path)]
+    graph = "".join(f"[{i}:v][{i}:a]" for i in range(len(paths))) + f"concat=n={len(paths)}:v=1:a=1"
+    vf = encoders.hw_filter(codec)
+    graph += f"[cat][a];[cat]{vf}[v]" if vf else "[v][a]"
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        *inputs,
+        '-filter_complex', graph,
+        '-map', '[v]',
+        '-map', '[a]',
+        *edit_video1.video_codec_args(codec),
+        '-c:a', 'aac',
+        output_path
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+
+class LiveSession:
+    """
+    用法：
+        session = LiveSession(GrowingFile("录制中.mkv"), "输出.mp4", config={"asr_backend": "fake"})
+        session.run()
+    """
+
+    def __init__(self, source, output_path, config=None, work_dir=None):
+        self.source = source
+        self.output_path = output_path
+        self.config = {"asr_backend": None, "clean_engine": CLEAN_ENGINE, "speed": None, "plan_options": {},
+                       **(config or {})}
+        self.speed = edit_video1.SPEED if self.config["speed"] is None else self.config["speed"]
+        self._own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="live_")
+        self.backend = asr_backends.get_backend(self.config["asr_backend"])
+        # 分段尽量用同一编码器，才能无损合并；渲染中途回退到其他编码器后，之后的分段沿用新编码器
+        self.codec = encoders.ladder()[0]
+        self.profiler = StageProfiler()
+
+        self.words = []
+        self.chars = []
+        self.char_to_word = []
+        self.kept = []  # 每个字符是否保留
+        self.transcribed_until = 0.0  # 已转写到的源时间
+        self.frozen_chars = 0  # 此前的字符已定稿
+        self.rendered_words = 0  # 此前的词已渲染（或确定不输出）
+        self.parts = []
+        self.part_codecs = []
+        self.finished_at = None
+
+    # ---------- 转写 ----------
+    def transcribe_available(self, final):
+        """转写所有已到达的完整块，录制结束时连同不足一块的尾部一起转写；返回是否有新词"""
+        progressed = False
+        while True:
+            start = self.transcribed_until
+            audio = extract_window(self.source.input(), start, CHUNK_SECONDS)
+            duration = extract_audio_timestamps.probe_duration(audio)
+            last = duration < CHUNK_SECONDS - CHUNK_GUARD
+            if last and not final:
+                return progressed  # 不足一块，等录制继续
+            if duration < MIN_CHUNK_SECONDS:
+                return progressed
+            with self.profiler.stage("transcribe", bytes_in=len(audio)):
+                chunk_words = self.backend.transcribe(audio, duration=duration)
+            limit = start + duration - (0 if last else CHUNK_GUARD)
+            accepted = [SimpleNamespace(start=start + w.start, end=start + w.end, word=w.word)
+                        for w in chunk_words if start + w.end <= limit]
+            for word in accepted:
+                for char in word.word:
+                    if char.strip():
+                        self.chars.append(char)
+                        self.char_to_word.append(len(self.words))
+                        self.kept.append(True)
+                self.words.append(word)
+            # 下一块从最后一个被接收的词之后开始，块尾被切断的词重新识别
+            self.transcribed_until = accepted[-1].end if accepted else limit
+            progressed = progressed or bool(accepted)
+            print(f"已转写到 {self.transcribed_until:.1f}s，共 {len(self.words)} 个词")
+            if last:
+                return progressed
+
+    # ---------- 清理 ----------
+    def update_retakes(self, final):
+        """在 lookback 窗口内重新检测重讲，更新未定稿字符的保留标记，并推进定稿位置"""
+        base = max(0, self.frozen_chars - LOOKBACK_CHARS)
+        window = self.chars[base:]
+        with self.profiler.stage("clean", bytes_in=len("".join(window).encode("utf-8"))):
+            _, kept_indices = phase1_cut.clean_chars(window, self.config["clean_engine"])
+        kept = {base + i for i in kept_indices}
+        for i in range(self.frozen_chars, len(self.chars)):
+            self.kept[i] = i in kept
+        if final:
+            self.frozen_chars = len(self.chars)
+        else:
+            self.frozen_chars = max(self.frozen_chars, len(self.chars) - LOOKBACK_CHARS - SIGNAL_MARGIN)
+
+    # ---------- 渲染 ----------
+    def render_ready(self, final):
+        """渲染已定稿的保留片段；未结束时留下最后一个片段，它可能与后续内容合并"""
+        frozen_words = len(self.words) if self.frozen_chars >= len(self.chars) \
+            else self.char_to_word[self.frozen_chars]
+        kept_words = {self.char_to_word[i] for i in range(len(self.chars)) if self.kept[i]}
+        spoken = set(self.char_to_word)
+        kept, removed = [], []
+        for w in range(self.rendered_words, frozen_words):
+            if w not in spoken:
+                continue
+            span = {'start': self.words[w].start, 'end': self.words[w].end}
+            (kept if w in kept_words else removed).append(span)
+        planned, _ = segment_planner.plan_segments(kept, removed, **self.config["plan_options"])
+        if not final and planned:
+            held = planned.pop()
+            next_word = next(w for w in range(self.rendered_words, frozen_words)
+                             if self.words[w].end > held['start'])
+        else:
+            next_word = frozen_words
+        ready_seconds = sum(s['end'] - s['start'] for s in planned)
+        if not planned or (not final and ready_seconds < RENDER_BATCH_SECONDS):
+            if final:
+                self.rendered_words = next_word
+            return
+
+        part_path = os.path.join(self.work_dir, f"part_{len(self.parts):04d}.mp4")
+        temp_dir = os.path.join(self.work_dir, f"render_{len(self.parts):04d}")
+        os.makedirs(temp_dir, exist_ok=True)
+        print(f"\n渲染分段 {len(self.parts) + 1}: {len(planned)} 个片段，{ready_seconds:.1f}s "
+              f"({planned[0]['start']:.1f}s - {planned[-1]['end']:.1f}s)")
+        stats = {}
+        edit_video1.render_video(self.source.input(), planned, part_path, temp_dir, render_mode='single_pass',
+                                 speed=self.speed, profiler=self.profiler, codec=self.codec, stats=stats)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if stats["codec"] != self.codec:
+            print(f"编码器 {self.codec} 渲染失败，之后的分段改用 {stats['codec']}")
+            self.codec = stats["codec"]
+        self.parts.append(part_path)
+        self.part_codecs.append(self.codec)
+        self.rendered_words = next_word
+
+    def finish(self):
+        """合并所有分段"""
+        if not self.parts:
+            print("没有需要输出的内容")
+            return None
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        with self.profiler.stage("concat"):
+            if len(self.parts) == 1:
+                shutil.copyfile(self.parts[0], self.output_path)
+            elif len(set(self.part_codecs)) > 1:
+                print(f"分段使用了不同的编码器（{', '.join(sorted(set(self.part_codecs)))}），重新编码合并")
+                concat_reencode(self.parts, self.output_path, self.codec)
+            else:
+                edit_video1.concat_files(self.parts, self.output_path, os.path.join(self.work_dir, "filelist.txt"))
+        return self.output_path
+
+    def run(self):
+        """轮询输入直到录制结束，返回结果摘要"""
+        try:
+            print(f"开始监视输入，编码器 {self.codec}，每块 {CHUNK_SECONDS}s")
+            while True:
+                changed = self.source.poll()
+                final = self.source.finished()
+                if final and self.finished_at is None:
+                    self.finished_at = time.monotonic()
+                    print("\n录制已结束，处理剩余内容...")
+                if changed or final:
+                    if self.transcribe_available(final) or final:
+                        self.update_retakes(final)
+                        self.render_ready(final)
+                if final:
+                    break
+                time.sleep(POLL_INTERVAL)
+            self.finish()
+            return self.summary()
+        finally:
+            self.cleanup()
+
+    # ---------- 工具 ----------
+    def summary(self):
+        kept_words = {self.char_to_word[i] for i in range(len(self.chars)) if self.kept[i]}
+        return {
+            "input": self.source.input(),
+            "output": self.output_path if self.parts else None,
+            "source_seconds": round(self.transcribed_until, 3),
+            "words": len(self.words),
+            "kept_words": len(kept_words),
+            "parts": len(self.parts),
+            "finish_latency": round(time.monotonic() - self.finished_at, 3) if self.finished_at else None,
+            "asr": self.backend.stats(),
+            "profile": self.profiler.to_dict(),
+        }
+
+    def cleanup(self):
+        if self._own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="录制中视频的增量剪辑")
+    parser.add_argument("input", help="正在写入的录制文件，或分段输出目录")
+    parser.add_argument("-o", "--output", required=True, help="输出视频路径")
+    parser.add_argument("--pattern", default="*.ts", help="分段目录中的分段文件名模式")
+    parser.add_argument("--asr", choices=sorted(asr_backends.BACKENDS), default=None, help="语音识别后端")
+    parser.add_argument("--engine", choices=["rules", "hybrid", "llm"], default=CLEAN_ENGINE,
+                        help="重讲清理引擎（llm 每次轮询都会重新请求窗口内容）")
+    parser.add_argument("--chunk", type=float, default=None, help="每次转写的音频秒数")
+    parser.add_argument("--idle", type=float, default=None, help="输入不再增长多少秒后视为录制结束")
+    return parser.parse_args()
+
+
+def main():
+    global CHUNK_SECONDS, IDLE_SECONDS
+    args = parse_args()
+    CHUNK_SECONDS = args.chunk or CHUNK_SECONDS
+    IDLE_SECONDS = args.idle or IDLE_SECONDS
+    if os.path.isdir(args.input):
+        source = SegmentDirectory(args.input, args.pattern)
+    else:
+        source = GrowingFile(args.input)
+    session = LiveSession(source, args.output, config={"asr_backend": args.asr, "clean_engine": args.engine})
+    result = session.run()
+    session.profiler.print_report()
+    print(f"\n完成！输出视频: {result['output']}，录制结束后 {result['finish_latency']}s 完成，"
+          f"共 {result['parts']} 个分段，保留 {result['kept_words']}/{result['words']} 个词")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,149 @@
 """
 主程序：整合视频剪辑流程
-执行顺序：
+执行顺序（均在同一进程内完成，阶段之间在内存中传递数据）：
 1. extract_audio_timestamps.py - 提取音频并获取时间戳
 2. phase1_cut.py - 第一阶段裁剪时间戳文本
 3. edit_video1.py - 根据时间戳剪辑视频
+--plan-only 只执行前两步并导出剪辑决策表（EDL / FCPXML / JSON，见 edl_export.py）；
+--from-plan 读取（可能在剪辑软件中修改过的）决策表，跳过转写和清理直接渲染。
 """
+import argparse
 import os
 import sys
 
 # 添加当前目录到路径，确保能导入模块
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# 导入各个阶段的模块
-import extract_audio_timestamps
-import phase1_cut
+import asr_backends
 import edit_video1
+import edl_export
+from checkpoint import Checkpoint
+from pipeline import Pipeline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="视频剪辑主程序")
+    parser.add_argument("video", nargs="?", default=None, help="输入视频路径")
+    parser.add_argument("-o", "--output", default=None, help="输出视频路径")
+    parser.add_argument("--artifacts-dir", default=os.getcwd(), help="中间文件输出目录（默认当前目录）")
+    parser.add_argument("--no-artifacts", action="store_true", help="不写出时间戳 / 演讲稿等中间文件")
+    parser.add_argument("--asr", choices=sorted(asr_backends.BACKENDS), default=None,
+                        help="语音识别后端（默认 openai，可用环境变量 ASR_BACKEND 修改）")
+    parser.add_argument("--vad", action="store_true", help="用语音活动检测去掉保留片段首尾的静音（需要 numpy）")
+    parser.add_argument("--split-pause", type=float, default=None, metavar="SECONDS",
+                        help="配合 --vad：片段内部停顿超过该秒数时拆分")
+    parser.add_argument("--no-plan", action="store_true", help="不做片段规划，按原始片段渲染")
+    parser.add_argument("--max-segments", type=int, default=None, help="片段规划时的片段数上限")
+    parser.add_argument("--resume", action="store_true",
+                        help="保存检查点，中断后重跑同一视频时跳过已完成的阶段和片段")
+    parser.add_argument("--plan-only", action="store_true",
+                        help="只转写和清理，导出剪辑决策表（plan.json / plan.edl / plan.fcpxml），不渲染")
+    parser.add_argument("--from-plan", metavar="PLAN", default=None,
+                        help="按决策表（.json / .edl / .fcpxml）直接渲染，跳过转写和清理")
+    parser.add_argument("--plan-fps", type=float, default=None,
+                        help="配合 --from-plan 读取 EDL：时间码的帧率（默认取源视频帧率）")
+    parser.add_argument("--profile", metavar="OUT_JSON", default=None,
+                        help="把各阶段耗时 / CPU / 字节数写入 JSON 文件")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+    plan_source, plan_segments = None, None
+    if args.from_plan:
+        plan_source, plan_segments = edl_export.load_plan(args.from_plan)
     # 支持命令行参数接收视频路径
-    if len(sys.argv) > 1:
-        video_path = sys.argv[1]
+    if args.video:
+        video_path = args.video
         print(f"使用命令行视频路径: {video_path}")
+    elif plan_source and os.path.exists(plan_source):
+        video_path = plan_source
+        print(f"使用决策表中的视频路径: {video_path}")
     else:
-        video_path = None
-        print("未提供视频路径，各模块将使用默认路径")
+        video_path = edit_video1.VIDEO_PATH
+        print(f"未提供视频路径，使用默认路径: {video_path}")
+    if args.from_plan and args.from_plan.lower().endswith(".edl"):
+        # EDL 不记录帧率，按源视频帧率重新换算时间码
+        plan_segments = edl_export.load_plan(args.from_plan,
+                                             fps=args.plan_fps or edl_export.probe_source(video_path)[0])[1]
+    output_path = args.output or edit_video1.OUTPUT_VIDEO.replace(".mp4", "_加速.mp4")
+
+    # 检查点按输入视频内容区分，同一视频重跑时自动续跑；转写 / 清理结果带配置签名，换了 --asr 等参数会重新计算
+    checkpoint = Checkpoint.for_file("cli", video_path) if args.resume else None
+    pipeline = Pipeline(video_path, output_path,
+                        write_artifacts=not args.no_artifacts,
+                        artifacts_dir=args.artifacts_dir,
+                        checkpoint=checkpoint,
+                        config={"asr_backend": args.asr,
+                                "vad": args.vad, "vad_split_pause": args.split_pause,
+                                "plan": not args.no_plan,
+                                "plan_options": {"max_segments": args.max_segments} if args.max_segments else {}})
 
     print("=" * 60)
     print("视频剪辑主程序")
     print("=" * 60)
 
-    # --- 阶段1: 提取音频时间戳 ---
-    print("\n" + "=" * 50)
-    print("阶段 1: 提取音频并获取时间戳")
-    print("=" * 50)
-    try:
-        # 如果有命令行参数，修改 extract_audio_timestamps 的 VIDEO_PATH
-        if video_path:
-            extract_audio_timestamps.VIDEO_PATH = video_path
-        extract_audio_timestamps.main()
-        print("阶段 1 完成!")
-    except Exception as e:
-        print(f"阶段 1 出错: {e}")
-        sys.exit(1)
+    def clean_stage():
+        pipeline.clean()
+        if args.vad:
+            pipeline.tighten()
+        if not args.no_plan:
+            pipeline.plan()
 
-    # --- 阶段2: 裁剪时间戳文本 ---
-    print("\n" + "=" * 50)
-    print("阶段 2: 裁剪时间戳文本（识别'重来'指令）")
-    print("=" * 50)
-    try:
-        phase1_cut.main()
-        print("阶段 2 完成!")
-    except Exception as e:
-        print(f"阶段 2 出错: {e}")
-        sys.exit(1)
+    def plan_stage():
+        clean_stage()
+        pipeline.export_plan()
 
-    # --- 阶段3: 剪辑视频 ---
-    print("\n" + "=" * 50)
-    print("阶段 3: 根据时间戳剪辑视频")
-    print("=" * 50)
+    if args.from_plan:
+        pipeline.segments = plan_segments
+        print(f"从决策表读取 {len(plan_segments)} 个片段: {args.from_plan}")
+        stages = [("阶段 1: 根据决策表剪辑视频", pipeline.render)]
+    elif args.plan_only:
+        stages = [
+            ("阶段 1: 提取音频并获取时间戳", pipeline.transcribe),
+            ("阶段 2: 裁剪时间戳文本并导出剪辑决策表", plan_stage),
+        ]
+    else:
+        stages = [
+            ("阶段 1: 提取音频并获取时间戳", pipeline.transcribe),
+            ("阶段 2: 裁剪时间戳文本（识别'重来'指令）", plan_stage if not args.no_artifacts else clean_stage),
+            ("阶段 3: 根据时间戳剪辑视频", pipeline.render),
+        ]
     try:
-        # 如果有命令行参数，修改 edit_video1 的 VIDEO_PATH
-        if video_path:
-            edit_video1.VIDEO_PATH = video_path
-        edit_video1.main()
-        print("阶段 3 完成!")
-    except Exception as e:
-        print(f"阶段 3 出错: {e}")
-        sys.exit(1)
+        for i, (title, stage) in enumerate(stages, 1):
+            print("\n" + "=" * 50)
+            print(title)
+            print("=" * 50)
+            try:
+                stage()
+                print(f"阶段 {i} 完成!")
+            except Exception as e:
+                print(f"阶段 {i} 出错: {e}")
+                sys.exit(1)
+        # 与 Pipeline.run 一致：渲染成功后删除检查点，之后用 --resume 重跑同一视频会从头开始
+        if checkpoint and stages[-1][1] == pipeline.render:
+            checkpoint.clear()
+    finally:
+        pipeline.cleanup()
+        pipeline.profiler.print_report()
+        if args.profile:
+            pipeline.profiler.dump(args.profile)
+            print(f"性能数据已写入: {args.profile}")
 
     # --- 完成 ---
     print("\n" + "=" * 60)
     print("所有阶段完成！")
     print("=" * 60)
-    print("\n生成的文件:")
-    print("  - timestamps.txt (原始时间戳)")
-    print("  - timestamps_1.txt (裁剪后时间戳)")
-    print("  - 演讲稿文本.txt (演讲稿)")
-    print("  - 演讲稿文本1.txt (裁剪后演讲稿)")
-    print("  - cut_segments.txt (被剪去的时间段)")
-    print("  - 输出视频: 输出.mp4")
+    if not args.no_artifacts and not args.from_plan:
+        print(f"\n生成的文件 ({args.artifacts_dir}):")
+        print("  - timestamps.bin / timestamps.txt (原始时间戳)")
+        print("  - timestamps_1.bin / timestamps_1.txt (裁剪后时间戳)")
+        print("  - 演讲稿文本.txt (演讲稿)")
+        print("  - 演讲稿文本1.txt (裁剪后演讲稿)")
+        print("  - cut_segments.txt (被剪去的时间段)")
+        print("  - plan.json / plan.edl / plan.fcpxml (剪辑决策表，可用 --from-plan 渲染)")
+    if not args.plan_only:
+        print(f"  - 输出视频: {output_path}")
 
 
 if __name__ == "__main__":
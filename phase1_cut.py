@@ -1,10 +1,24 @@
 import os
-from openai import OpenAI
-
-os.environ["OPENAI_API_KEY"] = "sk-*************************************"
-client = OpenAI(
-    base_url="https://*****************/v1"
-)
+from concurrent.futures import ThreadPoolExecutor
+
+import api_client
+import retake_rules
+from alignment import align_chars
+from transcript_store import TranscriptStore
+
+# --- 分窗清理配置 ---
+CLEAN_MODEL = "gpt-4o"
+WINDOW_CHARS = 3000  # 每个窗口的最大字符数（含重叠部分）
+WINDOW_OVERLAP_CHARS = 600  # 窗口开头与上一窗口重叠的字符数，用于识别跨窗口的重讲
+CLEAN_CONCURRENCY = 4  # 同时进行的清理请求数
+SENTENCE_ENDS = set("。！？!?；;\n")
+
+# --- 清理引擎 ---
+# 'llm': 全文交给 GPT 分窗清理
+# 'rules': 只用本地规则引擎（retake_rules.py），不联网
+# 'hybrid': 规则引擎先处理确定的重讲，只把规则无法判断的否定信号附近交给 GPT
+CLEAN_ENGINE = 'llm'
+AMBIGUOUS_CONTEXT_CHARS = 300  # 歧义区域向前带上的上下文字符数
 
 # 你的剪辑规则提示词
 system_prompt = """
@@ -36,39 +50,20 @@ system_prompt = """
 
 # 文件路径配置
 txt_file_path = "演讲稿文本.txt"
-timestamps_file_path = "timestamps.txt"
+timestamps_store_path = "timestamps.bin"
+timestamps_file_path = "timestamps.txt"  # 没有 timestamps.bin 时回退读取
 output_txt_path = "演讲稿文本1.txt"
-output_timestamps_path = "timestamps_1.txt"
-
-
-def parse_timestamps(filepath):
-    """
-    解析时间戳文件，返回：
-    - chars: 按顺序排列的所有字符列表
-    - char_to_line: 每个字符索引对应的行索引
-    - lines: 原始时间戳行列表
-    """
-    with open(filepath, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    all_lines = []
-    chars = []
-    char_to_line = []  # 字符索引 -> 行索引
+output_store_path = "timestamps_1.bin"
+output_timestamps_path = "timestamps_1.txt"  # 人工查看用的文本导出
 
-    for line_idx, line in enumerate(lines):
-        line = line.strip()
-        if not line or line.startswith("="):
-            continue
 
-        if line.startswith("[") and "] " in line:
-            all_lines.append(line)
-            content = line.split("] ", 1)[1]
-            for char in content:
-                if char.strip():
-                    chars.append(char)
-                    char_to_line.append(len(all_lines) - 1)  # 记录这行是第几行
-
-    return chars, char_to_line, all_lines
+def load_timestamp_store(store_path=None, txt_path=None):
+    """优先内存映射读取 timestamps.bin，不存在时回退解析 timestamps.txt"""
+    store_path = store_path or timestamps_store_path
+    txt_path = txt_path or timestamps_file_path
+    if os.path.exists(store_path):
+        return TranscriptStore.load(store_path)
+    return TranscriptStore.from_txt(txt_path)
 
 
 def sliding_window_match(cleaned_chars, timestamps_chars):
@@ -127,43 +122,174 @@ def sliding_window_match(cleaned_chars, timestamps_chars):
     return result
 
 
-def build_cleaned_timestamp_lines(kept_indices, char_to_line, original_lines):
+def build_cleaned_store(kept_indices, char_to_word, store):
     """
-    根据保留的字符索引，构建清理后的时间戳行
+    根据保留的字符索引，构建清理后的时间戳
     - kept_indices: 保留的字符在 timestamps 中的索引
-    - char_to_line: 每个字符索引对应的行索引
-    - original_lines: 原始时间戳行列表
+    - char_to_word: 每个字符索引对应的词下标
+    - store: 原始时间戳
+    """
+    # 找出需要保留的词下标（去重，保持顺序）
+    kept_words = sorted({char_to_word[i] for i in kept_indices if i < len(char_to_word)})
+    return store.subset(kept_words)
+
+
+def _sentence_start(chars, pos, lo):
+    """pos 及之前最近的句首位置（不早于 lo），找不到时返回 pos"""
+    for i in range(pos, lo, -1):
+        if chars[i - 1] in SENTENCE_ENDS:
+            return i
+    return pos
+
+
+def split_windows(chars, window_chars=None, overlap_chars=None):
     """
-    # 找出需要保留的行索引（去重，保持顺序）
-    kept_lines_set = set()
-    for char_idx in kept_indices:
-        if char_idx < len(char_to_line):
-            kept_lines_set.add(char_to_line[char_idx])
+    按句子边界把文本切成有重叠的窗口
+    返回 [(上下文起点, 归属起点, 归属终点), ...]：
+    窗口送给 GPT 的文本是 chars[上下文起点:归属终点]，
+    [归属起点, 归属终点) 是本窗口负责裁决的区间，前面的重叠部分只作上下文
+    """
+    window_chars = window_chars or WINDOW_CHARS
+    overlap_chars = overlap_chars or WINDOW_OVERLAP_CHARS
+    if overlap_chars >= window_chars:
+        # 上下文会占满整个窗口，归属区间无法前进
+        raise ValueError(f"窗口重叠字数 ({overlap_chars}) 必须小于窗口字数 ({window_chars})")
+    n = len(chars)
+    windows = []
+    core_start = 0
+    while core_start < n:
+        context_start = core_start
+        if core_start > 0:
+            lo = max(0, core_start - overlap_chars)
+            # 上下文从重叠范围内最早的句首开始
+            context_start = next((i for i in range(lo, core_start) if i == 0 or chars[i - 1] in SENTENCE_ENDS),
+                                 core_start)
+        limit = min(n, context_start + window_chars)
+        core_end = n if limit == n else _sentence_start(chars, limit, core_start + 1)
+        windows.append((context_start, core_start, core_end))
+        core_start = core_end
+    return windows
+
+
+def clean_text(text):
+    """调用 GPT 按剪辑规则清理一段文本（经 api_client 限速、失败重试）"""
+    return api_client.chat(
+        model=CLEAN_MODEL,
+        temperature=0,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+    )
+
+
+def clean_window(chars, window):
+    """清理单个窗口，返回窗口内被保留的字符下标集合（全文坐标）"""
+    context_start, _, core_end = window
+    cleaned = clean_text("".join(chars[context_start:core_end]))
+    result = align_chars(list(cleaned), chars[context_start:core_end])
+    return {context_start + i for i in result['kept_indices']}
 
-    kept_lines = sorted(kept_lines_set)
-    return [original_lines[line_idx] for line_idx in kept_lines]
+
+def clean_chars_windowed(chars, concurrency=None):
+    """
+    分窗并发清理，返回 (清理后的文本, 保留的字符下标)
+    合并规则：
+    - 归属区间内的字符由本窗口决定去留
+    - 重叠区内的字符若被后一个窗口删除，同样删除：否定信号只会删除它之前的内容，
+      跨窗口的重讲由后一个窗口看到完整上下文后删除，且按下标去重，只会删一次
+    """
+    concurrency = concurrency or CLEAN_CONCURRENCY
+    windows = split_windows(chars)
+    print(f"共 {len(chars)} 字，切分为 {len(windows)} 个窗口，并发数 {concurrency}")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda w: clean_window(chars, w), windows))
+
+    kept = [False] * len(chars)
+    for (_, core_start, core_end), window_kept in zip(windows, results):
+        for i in range(core_start, core_end):
+            kept[i] = i in window_kept
+    for (context_start, core_start, _), window_kept in zip(windows, results):
+        for i in range(context_start, core_start):
+            if i not in window_kept:
+                kept[i] = False
+
+    kept_indices = [i for i, flag in enumerate(kept) if flag]
+    return "".join(chars[i] for i in kept_indices), kept_indices
+
+
+def ambiguous_regions(chars, ambiguous, context_chars=None):
+    """把歧义否定信号扩展为送给 GPT 的区域：向前带上下文、向后到句末，重叠的区域合并"""
+    context_chars = context_chars or AMBIGUOUS_CONTEXT_CHARS
+    regions = []
+    for start, end in ambiguous:
+        lo = _sentence_start(chars, max(0, start - context_chars), 0)
+        hi = end
+        while hi < len(chars) and chars[hi - 1] not in SENTENCE_ENDS:
+            hi += 1
+        # 再带上否定之后的一句，便于判断是否重讲
+        hi = min(len(chars), hi + 1)
+        while hi < len(chars) and chars[hi - 1] not in SENTENCE_ENDS:
+            hi += 1
+        regions.append((lo, hi))
+    return retake_rules.merge_spans(regions)
+
+
+def clean_chars(chars, engine=None, concurrency=None):
+    """按清理引擎处理字符序列，返回 (清理后的文本, 保留的字符下标)"""
+    engine = engine or CLEAN_ENGINE
+    if engine == 'llm':
+        return clean_chars_windowed(chars, concurrency)
+
+    result = retake_rules.detect_retakes(chars)
+    kept = set(retake_rules.kept_after_cuts(len(chars), result['cuts']))
+    print(f"规则引擎: 否定信号 {result['signals']} 处，确定删除 {len(result['cuts'])} 段，"
+          f"歧义 {len(result['ambiguous'])} 处")
+
+    if engine == 'hybrid' and result['ambiguous']:
+        regions = ambiguous_regions(chars, result['ambiguous'])
+        print(f"歧义区域 {len(regions)} 个交给 GPT 判断")
+        # 只把规则引擎处理后仍保留的字符送给 GPT，避免已删除的重讲干扰判断
+        region_indices = [[i for i in range(lo, hi) if i in kept] for lo, hi in regions]
+        with ThreadPoolExecutor(max_workers=concurrency or CLEAN_CONCURRENCY) as executor:
+            decisions = list(executor.map(
+                lambda idx: clean_window([chars[i] for i in idx], (0, 0, len(idx))), region_indices))
+        for idx, region_kept in zip(region_indices, decisions):
+            kept -= {i for pos, i in enumerate(idx) if pos not in region_kept}
+
+    kept_indices = sorted(kept)
+    return "".join(chars[i] for i in kept_indices), kept_indices
+
+
+def clean_store(store, engine=None):
+    """
+    直接基于时间戳字符清理（不经过演讲稿文本文件，也不需要再对齐）
+    返回 (清理后的文本, 清理后的时间戳)
+    """
+    chars, char_to_word = store.chars()
+    cleaned_text, kept_indices = clean_chars(chars, engine)
+    return cleaned_text, build_cleaned_store(kept_indices, char_to_word, store)
 
 
-def save_output_files(cleaned_text, cleaned_timestamps):
+def save_output_files(cleaned_text, cleaned_store):
     # 保存演讲稿文本1.txt
     with open(output_txt_path, "w", encoding="utf-8") as f:
         f.write(cleaned_text)
     print(f"已保存: {output_txt_path}")
 
-    # 保存时间戳1.txt
-    header = "==================================================\n说话内容时间戳\n==================================================\n"
-    content = header + "\n".join(cleaned_timestamps) + "\n"
-
-    with open(output_timestamps_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    # 保存时间戳（结构化 + 文本导出）
+    cleaned_store.save(output_store_path)
+    print(f"已保存: {output_store_path}")
+    cleaned_store.export_txt(output_timestamps_path)
     print(f"已保存: {output_timestamps_path}")
 
 
 def main():
-    # 1. 解析时间戳文件
-    timestamps_chars, char_to_line, timestamp_lines = parse_timestamps(timestamps_file_path)
+    # 1. 读取时间戳
+    store = load_timestamp_store()
+    timestamps_chars, char_to_word = store.chars()
     print(f"时间戳字符数: {len(timestamps_chars)}")
-    print(f"时间戳行数: {len(timestamp_lines)}")
+    print(f"时间戳词数: {len(store)}")
 
     # 0. 如果演讲稿文本.txt不存在，从timestamps.txt生成
     if not os.path.exists(txt_file_path):
@@ -186,40 +312,33 @@ def main():
     print(f"\n演讲稿文本长度: {len(raw_text_clean)}")
     print(f"时间戳字符数: {len(timestamps_chars)}")
 
-    # 3. 调用 GPT 处理
-    print("\n正在调用 GPT 处理...")
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": raw_text_clean}
-        ],
-    )
-
-    cleaned_text = response.choices[0].message.content.strip()
+    # 3. 清理重讲内容（规则引擎 / GPT 分窗并发）
+    print(f"\n正在清理文本 (引擎: {CLEAN_ENGINE})...")
+    cleaned_text, _ = clean_chars(list(raw_text_clean))
     cleaned_chars = list(cleaned_text)
     print(f"\nGPT清理后字符数: {len(cleaned_chars)}")
 
     if cleaned_text == raw_text_clean:
         print("无需删减，文本相同")
-        save_output_files(cleaned_text, timestamp_lines)
+        save_output_files(cleaned_text, store)
         return
 
-    # 4. 滑动窗口匹配
-    print("\n正在进行滑动窗口匹配...")
-    kept_indices = sliding_window_match(cleaned_chars, timestamps_chars)
+    # 4. 对齐清理文本与时间戳字符
+    print("\n正在对齐清理文本与时间戳...")
+    alignment = align_chars(cleaned_chars, timestamps_chars)
+    kept_indices = alignment['kept_indices']
     print(f"保留的字符数: {len(kept_indices)}")
+    print(f"删除区间数: {len(alignment['deleted_spans'])}")
+    print(f"对齐置信度: {alignment['confidence']:.2%}")
+    if alignment['unmatched']:
+        print(f"警告: 清理文本中有 {alignment['unmatched']} 个字符在时间戳中找不到匹配")
 
-    # 5. 重新构建时间戳行
-    cleaned_timestamps = build_cleaned_timestamp_lines(kept_indices, char_to_line, timestamp_lines)
-    print(f"保留的时间戳行数: {len(cleaned_timestamps)}")
+    # 5. 重新构建时间戳
+    cleaned_store = build_cleaned_store(kept_indices, char_to_word, store)
+    print(f"保留的时间戳词数: {len(cleaned_store)}")
 
     # 6. 验证
-    reconstructed = ""
-    for line in cleaned_timestamps:
-        content = line.split("] ", 1)[1]
-        reconstructed += content
+    reconstructed = "".join(cleaned_store.word(i) for i in range(len(cleaned_store)))
 
     print(f"\n重建文本长度: {len(reconstructed)}")
     print(f"GPT清理文本长度: {len(cleaned_text)}")
@@ -235,7 +354,7 @@ def main():
                 break
 
     # 7. 保存输出
-    save_output_files(cleaned_text, cleaned_timestamps)
+    save_output_files(cleaned_text, cleaned_store)
 
     print("\n处理完成！")
 
@@ -0,0 +1,242 @@
+"""
+进程内流水线：提取音频 → 转写 → 清理 → 渲染
+各阶段之间直接在内存中传递词列表 / 时间戳 / 片段列表，
+只有 write_artifacts=True 时才把中间结果写成文件。
+每个任务使用独立的工作目录，多个任务并发运行时互不覆盖。
+模块只导入一次，接口客户端（api_client）等资源在进程内复用。
+每个阶段的耗时 / CPU / 字节数由 StageProfiler 记录，进度通过 on_progress 回调上报。
+传入 checkpoint 时各阶段产物和已渲染片段会保存下来，重跑时跳过已完成的部分。
+export_plan 写出剪辑决策表（EDL / FCPXML / JSON）；直接给 segments 赋值后调用 render 即可按外部修改过的决策表渲染。
+"""
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+import api_client
+import asr_backends
+import edit_video1
+import edl_export
+import extract_audio_timestamps
+import phase1_cut
+import segment_planner
+from checkpoint import params_signature
+from profiling import StageProfiler, file_size
+from transcript_store import TranscriptStore
+from transcription_cache import TranscriptionCache
+
+# 默认配置，值为 None 时使用各模块自身的配置
+DEFAULT_CONFIG = {
+    "use_cache": True,  # 是否使用转写缓存
+    "asr_backend": None,  # 'openai' / 'local' / 'fake'，见 asr_backends.py
+    "clean_engine": None,  # 'llm' / 'rules' / 'hybrid'
+    "render_mode": None,  # 'single_pass' / 'clips' / 'smart'
+    "speed": None,  # 输出播放速度
+    "keep_work_dir": False,  # 任务结束后是否保留工作目录
+    "keep_checkpoint": False,  # 任务成功后是否保留检查点
+    "vad": False,  # 是否用 VAD 把保留片段收紧到实际语音（需要 numpy）
+    "vad_split_pause": None,  # VAD 在片段内部超过该秒数的停顿处拆分
+    "plan": True,  # 渲染前合并近邻片段、处理碎片、限制片段数（segment_planner.py）
+    "plan_options": {},  # 传给 segment_planner.plan_segments 的参数，如 {"max_segments": 300}
+}
+
+
+class Pipeline:
+    """
+    用法：
+        pipeline = Pipeline("输入.mp4", "输出.mp4", config={"speed": 1.5})
+        result = pipeline.run()
+    """
+
+    def __init__(self, input_path, output_path, config=None, work_dir=None,
+                 write_artifacts=False, artifacts_dir=None, on_progress=None, checkpoint=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self._own_work_dir = work_dir is None
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="pipeline_")
+        self.write_artifacts = write_artifacts
+        self.artifacts_dir = artifacts_dir or os.path.dirname(os.path.abspath(output_path))
+        # on_progress(百分比, 步骤名)，已按时间节流
+        self.profiler = StageProfiler(on_progress)
+        self.checkpoint = checkpoint
+
+        # 阶段产物
+        self.audio = None
+        self.store = None
+        self.cleaned_text = None
+        self.cleaned_store = None
+        self.segments = None
+        self.removed = None
+        self.vad_report = None
+        self.plan_report = None
+        self.edit_plan = None
+        self.asr_stats = None
+
+    # ---------- 各阶段 ----------
+    def extract(self):
+        """阶段 1a：提取音频到内存"""
+        with self.profiler.stage("extract", bytes_in=file_size(self.input_path)) as record:
+            self.audio = extract_audio_timestamps.extract_audio_from_video(self.input_path, None)
+            record["bytes_out"] = len(self.audio)
+        return self.audio
+
+    def transcribe(self):
+        """阶段 1b：转写为词级时间戳"""
+        saved = self.checkpoint.load("transcript", self._stage_sig("transcript")) if self.checkpoint else None
+        if saved is not None:
+            print("从检查点恢复转写结果")
+            self.store = TranscriptStore.from_words(SimpleNamespace(start=s, end=e, word=w) for s, e, w in saved)
+        else:
+            if self.audio is None:
+                self.extract()
+            cache = TranscriptionCache() if self.config["use_cache"] else None
+            # 后端的统计是进程级累计值（worker 会处理很多任务），只记录本任务期间的增量
+            backend = asr_backends.get_backend(self.config["asr_backend"])
+            before = backend.snapshot()
+            with self.profiler.stage("transcribe", bytes_in=len(self.audio)) as record:
+                words = extract_audio_timestamps.get_audio_timestamps_cached(self.audio, cache,
+                                                                             self.config["asr_backend"])
+                self.store = TranscriptStore.from_words(words)
+                record["bytes_out"] = len(self.store.text)
+            self.asr_stats = backend.stats(since=before)
+            self.audio = None  # 音频只在转写时需要，及时释放内存
+            if self.checkpoint:
+                self.checkpoint.save("transcript", [[w.start, w.end, w.word] for w in words],
+                                     self._stage_sig("transcript"))
+        if self.write_artifacts:
+            self.store.save(self._artifact("timestamps.bin"))
+            self.store.export_txt(self._artifact("timestamps.txt"))
+        return self.store
+
+    def clean(self):
+        """阶段 2：删除重讲内容"""
+        if self.store is None:
+            self.transcribe()
+        chars, char_to_word = self.store.chars()
+        saved = self.checkpoint.load("cleaned", self._stage_sig("cleaned")) if self.checkpoint else None
+        if saved is not None:
+            print("从检查点恢复清理结果")
+            self.cleaned_text = saved["text"]
+            self.cleaned_store = phase1_cut.build_cleaned_store(saved["kept_indices"], char_to_word, self.store)
+            self.segments = saved["segments"]
+            kept_indices = saved["kept_indices"]
+        else:
+            with self.profiler.stage("clean", bytes_in=len(self.store.text)) as record:
+                self.cleaned_text, kept_indices = phase1_cut.clean_chars(chars, self.config["clean_engine"])
+                record["bytes_out"] = len(self.cleaned_text.encode("utf-8"))
+            with self.profiler.stage("align", bytes_in=record["bytes_out"]) as record:
+                self.cleaned_store = phase1_cut.build_cleaned_store(kept_indices, char_to_word, self.store)
+                record["bytes_out"] = len(self.cleaned_store.text)
+            self.segments = self.cleaned_store.segments()
+            if self.checkpoint:
+                self.checkpoint.save("cleaned", {"text": self.cleaned_text, "kept_indices": list(kept_indices),
+                                                 "segments": self.segments}, self._stage_sig("cleaned"))
+        # 被删除的词的时间区间，片段规划时不能把它们并回输出
+        kept_words = {char_to_word[i] for i in kept_indices if i < len(char_to_word)}
+        self.removed = [{'start': self.store.starts[w], 'end': self.store.ends[w]}
+                        for w in sorted(set(char_to_word) - kept_words)]
+        print(f"保留 {len(self.cleaned_store)}/{len(self.store)} 个词，{len(self.segments)} 个片段")
+        if self.write_artifacts:
+            with open(self._artifact("演讲稿文本.txt"), "w", encoding="utf-8") as f:
+                f.write("".join(chars))
+            with open(self._artifact("演讲稿文本1.txt"), "w", encoding="utf-8") as f:
+                f.write(self.cleaned_text)
+            self.cleaned_store.save(self._artifact("timestamps_1.bin"))
+            self.cleaned_store.export_txt(self._artifact("timestamps_1.txt"))
+        return self.segments
+
+    def tighten(self):
+        """阶段 2b（可选）：用 VAD 去掉片段首尾和内部的静音"""
+        if self.segments is None:
+            self.clean()
+        import vad
+        with self.profiler.stage("vad", bytes_in=file_size(self.input_path)):
+            self.segments, self.vad_report = vad.tighten_segments(
+                self.input_path, self.segments, split_pause=self.config["vad_split_pause"])
+        return self.segments
+
+    def plan(self):
+        """阶段 2c：整理片段，减少 ffmpeg 调用次数"""
+        if self.segments is None:
+            self.clean()
+        self.segments, self.plan_report = segment_planner.plan_segments(
+            self.segments, self.removed, render_mode=self.config["render_mode"], **self.config["plan_options"])
+        segment_planner.print_report(self.plan_report)
+        return self.segments
+
+    def export_plan(self, directory=None):
+        """阶段 2d：不渲染，写出剪辑决策表（plan.json / plan.edl / plan.fcpxml / cut_segments.txt）"""
+        if self.segments is None:
+            self.clean()
+        fps, duration = edl_export.probe_source(self.input_path)
+        self.edit_plan = edl_export.build_plan(self.input_path, self.segments, self.store, self.removed,
+                                               duration=duration, fps=fps)
+        paths = edl_export.export_all(self.edit_plan, directory or self.artifacts_dir)
+        print(f"剪辑决策表已写入: {', '.join(os.path.basename(p) for p in paths)}")
+        return paths
+
+    def render(self):
+        """阶段 3：剪辑并加速"""
+        if self.segments is None:
+            self.clean()
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        return edit_video1.render_video(
+            self.input_path, self.segments, self.output_path,
+            os.path.join(self.work_dir, "render"),
+            render_mode=self.config["render_mode"],
+            speed=self.config["speed"],
+            profiler=self.profiler,
+            checkpoint=self.checkpoint,
+        )
+
+    def run(self):
+        """依次执行全部阶段，返回结果摘要"""
+        try:
+            self.transcribe()
+            self.clean()
+            if self.config["vad"]:
+                self.tighten()
+            if self.config["plan"]:
+                self.plan()
+            if self.write_artifacts:
+                self.export_plan()
+            self.render()
+            if self.checkpoint and not self.config["keep_checkpoint"]:
+                self.checkpoint.clear()
+            return self.summary()
+        finally:
+            self.cleanup()
+
+    # ---------- 工具 ----------
+    def _stage_sig(self, stage):
+        """检查点中阶段产物的配置签名：换了识别后端或清理引擎后，旧的转写 / 清理结果失效"""
+        params = {"asr_backend": self.config["asr_backend"] or asr_backends.DEFAULT_BACKEND}
+        if stage == "cleaned":
+            params["clean_engine"] = self.config["clean_engine"] or phase1_cut.CLEAN_ENGINE
+        return params_signature(stage, params)
+
+    def summary(self):
+        return {
+            "input": self.input_path,
+            "output": self.output_path,
+            "words": len(self.store) if self.store is not None else 0,
+            "kept_words": len(self.cleaned_store) if self.cleaned_store is not None else 0,
+            "segments": len(self.segments) if self.segments is not None else 0,
+            "kept_seconds": round(sum(s['end'] - s['start'] for s in self.segments or []), 3),
+            "asr": self.asr_stats,
+            "api": api_client.stats(),
+            "vad": self.vad_report,
+            "plan": self.plan_report,
+            "removed_seconds": self.edit_plan["removed_seconds"] if self.edit_plan else None,
+            "profile": self.profiler.to_dict(),
+        }
+
+    def cleanup(self):
+        """删除本任务自动创建的工作目录"""
+        if self._own_work_dir and not self.config["keep_work_dir"]:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _artifact(self, name):
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        return os.path.join(self.artifacts_dir, name)
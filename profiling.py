@@ -0,0 +1,172 @@
+"""
+阶段性能剖析与进度上报：
+- 记录每个阶段的墙钟时间、CPU 时间（含 ffmpeg 等子进程）、输入 / 输出字节数
+- 解析 ffmpeg -progress 的机器可读输出，得到单个片段和整体的完成百分比
+- 进度回调按时间间隔节流，避免频繁写数据库
+"""
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# 各阶段在整体进度中的权重
+STAGE_WEIGHTS = {
+    "extract": 5,
+    "transcribe": 30,
+    "clean": 15,
+    "align": 5,
+    "vad": 3,
+    "cut": 25,
+    "concat": 5,
+    "speedup": 15,
+}
+
+# 阶段名 → 显示给用户的步骤名（写入 current_step）
+STAGE_TITLES = {
+    "extract": "提取音频",
+    "transcribe": "语音转写",
+    "clean": "清理重讲",
+    "align": "对齐时间戳",
+    "vad": "检测语音",
+    "cut": "剪辑片段",
+    "concat": "合并片段",
+    "speedup": "加速视频",
+}
+
+PROGRESS_INTERVAL = 1.0  # 进度回调的最小间隔（秒）
+
+
+def _cpu_times():
+    """返回 (本进程 CPU 秒, 已结束子进程 CPU 秒)"""
+    t = os.times()
+    return t.user + t.system, t.children_user + t.children_system
+
+
+class StageProfiler:
+    """
+    用法：
+        profiler = StageProfiler(on_progress=lambda percent, step: ...)
+        with profiler.stage("cut", bytes_in=size) as record:
+            ...
+            profiler.progress("cut", 0.5, "片段 3/6")
+            record["bytes_out"] = out_size
+    """
+
+    def __init__(self, on_progress=None, interval=PROGRESS_INTERVAL):
+        self.on_progress = on_progress
+        self.interval = interval
+        self.stages = {}
+        self._done = set()
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+        self._last_percent = -1
+
+    @contextmanager
+    def stage(self, name, bytes_in=0):
+        record = {"wall": 0.0, "cpu": 0.0, "child_cpu": 0.0, "bytes_in": bytes_in, "bytes_out": 0}
+        wall_start = time.perf_counter()
+        cpu_start, child_start = _cpu_times()
+        self.progress(name, 0.0, force=True)
+        try:
+            yield record
+        finally:
+            cpu_end, child_end = _cpu_times()
+            record["wall"] = round(time.perf_counter() - wall_start, 3)
+            record["cpu"] = round(cpu_end - cpu_start, 3)
+            record["child_cpu"] = round(child_end - child_start, 3)
+            with self._lock:
+                # 同名阶段（如多次合并）累加
+                previous = self.stages.get(name)
+                if previous:
+                    for key in record:
+                        record[key] = round(previous[key] + record[key], 3)
+                self.stages[name] = record
+                self._done.add(name)
+            self.progress(name, 1.0, force=True)
+
+    def overall_percent(self, stage, fraction):
+        """已完成阶段的权重 + 当前阶段按比例折算"""
+        total = sum(STAGE_WEIGHTS.values())
+        done = sum(STAGE_WEIGHTS.get(s, 0) for s in self._done if s != stage)
+        current = STAGE_WEIGHTS.get(stage, 0) * max(0.0, min(1.0, fraction))
+        return min(100, int((done + current) * 100 / total))
+
+    def progress(self, stage, fraction, detail=None, force=False):
+        """上报进度，未到间隔时间的调用直接丢弃（force 除外）"""
+        if not self.on_progress:
+            return
+        percent = self.overall_percent(stage, fraction)
+        now = time.monotonic()
+        with self._lock:
+            if not force and (now - self._last_report < self.interval or percent == self._last_percent):
+                return
+            self._last_report = now
+            self._last_percent = percent
+        step = STAGE_TITLES.get(stage, stage)
+        if detail:
+            step = f"{step} {detail}"
+        self.on_progress(percent, step)
+
+    def to_dict(self):
+        total_wall = sum(r["wall"] for r in self.stages.values())
+        return {"stages": self.stages, "total_wall": round(total_wall, 3)}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def print_report(self):
+        print("\n" + "=" * 50)
+        print(f"{'阶段':<12}{'墙钟(s)':>10}{'CPU(s)':>10}{'子进程CPU(s)':>14}{'输入MB':>10}{'输出MB':>10}")
+        for name, r in self.stages.items():
+            print(f"{name:<12}{r['wall']:>10.2f}{r['cpu']:>10.2f}{r['child_cpu']:>14.2f}"
+                  f"{r['bytes_in'] / 1048576:>10.2f}{r['bytes_out'] / 1048576:>10.2f}")
+        print("=" * 50)
+
+
+class NullProfiler(StageProfiler):
+    """不记录、不上报，用作默认值，调用方无需判断 None"""
+
+    @contextmanager
+    def stage(self, name, bytes_in=0):
+        yield {"bytes_in": bytes_in, "bytes_out": 0}
+
+    def progress(self, stage, fraction, detail=None, force=False):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def file_size(path):
+    """文件大小，文件不存在时为 0"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run_ffmpeg_progress(cmd, on_progress):
+    """
+    运行 ffmpeg 并解析 -progress 输出
+    on_progress(已处理的输出时长秒数) 在每个进度块结束时调用
+    返回 (退出码, 错误输出)
+    """
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    # 错误输出写临时文件，避免两个管道互相阻塞
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err,
+                                encoding='utf-8', errors='ignore')
+        for line in proc.stdout:
+            key, _, value = line.strip().partition('=')
+            # out_time_ms 实际单位也是微秒，两者取其一即可
+            if key == 'out_time_us' and value.isdigit():
+                on_progress(int(value) / 1_000_000)
+        proc.wait()
+        err.seek(0)
+        stderr = err.read().decode('utf-8', errors='ignore')
+    return proc.returncode, stderr
@@ -0,0 +1,207 @@
+"""
+离线重讲规则引擎：不调用 GPT，毫秒级找出 "讲一段 → 否定 → 重讲" 的剪辑区间
+1. 用 Aho-Corasick 多模式自动机一次扫描找出所有否定信号
+2. 取否定信号之后的字符，在前文里回查（二元组 / 跳字二元组索引 + 二分）：
+   规则一：关键词之后的两个字符在前文复现
+   规则二：关键词之后的三个字符在前文复现出两个字符位置和内容一致
+3. 命中规则时，删除 "前文复现位置 → 否定信号结束" 之间的内容；
+   两条规则都不命中的否定信号视为有歧义，交给 GPT 判断
+"""
+import bisect
+from collections import deque
+
+# 否定信号词表（与 phase1_cut.system_prompt 保持一致）
+NEGATION_SIGNALS = [
+    "重来", "再重来", "算了重来", "不对", "讲错了", "说错了", "这句没讲好", "卡住了",
+    "我要换个讲法", "太枯燥", "太技术", "听不懂", "没必要讲这个",
+]
+
+# 查找关键词之后的字符时跳过的标点
+PUNCTUATION = set("，。！？、；：,.!?;:…“”\"'‘’（）()《》 \n\t")
+
+# 回查前文的最大距离（字符），避免匹配到很久之前偶然相同的字
+MAX_LOOKBACK = 300
+
+
+class SignalMatcher:
+    """Aho-Corasick 多模式匹配自动机"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state].append(pattern)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and char not in self.goto[f]:
+                    f = self.fail[f]
+                fallback = self.goto[f].get(char, 0)
+                self.fail[nxt] = fallback if fallback != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find_all(self, chars):
+        """返回所有匹配 [(开始, 结束), ...]，结束不含"""
+        matches = []
+        state = 0
+        for pos, char in enumerate(chars):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.output[state]:
+                matches.append((pos + 1 - len(pattern), pos + 1))
+        return matches
+
+    def find_longest(self, chars):
+        """最左最长、互不重叠的匹配，例如 "算了重来" 不再单独报出 "重来" """
+        result = []
+        for start, end in sorted(self.find_all(chars), key=lambda m: (m[0], -m[1])):
+            if result and start < result[-1][1]:
+                if end > result[-1][1] and start == result[-1][0]:
+                    result[-1] = (start, end)
+                continue
+            result.append((start, end))
+        return result
+
+
+_default_matcher = None
+
+
+def default_matcher():
+    """默认词表的自动机只构建一次"""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = SignalMatcher(NEGATION_SIGNALS)
+    return _default_matcher
+
+
+class PositionIndex:
+    """二元组 / 跳字二元组 → 出现位置（升序），用于回查前文"""
+
+    def __init__(self, chars):
+        self.adjacent = {}
+        self.skip = {}
+        for i in range(len(chars) - 1):
+            self.adjacent.setdefault((chars[i], chars[i + 1]), []).append(i)
+            if i + 2 < len(chars):
+                self.skip.setdefault((chars[i], chars[i + 2]), []).append(i)
+
+    @staticmethod
+    def _latest_before(positions, limit, lower):
+        """positions 中小于 limit 且不小于 lower 的最后一个位置"""
+        if not positions:
+            return None
+        idx = bisect.bisect_left(positions, limit) - 1
+        if idx >= 0 and positions[idx] >= lower:
+            return positions[idx]
+        return None
+
+    def latest_adjacent(self, a, b, limit, lower):
+        return self._latest_before(self.adjacent.get((a, b)), limit, lower)
+
+    def latest_skip(self, a, c, limit, lower):
+        return self._latest_before(self.skip.get((a, c)), limit, lower)
+
+
+def _following_content(chars, pos, signals_by_start, count=3):
+    """
+    从 pos 开始取 count 个内容字符的位置，跳过标点以及紧接着的否定信号（连续否定）
+    返回 (位置列表, 最后一个否定信号的结束位置)
+    """
+    positions = []
+    signal_end = pos
+    n = len(chars)
+    while pos < n and len(positions) < count:
+        if not positions and pos in signals_by_start:
+            pos = signal_end = signals_by_start[pos]
+            continue
+        if chars[pos] not in PUNCTUATION:
+            positions.append(pos)
+        pos += 1
+    return positions, signal_end
+
+
+def detect_retakes(chars, matcher=None, max_lookback=None):
+    """
+    检测重讲结构，返回 dict：
+    - cuts: 确定要删除的字符区间 [(开始, 结束), ...]，已合并
+    - ambiguous: 规则无法判断的否定信号区间，需要 GPT 判断
+    - signals: 找到的否定信号总数
+    """
+    matcher = matcher or default_matcher()
+    max_lookback = max_lookback or MAX_LOOKBACK
+    signals = matcher.find_longest(chars)
+    signals_by_start = {start: end for start, end in signals}
+    index = PositionIndex(chars)
+
+    cuts = []
+    ambiguous = []
+    consumed_until = -1
+    for start, end in signals:
+        if start < consumed_until:
+            continue  # 连续否定已在上一个信号中一并处理
+        following, signal_end = _following_content(chars, end, signals_by_start)
+        lower = max(0, start - max_lookback)
+        restart = None
+        if len(following) >= 2:
+            c0, c1 = chars[following[0]], chars[following[1]]
+            # 规则一：后两个字符在前文相邻复现
+            restart = index.latest_adjacent(c0, c1, start - 1, lower)
+            if restart is None and len(following) >= 3:
+                c2 = chars[following[2]]
+                # 规则二：后三个字符中有两个在前文的对应位置复现
+                candidates = [index.latest_skip(c0, c2, start - 2, lower)]
+                q = index.latest_adjacent(c1, c2, start - 1, lower + 1)
+                candidates.append(q - 1 if q is not None else None)
+                candidates = [c for c in candidates if c is not None]
+                restart = max(candidates) if candidates else None
+
+        consumed_until = signal_end
+        if restart is None:
+            ambiguous.append((start, signal_end))
+            continue
+        cut_end = following[0] if following else signal_end
+        cuts.append((restart, cut_end))
+
+    return {
+        'cuts': merge_spans(cuts),
+        'ambiguous': merge_spans(ambiguous),
+        'signals': len(signals),
+    }
+
+
+def merge_spans(spans):
+    """合并重叠或相接的区间"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def kept_after_cuts(n, cuts):
+    """删除 cuts 后保留的字符下标"""
+    kept = [True] * n
+    for start, end in cuts:
+        kept[start:end] = [False] * (end - start)
+    return [i for i, flag in enumerate(kept) if flag]
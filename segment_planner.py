@@ -0,0 +1,173 @@
+"""
+片段规划：在对齐之后、渲染之前整理保留片段，减少 ffmpeg 调用次数
+1. 合并重叠片段，以及间隔不超过 max_gap 的相邻片段
+2. 短于 min_duration 的碎片：离相邻片段不超过 absorb_gap 时并入相邻片段，否则丢弃
+3. 片段数超过 max_segments 时，优先合并间隔最小的相邻片段直到满足上限
+4. 按片段数和总时长估算各渲染模式的耗时
+间隔里含有被删除内容（removed，例如重讲的词）时，该间隔永远不会被合并，避免把剪掉的内容带回来。
+所有时间先取整到毫秒，同样的输入和参数总是得到同样的规划（plan_hash 相同），便于缓存和比较。
+"""
+import bisect
+import hashlib
+import json
+import math
+
+import edit_video1
+
+MAX_GAP = 0.25  # 间隔不超过该秒数的相邻片段直接合并
+MIN_DURATION = 0.2  # 短于该秒数的片段视为碎片
+ABSORB_GAP = 1.0  # 碎片离相邻片段不超过该秒数时并入，否则丢弃
+MAX_SEGMENTS = 1000  # 片段数上限；None 表示不限制
+
+# 渲染耗时估算参数（秒），可按机器实测结果调整
+COST_MODEL = {
+    "process_overhead": 0.4,  # 每次启动 ffmpeg：进程创建 + 定位 + 编码器初始化
+    "graph_segment": 0.01,  # 滤镜图中每个 trim/atrim 分支的额外开销
+    "encode_per_second": 0.15,  # 每秒源视频的解码 + 编码耗时
+}
+
+
+def _round(t):
+    return round(t, 3)
+
+
+class _Protected:
+    """被删除内容的时间区间，判断某个间隔能否合并"""
+
+    def __init__(self, removed):
+        spans = edit_video1.merge_adjacent_segments(removed or [])
+        self.starts = [s['start'] for s in spans]
+        self.ends = [s['end'] for s in spans]
+
+    def blocks(self, gap_start, gap_end):
+        """(gap_start, gap_end) 内是否有被删除的内容"""
+        idx = bisect.bisect_right(self.ends, gap_start)
+        return idx < len(self.starts) and self.starts[idx] < gap_end
+
+
+def _merge_gaps(segments, max_gap, protected):
+    merged = []
+    for seg in segments:
+        if merged and seg['start'] - merged[-1]['end'] <= max_gap \
+                and not protected.blocks(merged[-1]['end'], seg['start']):
+            merged[-1]['end'] = max(merged[-1]['end'], seg['end'])
+        else:
+            merged.append(dict(seg))
+    return merged
+
+
+def _absorb_fragments(segments, min_duration, absorb_gap, protected):
+    """碎片并入最近的相邻片段；两侧都太远时丢弃。返回 (片段, 丢弃的时长)"""
+    result = []
+    dropped = 0.0
+    for i, seg in enumerate(segments):
+        duration = seg['end'] - seg['start']
+        content = duration  # 不含并入的间隔，丢弃时只计实际内容
+        if result and '_absorb_next' in result[-1]:
+            # 前一个碎片选择并入本片段；本片段也是碎片时合并后再按碎片处理
+            fragment = result.pop()
+            content += fragment['_absorb_next']
+            seg = {'start': fragment['start'], 'end': seg['end']}
+            duration = seg['end'] - seg['start']
+        if duration >= min_duration:
+            result.append(dict(seg))
+            continue
+        gap_prev = seg['start'] - result[-1]['end'] if result else math.inf
+        gap_next = segments[i + 1]['start'] - seg['end'] if i + 1 < len(segments) else math.inf
+        if result and protected.blocks(result[-1]['end'], seg['start']):
+            gap_prev = math.inf
+        if i + 1 < len(segments) and protected.blocks(seg['end'], segments[i + 1]['start']):
+            gap_next = math.inf
+        if min(gap_prev, gap_next) > absorb_gap:
+            dropped += content
+            continue
+        if gap_prev <= gap_next:
+            result[-1]['end'] = seg['end']
+        else:
+            result.append({'start': seg['start'], 'end': seg['end'], '_absorb_next': content})
+    for seg in result:
+        seg.pop('_absorb_next', None)
+    return result, dropped
+
+
+def _cap_count(segments, max_segments, protected):
+    """
+    合并间隔最小的 len - max_segments 处（合并一处不影响其他间隔，直接排序选取）
+    受保护的间隔不参与合并，因此片段数可能仍高于上限
+    """
+    if max_segments is None or len(segments) <= max_segments:
+        return segments
+    excess = len(segments) - max(max_segments, 1)
+    gaps = [i for i in range(len(segments) - 1)
+            if not protected.blocks(segments[i]['end'], segments[i + 1]['start'])]
+    gaps.sort(key=lambda i: (segments[i + 1]['start'] - segments[i]['end'], i))
+    join = set(gaps[:excess])
+    result = [dict(segments[0])]
+    for i in range(1, len(segments)):
+        if i - 1 in join:
+            result[-1]['end'] = segments[i]['end']
+        else:
+            result.append(dict(segments[i]))
+    return result
+
+
+def estimate_cost(segments, render_mode=None, max_segments_per_graph=None):
+    """估算渲染耗时（秒）"""
+    render_mode = render_mode or edit_video1.RENDER_MODE
+    per_graph = max_segments_per_graph or edit_video1.MAX_SEGMENTS_PER_GRAPH
+    n = len(segments)
+    seconds = sum(seg['end'] - seg['start'] for seg in segments)
+    model = COST_MODEL
+    if render_mode == 'single_pass':
+        processes = math.ceil(n / per_graph)
+        cost = processes * model["process_overhead"] + n * model["graph_segment"] + seconds * model["encode_per_second"]
+    else:
+        # 逐片段截取 + 合并 + 整体加速，编码两次
+        cost = (n + 2) * model["process_overhead"] + 2 * seconds * model["encode_per_second"]
+    return round(cost, 2)
+
+
+def plan_hash(segments, params):
+    data = json.dumps({"segments": [[s['start'], s['end']] for s in segments], "params": params}, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def plan_segments(segments, removed=None, max_gap=MAX_GAP, min_duration=MIN_DURATION, absorb_gap=ABSORB_GAP,
+                  max_segments=MAX_SEGMENTS, render_mode=None):
+    """
+    segments: 保留片段；removed: 被删除内容的时间区间（不得并回输出）
+    返回 (规划后的片段, 报告)
+    """
+    params = {"max_gap": max_gap, "min_duration": min_duration, "absorb_gap": absorb_gap,
+              "max_segments": max_segments}
+    rounded = [{'start': _round(s['start']), 'end': _round(s['end'])} for s in segments if s['end'] > s['start']]
+    merged = edit_video1.merge_adjacent_segments(rounded)
+    kept_before = sum(s['end'] - s['start'] for s in merged)
+    protected = _Protected([{'start': _round(s['start']), 'end': _round(s['end'])} for s in removed or []])
+
+    planned = _merge_gaps(merged, max_gap, protected)
+    planned, dropped = _absorb_fragments(planned, min_duration, absorb_gap, protected)
+    planned = _cap_count(planned, max_segments, protected)
+    planned = [{'start': _round(s['start']), 'end': _round(s['end'])} for s in planned]
+    kept_after = sum(s['end'] - s['start'] for s in planned)
+
+    report = {
+        "segments_before": len(merged),
+        "segments_after": len(planned),
+        "kept_seconds_before": round(kept_before, 3),
+        "kept_seconds_after": round(kept_after, 3),
+        "added_seconds": round(kept_after - kept_before + dropped, 3),  # 合并间隔带入的时长
+        "dropped_seconds": round(dropped, 3),
+        "cost_before": estimate_cost(merged, render_mode),
+        "cost_after": estimate_cost(planned, render_mode),
+        "params": params,
+        "plan_hash": plan_hash(planned, params),
+    }
+    return planned, report
+
+
+def print_report(report):
+    print(f"片段规划: {report['segments_before']} → {report['segments_after']} 个片段，"
+          f"保留时长 {report['kept_seconds_before']:.1f}s → {report['kept_seconds_after']:.1f}s "
+          f"(并入间隔 {report['added_seconds']:.1f}s，丢弃碎片 {report['dropped_seconds']:.1f}s)，"
+          f"预计渲染 {report['cost_before']:.1f}s → {report['cost_after']:.1f}s")
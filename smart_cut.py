@@ -0,0 +1,280 @@
+"""
+关键帧感知的智能剪辑：
+每个保留片段拆成 "开头不完整 GOP（重编码）+ 中间完整 GOP（直接拷贝）+ 结尾不完整 GOP（重编码）"，
+只有切点附近的少量帧需要重新编码，其余部分逐字节拷贝，速度快且不损失画质。
+源视频的编码参数无法匹配时，自动回退到 edit_video1 的全量重编码流程。
+"""
+import bisect
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import edit_video1
+import ffmpeg_config
+
+# 关键帧索引缓存目录
+KEYFRAME_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp", "keyframes")
+
+# 中间可拷贝部分短于该值（秒）时，整段重编码更划算
+MIN_COPY_SECONDS = 1.0
+
+# 源编码 → 可用于边界重编码、且能与源码流拼接的编码器
+MATCHING_ENCODERS = {
+    'h264': ('h264_nvenc', 'libx264'),
+    'hevc': ('hevc_nvenc', 'libx265'),
+}
+
+# ffprobe 的 profile 名称 → 编码器 -profile:v 参数
+PROFILE_NAMES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+}
+
+
+def _cache_key(video_path):
+    """按路径 + 大小 + 修改时间生成缓存键，源文件变化后自动失效"""
+    stat = os.stat(video_path)
+    raw = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def probe_video_stream(video_path):
+    """读取视频流的编码参数"""
+    cmd = [
+        edit_video1.ffprobe_path(), '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,profile,pix_fmt,width,height,r_frame_rate,time_base',
+        '-of', 'json',
+        video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True, encoding='utf-8', errors='ignore')
+    streams = json.loads(result.stdout).get('streams', [])
+    return streams[0] if streams else None
+
+
+def probe_keyframes(video_path, use_cache=True):
+    """
+    读取视频关键帧时间列表（秒，升序）
+    只读取数据包标记，不解码画面；结果按源文件缓存
+    """
+    cache_path = os.path.join(KEYFRAME_CACHE_DIR, _cache_key(video_path) + ".json")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    print(f"正在分析关键帧: {video_path}")
+    cmd = [
+        edit_video1.ffprobe_path(), '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, check=True, encoding='utf-8', errors='ignore')
+    keyframes = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) >= 2 and 'K' in fields[1] and fields[0] not in ('', 'N/A'):
+            keyframes.append(float(fields[0]))
+    keyframes.sort()
+
+    os.makedirs(KEYFRAME_CACHE_DIR, exist_ok=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(keyframes, f)
+    print(f"共找到 {len(keyframes)} 个关键帧")
+    return keyframes
+
+
+def boundary_encoder_args(stream, codec=None):
+    """
+    生成与源码流参数一致的边界重编码参数
+    无法匹配（编码格式 / profile / 像素格式不支持）时返回 None
+    """
+    if not stream:
+        return None
+    encoders = MATCHING_ENCODERS.get(stream.get('codec_name'))
+    profile = PROFILE_NAMES.get(stream.get('profile'))
+    if not encoders or not profile or stream.get('pix_fmt') != 'yuv420p':
+        return None
+
+    if stream['codec_name'] == 'hevc' and profile != 'main':
+        return None
+    codec = codec or ffmpeg_config.VIDEO_CODEC
+    encoder = codec if codec in encoders else encoders[-1]
+    args = edit_video1.video_codec_args(encoder)
+    args += ['-pix_fmt', stream['pix_fmt'], '-r', stream['r_frame_rate']]
+    if stream['codec_name'] == 'h264':
+        args += ['-profile:v', profile]
+    return args
+
+
+def plan_segment(seg, keyframes, frame_duration):
+    """
+    规划单个片段：返回 [(类型, 开始, 结束), ...]，类型为 'encode' 或 'copy'
+    """
+    start, end = seg['start'], seg['end']
+    inner = _keyframes_between(keyframes, start, end)
+    if len(inner) < 2 or inner[-1] - inner[0] < MIN_COPY_SECONDS:
+        return [('encode', start, end)]
+
+    k_first, k_last = inner[0], inner[-1]
+    pieces = []
+    if k_first - start > frame_duration / 2:
+        pieces.append(('encode', start, k_first))
+    pieces.append(('copy', k_first, k_last))
+    if end - k_last > frame_duration / 2:
+        pieces.append(('encode', k_last, end))
+    return pieces
+
+
+def _keyframes_between(keyframes, start, end):
+    """二分查找 [start, end] 内的关键帧"""
+    lo = bisect.bisect_left(keyframes, start)
+    hi = bisect.bisect_right(keyframes, end)
+    return keyframes[lo:hi]
+
+
+def _frame_duration(stream):
+    """由帧率计算单帧时长（秒）"""
+    num, _, den = stream.get('r_frame_rate', '25/1').partition('/')
+    try:
+        return float(den or 1) / float(num)
+    except (ValueError, ZeroDivisionError):
+        return 0.04
+
+
+def build_piece_cmd(video_path, kind, start, end, piece_path, encode_args, frame_duration):
+    """构建单个视频分片的 ffmpeg 命令（只处理视频流，音频统一另行生成）"""
+    if kind == 'copy':
+        # 跳转点略晚于关键帧，拷贝模式会回退到该关键帧开始；时长少半帧，避免带上下一个关键帧
+        return [
+            ffmpeg_config.FFMPEG_PATH, '-y',
+            '-hide_banner', '-loglevel', 'error',
+            '-ss', f"{start + frame_duration / 2:.6f}",
+            '-i', video_path,
+            '-t', f"{end - start - frame_duration / 2:.6f}",
+            '-map', '0:v:0',
+            '-c:v', 'copy',
+            '-an',
+            '-f', 'mpegts',
+            piece_path
+        ]
+    return [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-ss', f"{start:.6f}",
+        '-i', video_path,
+        '-t', f"{end - start:.6f}",
+        '-map', '0:v:0',
+        *encode_args,
+        '-an',
+        '-f', 'mpegts',
+        piece_path
+    ]
+
+
+def render_audio_track(video_path, segments, output_path):
+    """一次性截取并拼接所有片段的音频（音频编码开销很小）"""
+    n = len(segments)
+    parts = [f"[0:a]atrim=start={seg['start']:.6f}:end={seg['end']:.6f},asetpts=PTS-STARTPTS[a{i}]"
+             for i, seg in enumerate(segments)]
+    if n > 1:
+        parts = [f"[0:a]asplit={n}" + "".join(f"[as{i}]" for i in range(n))] + \
+                [p.replace("[0:a]", f"[as{i}]", 1) for i, p in enumerate(parts)]
+    parts.append("".join(f"[a{i}]" for i in range(n)) + f"concat=n={n}:v=0:a=1[a]")
+
+    script_path = output_path + ".graph.txt"
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write(";\n".join(parts))
+
+    cmd = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-i', video_path,
+        '-filter_complex_script', script_path,
+        '-map', '[a]',
+        '-c:a', 'aac',
+        output_path
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+
+def smart_cut_video(video_path, segments, temp_dir, max_workers=None, codec=None):
+    """
+    智能剪辑：切点处重编码，GOP 内部直接拷贝
+    输出 temp_dir/cut_video.mp4，与 concat_video_ffmpeg_safe 的输出位置一致
+    """
+    segments = edit_video1.merge_adjacent_segments(segments)
+    max_workers = max_workers or edit_video1.MAX_WORKERS
+
+    try:
+        stream = probe_video_stream(video_path)
+        encode_args = boundary_encoder_args(stream, codec)
+        keyframes = probe_keyframes(video_path) if encode_args else []
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"探测源视频失败: {e}")
+        encode_args, keyframes = None, []
+    if not encode_args or not keyframes:
+        print("源视频编码参数无法匹配，回退到全量重编码")
+        return edit_video1.concat_video_ffmpeg_safe(video_path, segments, temp_dir,
+                                                     max_workers=max_workers, codec=codec)
+
+    frame_duration = _frame_duration(stream)
+    pieces = []
+    for seg in segments:
+        pieces.extend(plan_segment(seg, keyframes, frame_duration))
+    copy_seconds = sum(e - s for kind, s, e in pieces if kind == 'copy')
+    total_seconds = sum(seg['end'] - seg['start'] for seg in segments)
+    print(f"\n采用智能剪辑模式，{len(segments)} 个片段拆分为 {len(pieces)} 个分片，"
+          f"直接拷贝 {copy_seconds:.1f}s / {total_seconds:.1f}s")
+
+    pieces_dir = os.path.join(temp_dir, "pieces")
+    if os.path.exists(pieces_dir):
+        shutil.rmtree(pieces_dir)
+    os.makedirs(pieces_dir)
+
+    piece_paths = [os.path.join(pieces_dir, f"piece_{i:05d}.ts") for i in range(len(pieces))]
+    wall_start = time.perf_counter()
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(edit_video1.render_clip, i,
+                            build_piece_cmd(video_path, kind, s, e, piece_paths[i], encode_args, frame_duration))
+            for i, (kind, s, e) in enumerate(pieces)
+        ]
+        for future in as_completed(futures):
+            i, _, error = future.result()
+            if error:
+                errors.append((i, error))
+    if errors:
+        raise edit_video1.ClipRenderError(sorted(errors))
+
+    video_only = os.path.join(temp_dir, "cut_video_only.mp4")
+    edit_video1.concat_files(piece_paths, video_only, os.path.join(pieces_dir, "filelist.txt"))
+    audio_path = os.path.join(temp_dir, "cut_audio.m4a")
+    render_audio_track(video_path, segments, audio_path)
+
+    output_path = os.path.join(temp_dir, "cut_video.mp4")
+    cmd_mux = [
+        ffmpeg_config.FFMPEG_PATH, '-y',
+        '-hide_banner', '-loglevel', 'error',
+        '-i', video_only,
+        '-i', audio_path,
+        '-map', '0:v:0',
+        '-map', '1:a:0',
+        '-c', 'copy',
+        output_path
+    ]
+    subprocess.run(cmd_mux, check=True)
+
+    wall = time.perf_counter() - wall_start
+    print(f"智能剪辑完成: {output_path}，耗时 {wall:.1f}s，"
+          f"处理速度 {total_seconds / wall if wall > 0 else 0:.2f}x 实时")
+    return output_path
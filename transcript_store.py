@@ -0,0 +1,160 @@
+"""
+结构化时间戳存储：替代 timestamps.txt 的文本往返
+文件布局（本机字节序）：
+    头部 16 字节: 魔数 b"TSTR" | 版本 uint32 | 词数 n uint32 | 文本字节数 uint32
+    starts  float64[n]   每个词的开始时间（秒，全精度）
+    ends    float64[n]   每个词的结束时间
+    offsets uint32[n+1]  每个词在文本区中的 UTF-8 字节偏移
+    text    bytes        所有词拼接后的 UTF-8 文本
+读取时整个文件内存映射，各列直接以 memoryview 访问，不做逐行解析。
+timestamps.txt 仍可通过 export_txt 导出，供人工查看。
+"""
+import mmap
+import re
+import struct
+from array import array
+from types import SimpleNamespace
+
+MAGIC = b"TSTR"
+VERSION = 1
+HEADER = struct.Struct("=4sIII")
+
+
+class TranscriptStore:
+    """词级时间戳的列式存储"""
+
+    def __init__(self, starts, ends, offsets, text, _mmap=None, _file=None, _view=None):
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.text = text
+        self._mmap = _mmap
+        self._file = _file
+        self._view = _view
+
+    # ---------- 构建 ----------
+    @classmethod
+    def from_words(cls, words):
+        """由 Whisper 返回的词对象（带 start / end / word 属性）构建"""
+        starts = array("d")
+        ends = array("d")
+        offsets = array("I", [0])
+        blob = bytearray()
+        for w in words:
+            starts.append(w.start)
+            ends.append(w.end)
+            blob += w.word.encode("utf-8")
+            offsets.append(len(blob))
+        return cls(starts, ends, offsets, bytes(blob))
+
+    @classmethod
+    def from_txt(cls, txt_path):
+        """兼容旧流程：从 timestamps.txt 读入（精度受文本格式限制）"""
+        words = []
+        with open(txt_path, "r", encoding="utf-8") as f:
+            for line in f:
+                match = re.match(r"\[([\d.]+)s - ([\d.]+)s\] (.*)", line.strip())
+                if match:
+                    words.append(SimpleNamespace(start=float(match.group(1)), end=float(match.group(2)),
+                                                 word=match.group(3)))
+        return cls.from_words(words)
+
+    # ---------- 读写 ----------
+    def save(self, path):
+        """写入二进制文件"""
+        n = len(self)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, n, len(self.text)))
+            f.write(array("d", self.starts).tobytes())
+            f.write(array("d", self.ends).tobytes())
+            f.write(array("I", self.offsets).tobytes())
+            f.write(self.text)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """内存映射方式读取，各列零拷贝"""
+        f = open(path, "rb")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, text_len = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            mm.close()
+            f.close()
+            raise ValueError(f"不是有效的时间戳文件: {path}")
+
+        view = memoryview(mm)
+        pos = HEADER.size
+        starts = view[pos:pos + 8 * n].cast("d")
+        pos += 8 * n
+        ends = view[pos:pos + 8 * n].cast("d")
+        pos += 8 * n
+        offsets = view[pos:pos + 4 * (n + 1)].cast("I")
+        pos += 4 * (n + 1)
+        text = view[pos:pos + text_len]
+        return cls(starts, ends, offsets, text, _mmap=mm, _file=f, _view=view)
+
+    def close(self):
+        """释放内存映射"""
+        if self._mmap is not None:
+            for column in (self.starts, self.ends, self.offsets, self.text, self._view):
+                column.release()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- 访问 ----------
+    def __len__(self):
+        return len(self.starts)
+
+    def word(self, i):
+        return bytes(self.text[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def words(self):
+        """转换为词对象列表（与 Whisper 返回的结构一致）"""
+        return [SimpleNamespace(start=self.starts[i], end=self.ends[i], word=self.word(i))
+                for i in range(len(self))]
+
+    def segments(self):
+        """每个词的时间区间，供 edit_video1 剪辑使用"""
+        return [{'start': s, 'end': e} for s, e in zip(self.starts, self.ends)]
+
+    def chars(self):
+        """
+        按顺序展开所有非空白字符，返回 (字符列表, 每个字符所属的词下标)
+        与 phase1_cut.parse_timestamps 的字符规则一致
+        """
+        chars = []
+        char_to_word = []
+        for i in range(len(self)):
+            for char in self.word(i):
+                if char.strip():
+                    chars.append(char)
+                    char_to_word.append(i)
+        return chars, char_to_word
+
+    def subset(self, indices):
+        """按词下标（升序）取子集，返回新的内存中存储"""
+        starts = array("d", (self.starts[i] for i in indices))
+        ends = array("d", (self.ends[i] for i in indices))
+        offsets = array("I", [0])
+        blob = bytearray()
+        for i in indices:
+            blob += self.text[self.offsets[i]:self.offsets[i + 1]]
+            offsets.append(len(blob))
+        return TranscriptStore(starts, ends, offsets, bytes(blob))
+
+    def export_txt(self, txt_path):
+        """导出为人工可读的 timestamps.txt 格式"""
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write("=" * 50 + "\n")
+            f.write("说话内容时间戳\n")
+            f.write("=" * 50 + "\n\n")
+            for i in range(len(self)):
+                f.write(f"[{self.starts[i]:.2f}s - {self.ends[i]:.2f}s] {self.word(i)}\n")
+        return txt_path
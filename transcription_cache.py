@@ -0,0 +1,169 @@
+"""
+转写结果磁盘缓存：
+以 "音频内容哈希 + 模型 + 时间戳粒度" 为键，缓存 Whisper 返回的词级时间戳，
+同一视频重复提交或流程中途失败重跑时不再重复调用接口。
+条目按最近访问时间做 LRU 淘汰，同时受总大小和最长保存时间限制。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+# 缓存配置
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "transcriptions")
+MAX_CACHE_BYTES = 500 * 1024 * 1024  # 缓存总大小上限
+MAX_AGE_SECONDS = 30 * 24 * 3600  # 超过该时间未访问的条目直接淘汰
+
+
+class TranscriptionCache:
+    """
+    词列表以 gzip 压缩的紧凑 JSON 存储：{"words": [[start, end, word], ...]}
+    读取命中时刷新文件修改时间作为最近访问时间（不依赖文件系统的 atime），淘汰时从旧到新删除
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age=MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(audio, model="whisper-1", granularity="word"):
+        """audio 为音频字节或音频文件路径"""
+        digest = hashlib.sha256()
+        if isinstance(audio, (bytes, bytearray)):
+            digest.update(audio)
+        else:
+            with open(audio, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        digest.update(f"|{model}|{granularity}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def get(self, key):
+        """命中返回词列表，未命中或已过期返回 None"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        if time.time() - stat.st_mtime > self.max_age:
+            self.invalidate(key)
+            self.misses += 1
+            return None
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        os.utime(path)  # 刷新最近访问时间，供 LRU 淘汰使用
+        self.hits += 1
+        return [SimpleNamespace(start=s, end=e, word=w) for s, e, w in data["words"]]
+
+    def put(self, key, words):
+        """写入词列表，写完后按需淘汰"""
+        data = {"words": [[w.start, w.end, w.word] for w in words]}
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def prewarm(self, audio, words, model="whisper-1", granularity="word"):
+        """用已有的转写结果预先填充缓存，返回缓存键"""
+        key = self.make_key(audio, model, granularity)
+        self.put(key, words)
+        return key
+
+    def invalidate(self, key=None):
+        """删除单个条目；key 为 None 时清空全部缓存"""
+        keys = [key] if key else [name[:-len(".json.gz")] for name in os.listdir(self.cache_dir)
+                                  if name.endswith(".json.gz")]
+        for k in keys:
+            try:
+                os.remove(self._path(k))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """删除过期条目，再按最近访问时间从旧到新删除，直到总大小不超过上限"""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            if now - stat.st_mtime > self.max_age:
+                os.remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        """命中统计"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def load_words_from_txt(txt_path):
+    """从 timestamps.txt 读回词列表，用于预热缓存"""
+    words = []
+    with open(txt_path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = re.match(r"\[([\d.]+)s - ([\d.]+)s\] (.*)", line.strip())
+            if match:
+                words.append(SimpleNamespace(start=float(match.group(1)), end=float(match.group(2)),
+                                             word=match.group(3)))
+    return words
+
+
+if __name__ == "__main__":
+    # 用法:
+    #   python transcription_cache.py stats
+    #   python transcription_cache.py evict
+    #   python transcription_cache.py clear
+    #   python transcription_cache.py invalidate <缓存键>
+    #   python transcription_cache.py prewarm <视频路径> <timestamps.txt>
+    cache = TranscriptionCache()
+    action = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if action == "evict":
+        print(f"已淘汰 {cache.evict()} 个条目")
+    elif action == "clear":
+        cache.invalidate()
+        print("缓存已清空")
+    elif action == "invalidate":
+        cache.invalidate(sys.argv[2])
+        print(f"已删除: {sys.argv[2]}")
+    elif action == "prewarm":
+        import extract_audio_timestamps
+        audio = extract_audio_timestamps.extract_audio_from_video(sys.argv[2], None)
+        key = cache.prewarm(audio, load_words_from_txt(sys.argv[3]))
+        print(f"已预热: {key}")
+    else:
+        names = [n for n in os.listdir(cache.cache_dir) if n.endswith(".json.gz")]
+        size = sum(os.path.getsize(os.path.join(cache.cache_dir, n)) for n in names)
+        print(f"缓存目录: {cache.cache_dir}")
+        print(f"条目数: {len(names)}，总大小: {size / (1024 * 1024):.2f} MB")
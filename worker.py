@@ -0,0 +1,262 @@
+"""
+任务队列 worker：从 video_tasks 表领取 pending 任务并处理
+- 领取：SELECT ... FOR UPDATE SKIP LOCKED + 租约（lease_expires_at），多个 worker 之间不会重复领取
+- 心跳：处理期间后台线程定期续租；worker 崩溃后租约过期，任务可被其他 worker 重新领取
+- 重试：每次领取 attempts + 1，失败且未超过 MAX_ATTEMPTS 时放回 pending，否则标记 failed
+- 退出：收到 SIGINT / SIGTERM 后不再领取新任务，当前任务处理完再退出
+- 续跑：检查点存在 MinIO，重试的任务不论由哪个 worker 领取，都跳过已完成的阶段和片段
+
+用法: python worker.py [-n 进程数] [--once]
+数据库 / MinIO 连接参数见 app.py，可用环境变量指向本地测试服务
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import app
+import asr_backends
+import encoders
+from checkpoint import Checkpoint, MinioBackend
+from pipeline import Pipeline
+
+WORKER_COUNT = 2  # 默认 worker 进程数
+LEASE_SECONDS = 120  # 租约时长，超过未续租视为 worker 已失联
+HEARTBEAT_INTERVAL = 30  # 续租间隔
+POLL_INTERVAL = 2  # 队列为空时的轮询间隔
+MAX_ATTEMPTS = 3  # 每个任务最多尝试次数
+
+
+def claim_task(worker_id):
+    """原子领取一个任务：pending 或租约已过期的 processing，返回任务行或 None"""
+    with app.get_conn() as conn:
+        with conn.cursor(app.pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(
+                "SELECT id FROM video_tasks "
+                "WHERE (status = 'pending' OR (status = 'processing' AND lease_expires_at < NOW())) "
+                "AND COALESCE(attempts, 0) < %s "
+                "ORDER BY created_at LIMIT 1 FOR UPDATE SKIP LOCKED",
+                (MAX_ATTEMPTS,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            cursor.execute(
+                "UPDATE video_tasks SET status = 'processing', worker_id = %s, "
+                "attempts = COALESCE(attempts, 0) + 1, current_step = %s, "
+                "lease_expires_at = NOW() + INTERVAL %s SECOND, heartbeat_at = NOW(), updated_at = NOW() "
+                "WHERE id = %s",
+                (worker_id, "已领取", LEASE_SECONDS, row["id"])
+            )
+            cursor.execute("SELECT * FROM video_tasks WHERE id = %s", (row["id"],))
+            task = cursor.fetchone()
+        conn.commit()
+    return task
+
+
+def reap_expired():
+    """租约过期且已用完重试次数的任务标记为失败，返回处理条数"""
+    with app.get_conn() as conn:
+        with conn.cursor() as cursor:
+            count = cursor.execute(
+                "UPDATE video_tasks SET status = 'failed', current_step = '处理失败', "
+                "error_message = %s, updated_at = NOW() "
+                "WHERE status = 'processing' AND lease_expires_at < NOW() AND attempts >= %s",
+                (f"worker 失联且已重试 {MAX_ATTEMPTS} 次", MAX_ATTEMPTS)
+            )
+        conn.commit()
+    return count
+
+
+def renew_lease(task_id, worker_id):
+    """续租，返回 False 表示租约已被其他 worker 接管"""
+    with app.get_conn() as conn:
+        with conn.cursor() as cursor:
+            count = cursor.execute(
+                "UPDATE video_tasks SET lease_expires_at = NOW() + INTERVAL %s SECOND, heartbeat_at = NOW() "
+                "WHERE id = %s AND worker_id = %s AND status = 'processing'",
+                (LEASE_SECONDS, task_id, worker_id)
+            )
+        conn.commit()
+    return count > 0
+
+
+def finish_task(task_id, worker_id, **fields):
+    """写入最终状态，只有仍持有租约的 worker 才能写入"""
+    # 先清掉该任务尚未写入的进度，避免之后覆盖最终状态
+    app.progress_writer().discard(task_id)
+    with app.get_conn() as conn:
+        with conn.cursor() as cursor:
+            assignments = ", ".join(f"{k} = %s" for k in fields)
+            count = cursor.execute(
+                f"UPDATE video_tasks SET {assignments}, lease_expires_at = NULL, updated_at = NOW() "
+                "WHERE id = %s AND worker_id = %s",
+                list(fields.values()) + [task_id, worker_id]
+            )
+        conn.commit()
+    return count > 0
+
+
+class Heartbeat(threading.Thread):
+    """处理任务期间定期续租"""
+
+    def __init__(self, task_id, worker_id, interval=None):
+        super().__init__(name=f"heartbeat-{task_id[:8]}", daemon=True)
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.interval = interval or HEARTBEAT_INTERVAL
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not renew_lease(self.task_id, self.worker_id):
+                    self.lost = True
+                    print(f"[{self.worker_id}] 任务 {self.task_id} 的租约已丢失")
+                    return
+            except Exception as e:
+                # 数据库暂时不可用时继续尝试，租约未过期前任务仍归本 worker
+                print(f"[{self.worker_id}] 续租失败: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def process_task(task, worker_id, config=None):
+    """下载输入 → 运行流水线 → 上传输出，返回是否成功"""
+    task_id = task["id"]
+    work_dir = tempfile.mkdtemp(prefix=f"task_{task_id[:8]}_")
+    heartbeat = Heartbeat(task_id, worker_id)
+    heartbeat.start()
+    pipeline = None
+    try:
+        input_path = os.path.join(work_dir, os.path.basename(task["input_key"]))
+        app.download_video(task["input_bucket"], task["input_key"], input_path)
+        output_path = os.path.join(work_dir, "output.mp4")
+        checkpoint = Checkpoint.for_file(task_id, input_path, MinioBackend(app.minio_client, app.BUCKET_NAME))
+        pipeline = Pipeline(input_path, output_path, config=config, work_dir=os.path.join(work_dir, "pipeline"),
+                            on_progress=lambda percent, step: app.report_progress(task_id, percent, step),
+                            checkpoint=checkpoint)
+        result = pipeline.run()
+        bucket, key = app.upload_file(f"processed/{task_id}/output.mp4", output_path)
+        heartbeat.stop()
+        if heartbeat.lost:
+            print(f"[{worker_id}] 任务 {task_id} 已被其他 worker 接管，放弃结果")
+            return False
+        finish_task(task_id, worker_id, status="completed", progress=100, current_step="处理完成",
+                    output_url=app.get_video_url(bucket, key), error_message=None,
+                    result_json=json.dumps(result, ensure_ascii=False))
+        return True
+    except Exception as e:
+        heartbeat.stop()
+        retry = task["attempts"] < MAX_ATTEMPTS
+        print(f"[{worker_id}] 任务 {task_id} 第 {task['attempts']} 次处理失败: {e}"
+              f"{'，稍后重试' if retry else ''}")
+        profile = pipeline.profiler.to_dict() if pipeline else {}
+        try:
+            finish_task(task_id, worker_id,
+                        status="pending" if retry else "failed",
+                        current_step="等待重试" if retry else "处理失败",
+                        error_message=str(e),
+                        result_json=json.dumps({"profile": profile}, ensure_ascii=False))
+        except Exception as db_error:
+            # 数据库不可用时不影响 worker 继续领取任务，租约过期后由 reap_expired 回收
+            print(f"[{worker_id}] 任务 {task_id} 写入失败状态出错: {db_error}")
+        return False
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def worker_loop(index, once=False, asr=None):
+    """单个 worker 进程的主循环"""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{index}"
+    stopping = threading.Event()
+    config = {"asr_backend": asr}
+    backend = asr_backends.get_backend(asr)
+    if isinstance(backend, asr_backends.LocalWhisperBackend):
+        # 启动时预加载本地模型，之后的任务复用同一个模型
+        backend.model()
+    # 启动时探测可用编码器，结果缓存后各 worker 进程共用
+    encoders.probe()
+
+    def handle_signal(signum, frame):
+        if stopping.is_set():
+            return
+        print(f"[{worker_id}] 收到退出信号，处理完当前任务后退出")
+        stopping.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    print(f"[{worker_id}] 已启动")
+    while not stopping.is_set():
+        try:
+            reap_expired()
+            task = claim_task(worker_id)
+        except Exception as e:
+            print(f"[{worker_id}] 领取任务失败: {e}")
+            stopping.wait(POLL_INTERVAL)
+            continue
+        if task is None:
+            if once:
+                break
+            stopping.wait(POLL_INTERVAL)
+            continue
+        print(f"[{worker_id}] 领取任务 {task['id']} (第 {task['attempts']} 次)")
+        start = time.perf_counter()
+        ok = process_task(task, worker_id, config)
+        print(f"[{worker_id}] 任务 {task['id']} {'完成' if ok else '失败'}，耗时 {time.perf_counter() - start:.1f}s")
+
+    if app._progress_writer is not None:
+        app._progress_writer.close()
+    app.db_pool.close()
+    print(f"[{worker_id}] 识别吞吐: {backend.stats()}")
+    print(f"[{worker_id}] 已退出")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="视频任务队列 worker")
+    parser.add_argument("-n", "--workers", type=int, default=WORKER_COUNT, help="worker 进程数")
+    parser.add_argument("--once", action="store_true", help="队列为空时退出（用于测试 / 批处理）")
+    parser.add_argument("--asr", choices=sorted(asr_backends.BACKENDS), default=None,
+                        help="语音识别后端；local 后端的模型在每个 worker 进程内只加载一次")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    app.init_db()
+    if args.workers == 1:
+        worker_loop(0, args.once, args.asr)
+        return
+    # 父进程的空闲连接不能被子进程继承，多个进程共用一个 MySQL 套接字会破坏协议
+    app.db_pool.reset()
+
+    processes = [multiprocessing.Process(target=worker_loop, args=(i, args.once, args.asr), name=f"worker-{i}")
+                 for i in range(args.workers)]
+    for p in processes:
+        p.start()
+
+    def forward_signal(signum, frame):
+        # 终端 Ctrl+C 会同时发给子进程；kill 只发给主进程时由这里转发
+        for p in processes:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, forward_signal)
+    signal.signal(signal.SIGTERM, forward_signal)
+    for p in processes:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()